@@ -0,0 +1,2 @@
+# The benchmarks use the same bundled test data as the test suite
+pytest_plugins = ["suntoday.conftest"]
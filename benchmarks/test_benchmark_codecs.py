@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from suntoday.jpegs import (
+    create_blended_figure_from_maps,
+    create_figure_from_map,
+    create_rgb_figure_from_maps,
+    encode_image,
+    figure_to_image,
+)
+from suntoday.maps import create_aia_map, create_hmi_map
+
+# Encoding a 4096x4096 image takes up to seconds for AVIF, so keep the number of rounds low
+ROUNDS = 3
+CODECS = {
+    "jpg": {},
+    "jpg-progressive": {"progressive": True, "optimize": True, "quality": 85},
+    "webp": {"quality": 80, "method": 4},
+    "webp-fast": {"quality": 80, "method": 0},
+    "avif": {"quality": 60, "speed": 6},
+    "avif-fast": {"quality": 60, "speed": 10},
+}
+
+
+# One of each kind of product
+@pytest.fixture(params=["aia", "rgb", "hmi_blend"])
+def product_image(request):
+    aia_maps = {
+        wavelength: create_aia_map(request.getfixturevalue(f"aia_{wavelength}_test_file"))
+        for wavelength in ["171", "211", "304"]
+    }
+    if request.param == "aia":
+        _, fig = create_figure_from_map(aia_maps["171"])
+    elif request.param == "rgb":
+        _, fig = create_rgb_figure_from_maps([aia_maps["304"], aia_maps["211"], aia_maps["171"]])
+    else:
+        hmi_map = create_hmi_map(request.getfixturevalue("hmi_blos_test_file"))
+        _, fig = create_blended_figure_from_maps([hmi_map, aia_maps["171"]])
+    return figure_to_image(fig)
+
+
+# The bytes are saved with the timings, so encode time can be weighed against size
+@pytest.mark.parametrize("codec", CODECS)
+def test_benchmark_encode_image(benchmark, monkeypatch, product_image, codec) -> None:
+    extension = codec.split("-")[0]
+    monkeypatch.setenv("SUNTODAY_SDO_FIG_FORMAT_OPTIONS", json.dumps({extension: CODECS[codec]}))
+    encoded_image = benchmark.pedantic(encode_image, args=(product_image.copy(), extension), rounds=ROUNDS)
+    benchmark.extra_info["bytes"] = len(encoded_image)
@@ -0,0 +1,35 @@
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+
+from suntoday.db import get_latest_record, write_or_update_record, write_or_update_records
+
+# Three years of daily records, roughly the size of the production archive
+ARCHIVE = {
+    date(2022, 1, 1) + timedelta(days=day): datetime(2022, 1, 1, tzinfo=UTC) + timedelta(days=day, hours=23)
+    for day in range(3 * 365)
+}
+
+
+@pytest.fixture
+def archive_session(db_session):
+    with db_session() as session:
+        write_or_update_records(session, "images", ARCHIVE)
+        yield session
+
+
+def test_benchmark_write_or_update_record(benchmark, archive_session) -> None:
+    def write_archive():
+        for obs_date, updated_at in ARCHIVE.items():
+            write_or_update_record(archive_session, "images", obs_date, updated_at=updated_at)
+
+    benchmark.pedantic(write_archive, rounds=3)
+
+
+def test_benchmark_write_or_update_records(benchmark, archive_session) -> None:
+    benchmark(write_or_update_records, archive_session, "images", ARCHIVE)
+
+
+def test_benchmark_get_latest_record(benchmark, archive_session) -> None:
+    record = benchmark(get_latest_record, archive_session, "images")
+    assert record.obs_date == max(ARCHIVE)
@@ -0,0 +1,17 @@
+import subprocess  # NOQA: S404
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("module", ["suntoday.main", "suntoday.db", "suntoday.jpegs"])
+def test_benchmark_import(benchmark, module) -> None:
+    # Each round is a fresh interpreter, so nothing is already imported
+    benchmark.pedantic(
+        subprocess.run, args=([sys.executable, "-c", f"import {module}"],), kwargs={"check": True}, rounds=5
+    )
+
+
+def test_benchmark_warm_up(benchmark) -> None:
+    code = "from suntoday.warmup import warm_up; warm_up()"
+    benchmark.pedantic(subprocess.run, args=([sys.executable, "-c", code],), kwargs={"check": True}, rounds=3)
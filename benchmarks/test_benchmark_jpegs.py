@@ -0,0 +1,54 @@
+import pytest
+
+from suntoday.jpegs import (
+    create_blended_figure_from_maps,
+    create_figure_from_map,
+    create_rgb_figure_from_maps,
+    save_figures,
+    save_map_fits,
+)
+from suntoday.maps import create_aia_map, create_hmi_map
+
+# Rendering a 4096x4096 figure takes seconds, so keep the number of rounds low
+ROUNDS = 3
+
+
+@pytest.fixture
+def aia_171_map(aia_171_test_file):
+    return create_aia_map(aia_171_test_file)
+
+
+@pytest.fixture
+def aia_rgb_maps(aia_94_test_file, aia_335_test_file, aia_193_test_file):
+    return [create_aia_map(aia_file) for aia_file in [aia_94_test_file, aia_335_test_file, aia_193_test_file]]
+
+
+@pytest.fixture
+def hmi_blos_map(hmi_blos_test_file):
+    return create_hmi_map(hmi_blos_test_file)
+
+
+def test_benchmark_create_figure_from_map_aia(benchmark, aia_171_map) -> None:
+    benchmark.pedantic(create_figure_from_map, args=(aia_171_map,), rounds=ROUNDS)
+
+
+def test_benchmark_create_figure_from_map_hmi(benchmark, hmi_blos_map) -> None:
+    benchmark.pedantic(create_figure_from_map, args=(hmi_blos_map,), rounds=ROUNDS)
+
+
+def test_benchmark_create_rgb_figure_from_maps(benchmark, aia_rgb_maps) -> None:
+    benchmark.pedantic(create_rgb_figure_from_maps, args=(aia_rgb_maps,), rounds=ROUNDS)
+
+
+def test_benchmark_create_blended_figure_from_maps(benchmark, hmi_blos_map, aia_171_map) -> None:
+    benchmark.pedantic(create_blended_figure_from_maps, args=([hmi_blos_map, aia_171_map],), rounds=ROUNDS)
+
+
+def test_benchmark_save_figures(benchmark, aia_171_map, tmp_path) -> None:
+    figure = create_figure_from_map(aia_171_map)
+    benchmark.pedantic(save_figures, args=([figure], tmp_path), rounds=ROUNDS)
+
+
+@pytest.mark.parametrize(("compression", "dtype"), [("none", "float64"), ("rice", "float32"), ("rice", "int16")])
+def test_benchmark_save_map_fits(benchmark, aia_171_map, tmp_path, compression, dtype) -> None:
+    benchmark.pedantic(save_map_fits, args=(aia_171_map, tmp_path / "f0171.fits", compression, dtype), rounds=ROUNDS)
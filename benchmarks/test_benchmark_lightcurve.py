@@ -0,0 +1,61 @@
+import io
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import pytest
+
+from suntoday.lightcurve import (
+    add_aia_lightcurve,
+    add_goes_lightcurve,
+    get_aia_lightcurves,
+    plot_lightcurve_from_timeseries,
+)
+
+
+def test_benchmark_add_aia_lightcurve(benchmark, aia_timeseries) -> None:
+    fig, ax = plt.subplots(1, 1)
+
+    def add_lightcurve():
+        ax.clear()
+        add_aia_lightcurve(ax, aia_timeseries)
+
+    benchmark(add_lightcurve)
+    plt.close(fig)
+
+
+def test_benchmark_add_goes_lightcurve(benchmark, goes_primary_timeseries) -> None:
+    fig, ax = plt.subplots(1, 1)
+
+    def add_lightcurve():
+        ax.clear()
+        add_goes_lightcurve(ax, goes_primary_timeseries)
+
+    benchmark(add_lightcurve)
+    plt.close(fig)
+
+
+def test_benchmark_plot_lightcurve_from_timeseries(benchmark, aia_timeseries, goes_primary_timeseries) -> None:
+    benchmark(plot_lightcurve_from_timeseries, goes_primary_timeseries, aia_timeseries)
+
+
+@pytest.mark.parametrize("days", [1, 7])
+def test_benchmark_get_aia_lightcurves(benchmark, aia_timeseries, days) -> None:
+    # Longer windows are the test day repeated
+    span = aia_timeseries.index.max() - aia_timeseries.index.min() + pd.Timedelta(minutes=1)
+    timeseries = pd.concat([aia_timeseries.set_index(aia_timeseries.index + day * span) for day in range(days)])
+    benchmark.extra_info["rows"] = len(timeseries)
+    benchmark(get_aia_lightcurves, timeseries)
+
+
+@pytest.mark.parametrize("max_points", [0, 8192])
+def test_benchmark_plot_lightcurve_week(benchmark, aia_timeseries, goes_primary_timeseries, max_points) -> None:
+    # A week is the test day repeated, 0 points plots every point
+    span = aia_timeseries.index.max() - aia_timeseries.index.min() + pd.Timedelta(minutes=1)
+    timeseries = pd.concat([aia_timeseries.set_index(aia_timeseries.index + day * span) for day in range(7)])
+    benchmark.extra_info["rows"] = len(timeseries)
+
+    def plot_lightcurve():
+        fig = plot_lightcurve_from_timeseries(goes_primary_timeseries, timeseries, max_points)
+        fig.savefig(io.BytesIO(), format="png", dpi=fig.dpi)
+
+    benchmark.pedantic(plot_lightcurve, rounds=3)
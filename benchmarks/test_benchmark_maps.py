@@ -0,0 +1,13 @@
+import pytest
+
+from suntoday.maps import create_aia_map, create_hmi_map
+
+
+@pytest.mark.parametrize("test_file", ["aia_171_test_file", "aia_304_test_file", "aia_1700_test_file"])
+def test_benchmark_create_aia_map(benchmark, request, test_file) -> None:
+    benchmark(create_aia_map, request.getfixturevalue(test_file))
+
+
+@pytest.mark.parametrize("test_file", ["hmi_blos_test_file", "hmi_cont_test_file"])
+def test_benchmark_create_hmi_map(benchmark, request, test_file) -> None:
+    benchmark(create_hmi_map, request.getfixturevalue(test_file))
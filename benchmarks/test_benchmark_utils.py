@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from suntoday.utils import apply_gamma_correction, clip_image_percentiles, normalize_image_percentiles
+
+
+@pytest.fixture
+def image():
+    # Same size and a similar dynamic range to a full resolution AIA image
+    rng = np.random.default_rng(seed=42)
+    image = rng.lognormal(mean=4, sigma=1.5, size=(4096, 4096))
+    image[:10, :10] = np.nan
+    return image
+
+
+def test_benchmark_clip_image_percentiles(benchmark, image) -> None:
+    benchmark(clip_image_percentiles, image)
+
+
+def test_benchmark_normalize_image_percentiles(benchmark, image) -> None:
+    benchmark(normalize_image_percentiles, image)
+
+
+def test_benchmark_apply_gamma_correction(benchmark, image) -> None:
+    benchmark(apply_gamma_correction, normalize_image_percentiles(image))
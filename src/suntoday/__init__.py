@@ -3,7 +3,9 @@ import sys
 
 from loguru import logger
 
-__all__ = ["change_logging_level", "logger"]
+__all__ = ["SENTRY_DSN", "change_logging_level", "init_sentry", "logger"]
+
+SENTRY_DSN = "https://a16063ea547141a4862651c80df74f68@o4505489018060800.ingest.sentry.io/4505489021337600"
 
 
 def change_logging_level(level: str) -> None:
@@ -20,4 +22,16 @@ def change_logging_level(level: str) -> None:
     logger.add(sys.stdout, level=level)
 
 
+def init_sentry() -> None:
+    """
+    Report the errors of this process to Sentry.
+
+    Called by every entry point, the scheduler, the queue workers, the
+    backfill and the replay.
+    """
+    import sentry_sdk
+
+    sentry_sdk.init(dsn=SENTRY_DSN)
+
+
 change_logging_level(os.environ.get("SUNTODAY_LOG_LEVEL", "info").upper())
@@ -0,0 +1,253 @@
+"""
+Provides the backfill of SDO images over a past time range.
+
+Every time in the range is queued as a "backfill" job in the job queue,
+so times that are already done are skipped and an interrupted backfill
+resumes where it stopped. On start the failed jobs in the range, and the
+running jobs whose worker has stopped, are queued again, so they are
+retried straight away. Queue workers on other machines also help with
+any backfill jobs left in the queue, and the jobs they are running are
+skipped.
+
+Jobs are run by several threads at once, with separate limits on how
+many download and how many render at a time, so downloads of the next
+times overlap with rendering.
+
+Run a backfill with::
+
+    python -m suntoday.backfill 2025-08-01T00:00 2025-08-08T00:00 --cadence 60
+"""
+
+import argparse
+import datetime
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from suntoday import init_sentry, logger
+from suntoday.config import Settings
+from suntoday.db import Job, get_session, init_db
+from suntoday.jobqueue import (
+    BACKFILL_TASK,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_RUNNING,
+    _get_worker_id,
+    enqueue_jobs,
+    requeue_jobs,
+    run_worker,
+)
+
+__all__ = ["Backfill", "get_backfill_times"]
+
+
+def get_backfill_times(
+    start: datetime.datetime, end: datetime.datetime, cadence: datetime.timedelta
+) -> list[datetime.datetime]:
+    """
+    Return every time from start to end, inclusive, at the given cadence.
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        The first time.
+    end : datetime.datetime
+        The last time.
+    cadence : datetime.timedelta
+        The time between each time.
+
+    Returns
+    -------
+    list[datetime.datetime]
+        The times in UTC.
+
+    Raises
+    ------
+    ValueError
+        If the cadence is not positive or the end is before the start.
+    """
+    if cadence <= datetime.timedelta(0):
+        msg = f"Cadence must be positive, got {cadence}"
+        raise ValueError(msg)
+    if end < start:
+        msg = f"End {end} is before start {start}"
+        raise ValueError(msg)
+    start = start.astimezone(datetime.UTC)
+    end = end.astimezone(datetime.UTC)
+    count = int((end - start) / cadence) + 1
+    return [start + i * cadence for i in range(count)]
+
+
+class Backfill:
+    """
+    Backfills the SDO images for a time range.
+
+    Parameters
+    ----------
+    start : datetime.datetime
+        The first time to backfill.
+    end : datetime.datetime
+        The last time to backfill.
+    cadence : datetime.timedelta
+        The time between each backfilled time.
+    root_save_directory : pathlib.Path, optional
+        The root directory the images are saved under.
+        Defaults to ``Settings.save_directory``.
+    max_downloads : int, optional
+        How many times can download at once.
+        Defaults to ``Settings.backfill_max_downloads``.
+    max_renders : int, optional
+        How many times can render at once.
+        Defaults to ``Settings.backfill_max_renders``.
+    """
+
+    def __init__(  # NOQA: PLR0917
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        cadence: datetime.timedelta,
+        root_save_directory: Path | None = None,
+        max_downloads: int | None = None,
+        max_renders: int | None = None,
+    ) -> None:
+        settings = Settings()
+        self.times = get_backfill_times(start, end, cadence)
+        self.root_save_directory = root_save_directory
+        self.max_downloads = max_downloads or settings.backfill_max_downloads
+        self.max_renders = max_renders or settings.backfill_max_renders
+        self._download_slots = threading.Semaphore(self.max_downloads)
+        self._render_slots = threading.Semaphore(self.max_renders)
+
+    def run_job(self, job: Job) -> None:
+        """
+        Download and render the SDO images of one job.
+
+        Parameters
+        ----------
+        job : Job
+            The claimed job.
+        """
+        from suntoday.jpegs import download_sdo_files, render_sdo_images
+        from suntoday.main import get_save_directory
+
+        save_directory = get_save_directory(job.requested_time, self.root_save_directory)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self._download_slots:
+                aia_files, hmi_files = download_sdo_files(job.requested_time, temp_dir)
+            with self._render_slots:
+                render_sdo_images(aia_files, hmi_files, save_directory)
+
+    def count_jobs(self) -> Counter:
+        """
+        Count the backfill jobs in the time range by their status.
+
+        Returns
+        -------
+        collections.Counter
+            The number of jobs of each status.
+        """
+        session = get_session()
+        try:
+            rows = session.execute(
+                select(Job.status, func.count())
+                .where(
+                    Job.task == BACKFILL_TASK,
+                    Job.requested_time >= self.times[0],
+                    Job.requested_time <= self.times[-1],
+                )
+                .group_by(Job.status)
+            ).all()
+        finally:
+            session.close()
+        return Counter(dict(rows))
+
+    def run(self) -> int:
+        """
+        Queue the times that are not done yet and run them all.
+
+        Returns
+        -------
+        int
+            The number of jobs run, including failed attempts.
+        """
+        init_db()
+        session = get_session()
+        try:
+            queued = enqueue_jobs(session, BACKFILL_TASK, self.times)
+            requeued = requeue_jobs(session, task=BACKFILL_TASK, start=self.times[0], end=self.times[-1])
+        finally:
+            session.close()
+        counts = self.count_jobs()
+        logger.info(
+            f"Backfilling {len(self.times)} times from {self.times[0]} to {self.times[-1]}, {queued} newly queued, "
+            f"{requeued} queued again, skipping {counts[JOB_DONE]} done and {counts[JOB_RUNNING]} running elsewhere, "
+            f"{self.max_downloads} downloads and {self.max_renders} renders at a time"
+        )
+        # Enough workers that both the download and render slots can always be in use
+        workers = self.max_downloads + self.max_renders
+        worker_id = _get_worker_id()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="suntoday-backfill") as executor:
+            futures = [
+                executor.submit(
+                    run_worker,
+                    f"{worker_id}:backfill-{i}",
+                    runner=self.run_job,
+                    task=BACKFILL_TASK,
+                    start=self.times[0],
+                    end=self.times[-1],
+                    until_empty=True,
+                )
+                for i in range(workers)
+            ]
+            jobs_run = sum(future.result() for future in futures)
+        counts = self.count_jobs()
+        logger.info(
+            f"Backfill ran {jobs_run} jobs, {counts[JOB_DONE]} of {len(self.times)} times done, "
+            f"{counts[JOB_FAILED]} failed and {counts[JOB_RUNNING]} running elsewhere"
+        )
+        return jobs_run
+
+
+def main(args: list[str] | None = None) -> int:
+    """
+    Run a backfill from the command line.
+
+    Parameters
+    ----------
+    args : list[str], optional
+        The command line arguments, defaults to ``sys.argv``.
+
+    Returns
+    -------
+    int
+        The number of jobs run.
+    """
+    parser = argparse.ArgumentParser(description="Backfill the SDO images for a time range.")
+    parser.add_argument("start", type=datetime.datetime.fromisoformat, help="First time, ISO format, UTC if naive")
+    parser.add_argument("end", type=datetime.datetime.fromisoformat, help="Last time, ISO format, UTC if naive")
+    parser.add_argument("--cadence", type=int, default=60, help="Minutes between each time, default 60")
+    parser.add_argument("--save-directory", type=Path, default=None, help="Defaults to SUNTODAY_SAVE_DIRECTORY")
+    parser.add_argument("--max-downloads", type=int, default=None, help="Times downloading at once")
+    parser.add_argument("--max-renders", type=int, default=None, help="Times rendering at once")
+    parsed = parser.parse_args(args)
+    start, end = (
+        time.replace(tzinfo=datetime.UTC) if time.tzinfo is None else time for time in (parsed.start, parsed.end)
+    )
+    backfill = Backfill(
+        start,
+        end,
+        datetime.timedelta(minutes=parsed.cadence),
+        root_save_directory=parsed.save_directory,
+        max_downloads=parsed.max_downloads,
+        max_renders=parsed.max_renders,
+    )
+    return backfill.run()
+
+
+if __name__ == "__main__":
+    init_sentry()
+    main()
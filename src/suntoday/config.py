@@ -22,25 +22,87 @@ class Settings(BaseSettings):
         env_file_encoding="utf-8",
         env_prefix="suntoday_",
     )
+    archive_frames: bool = False  # Keep each cycle's previews and append them to daily movies
+    backfill_max_downloads: int = 2
+    backfill_max_renders: int = 2
     cron_frequency: int = 30  # minutes
+    cutout_max_regions: int = 5
+    cutout_min_size: int = 200  # arcsec, the smallest side of a cutout
+    cutout_threshold: float = 500.0  # Gauss, of the magnetogram in active regions
+    cutout_wavelengths: list[str] = ["0094", "0171", "0193", "0304", "1600"]  # with the HMI magnetogram
+    cutouts: bool = False  # Cut the maps to each active region
+    db_backend: str = "postgresql"  # or "sqlite"
     db_user: str = "suntoday_user"
     db_password: str = "suntoday_user_password"  # NOQA: S105
     db_host: str = "db"  # Container name from docker-compose
     db_port: int = 5432
     db_name: str = "suntoday"
     db_url: str = f"postgresql+psycopg2://{db_user}@{db_host}:{db_port}/{db_name}"
+    db_async_driver: str = "postgresql+psycopg"  # psycopg (3), SQLite uses aiosqlite
+    db_max_overflow: int = 5
+    db_pool_recycle: int = 1800  # seconds
+    db_pool_size: int = 5
+    db_pool_timeout: int = 30  # seconds
+    db_sqlite_path: Path = Path("./suntoday.sqlite")
+    disk_statistics: bool = False  # Keep the disk statistics of each AIA map as a timeseries
+    disk_statistics_directory: Path | None = None  # Defaults to timeseries_archive_directory
     fig_dpi: int = 300
+    fits_compression: str = "rice"  # or "gzip", "none"
+    fits_dtype: str = "float32"  # or "int16" (scaled), "float64"
+    fits_quantize_level: float = 16.0  # of floats when compressed, 0 for lossless with gzip
+    fits_write_workers: int = 4
+    frame_cache_directory: Path | None = None  # The frame cache is in memory if not set
+    frame_cache_max_age: int = 120  # minutes, older frames are not used for difference products
+    frame_cache_size: int = 0  # AIA frames kept of each wavelength for difference products, 0 for none
+    flare_cron_frequency: int = 5  # minutes
+    flare_products: list[str] = ["0094", "0131", "0171", "0304", "_094_335_193"]
+    flare_threshold: str = "M1"  # GOES class
     jsoc_base_url: str = "http://jsoc.stanford.edu"
     jsoc_delay: int = 30  # minutes
     jsoc_info_url: str = "http://jsoc2.stanford.edu/cgi-bin/ajax/jsoc_info"
     jsoc_password: str = "hmiteam"  # NOQA: S105
+    jsoc_poll_frequency: int = 60  # seconds
     jsoc_str_fmt: str = "%Y.%m.%d_%H:%M:%S_TAI"
     jsoc_user: str = "hmiteam"
+    lightcurve_max_points: int = 8192  # of each line, more are decimated, above a day at the AIA cadence
+    lightcurve_source: str = "jsoc"  # or "disk" (the disk statistics of our own maps)
+    lightcurve_windows: list[int] = [24]  # hours, e.g. [6, 24, 72, 648]
     map_fig_size: float = 4096 / fig_dpi  # pixels / dpi = inches
+    metrics_directory: Path | None = None  # No metrics are written if not set
+    metrics_format: str = "prometheus"  # or "json"
+    movie_fps: int = 10
+    profiling: bool = False
+    profiling_interval: float = 0.01  # seconds
+    profiling_keep_last: int = 10  # profiles of all days, the older ones are deleted
+    publish_keep_last: int = 3  # releases, the older ones are deleted
+    publish_latest: bool = True  # Publish each job to a "latest" symlink with a manifest
+    queue_max_attempts: int = 3
+    queue_poll_interval: int = 10  # seconds
+    queue_retry_delay: int = 60  # seconds, doubled after each failed attempt
+    queue_visibility_timeout: int = 1800  # seconds
+    replay_directory: Path | None = None  # Defaults to the bundled test data
+    replay_tolerance: int = 180  # minutes
     resize_fig_size: int = 1024  # pixels
     save_directory: Path = Path("./")
+    scheduler_mode: str = "cron"  # or "jsoc" (on new data), "flare" (faster in flares), "queue" (for workers)
+    sdo_fig_encode_workers: int = 4
+    sdo_fig_extra_formats: list[str] = []  # e.g. ["webp", "avif"], saved next to the JPEGs
+    # Pillow save options of each format, e.g. {"jpg": {"quality": 85, "progressive": true}}
+    sdo_fig_format_options: dict[str, dict] = {
+        "avif": {"quality": 60, "speed": 6},
+        "jpg": {},
+        "webp": {"quality": 80, "method": 4},
+    }
     sdo_fig_name_large: str = "f{}.jpg"
     sdo_fig_name_small: str = "l{}.jpg"
+    source: str = "jsoc"  # or "replay" (from replay_directory)
     test_env: bool = False
+    tile_format: str = "jpg"
+    tile_overlap: int = 1  # pixels
+    tile_size: int = 256  # pixels
+    tiles: bool = False  # Write a Deep Zoom tile pyramid of each product
+    timeseries_archive: bool = True  # Keep the AIA and GOES timeseries in a Parquet file of each day
+    timeseries_archive_directory: Path | None = None  # Defaults to "timeseries" in save_directory
     timeseries_fig_x_size: float = (1024 * 2) / fig_dpi  # pixels / dpi = inches
     timeseries_fig_y_size: float = (1024 * 6) / fig_dpi  # pixels / dpi = inches
+    timeseries_text_export: bool = True  # Also write the last day as aia_light_curves.txt and goes_light_curves.txt
@@ -5,12 +5,11 @@ import pytest
 import sunpy.map as smap
 from pytest_postgresql import factories
 from pytest_postgresql.janitor import DatabaseJanitor
-from sqlalchemy import create_engine
 from sqlalchemy.orm.session import sessionmaker
 from sunpy.io import read_file
 
 from suntoday.data.test import get_test_filepath
-from suntoday.db import BASE, SDOImages, TimeSeriesImages, get_session
+from suntoday.db import SDOImages, TimeSeriesImages, create_db, dispose_engines, get_session
 
 test_db = factories.postgresql_proc(port=None, dbname="test_db")
 
@@ -43,7 +42,19 @@ def _setup_test_env(request):  # NOQA: ARG001
 
 
 @pytest.fixture(scope="session")
-def db_session(test_db):
+def db_uri(request, tmp_path_factory):
+    """
+    The test database, SQLite unless ``SUNTODAY_TEST_DB_BACKEND=postgresql``.
+
+    Yields
+    ------
+    str
+        The database connection URI.
+    """
+    if os.environ.get("SUNTODAY_TEST_DB_BACKEND", "sqlite") != "postgresql":
+        yield f"sqlite:///{tmp_path_factory.mktemp('db') / 'test_db.sqlite'}"
+        return
+    test_db = request.getfixturevalue("test_db")
     pg_host = test_db.host
     pg_port = test_db.port
     pg_user = test_db.user
@@ -52,14 +63,18 @@ def db_session(test_db):
     with DatabaseJanitor(
         user=pg_user, host=pg_host, port=pg_port, dbname=pg_db, version=test_db.version, password=pg_password
     ):
-        connection_str = f"postgresql+psycopg2://{pg_user}:@{pg_host}:{pg_port}/{pg_db}"
-        engine = create_engine(connection_str, echo=False, connect_args={"options": "-c timezone=utc"})
-        BASE.metadata.create_all(engine)
-        session = get_session(connection_str)
-        assert session.query(SDOImages).count() == 0  # NOQA: S101
-        assert session.query(TimeSeriesImages).count() == 0  # NOQA: S101
-        session.close()
-        yield sessionmaker(bind=engine, expire_on_commit=False)
+        yield f"postgresql+psycopg2://{pg_user}:@{pg_host}:{pg_port}/{pg_db}"
+
+
+@pytest.fixture(scope="session")
+def db_session(db_uri):
+    engine = create_db(db_uri)
+    session = get_session(db_uri)
+    assert session.query(SDOImages).count() == 0  # NOQA: S101
+    assert session.query(TimeSeriesImages).count() == 0  # NOQA: S101
+    session.close()
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    dispose_engines()
 
 
 @pytest.fixture
@@ -3,17 +3,53 @@ Provides all the database helpers needed.
 """
 
 import datetime
-
-from sqlalchemy import Column, Date, DateTime, create_engine
+import threading
+from collections.abc import Mapping
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Engine,
+    Integer,
+    String,
+    Text,
+    TypeDecorator,
+    UniqueConstraint,
+    create_engine,
+    event,
+    make_url,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 from sqlalchemy_utils import create_database, database_exists
 
 from suntoday import logger
 
 BASE = declarative_base()
-
-
-__all__ = ["DatabaseError", "create_db", "get_latest_record", "get_record", "get_session", "write_or_update_record"]
+# Process-wide engines, keyed by URI and echo, so each job reuses pooled connections
+_ENGINES = {}
+_ASYNC_ENGINES = {}
+_SESSION_FACTORIES = {}
+_BOOTSTRAPPED = set()
+_ENGINE_LOCK = threading.Lock()
+_BOOTSTRAP_LOCK = threading.Lock()
+
+
+__all__ = [
+    "DatabaseError",
+    "create_db",
+    "dispose_engines",
+    "get_async_engine",
+    "get_engine",
+    "get_latest_record",
+    "get_record",
+    "get_session",
+    "init_db",
+    "write_or_update_record",
+    "write_or_update_records",
+]
 
 
 class DatabaseError(Exception):
@@ -22,6 +58,54 @@ class DatabaseError(Exception):
     """
 
 
+class UTCDate(TypeDecorator):
+    """
+    A date column that also accepts ISO formatted strings and datetimes.
+
+    SQLite only accepts `datetime.date` objects, PostgreSQL would cast
+    strings itself.
+    """
+
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):  # NOQA: ARG002, PLR6301
+        if isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value)
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        return value
+
+
+class UTCDateTime(TypeDecorator):
+    """
+    A timezone aware datetime column that is always stored and returned in
+    UTC.
+
+    SQLite has no timezone support, so values are converted to UTC before
+    being stored and naive values read back are assumed to be UTC.
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):  # NOQA: ARG002, PLR6301
+        if isinstance(value, str):
+            value = datetime.datetime.fromisoformat(value)
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=datetime.UTC)
+            value = value.astimezone(datetime.UTC)
+        return value
+
+    def process_result_value(self, value, dialect):  # NOQA: ARG002, PLR6301
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            return value.replace(tzinfo=datetime.UTC)
+        return value.astimezone(datetime.UTC)
+
+
 class SDOImages(BASE):
     """
     This class represents the database table for successful creation of all SDO
@@ -36,8 +120,8 @@ class SDOImages(BASE):
     """
 
     __tablename__ = "SDOImages"
-    obs_date = Column(Date(), primary_key=True)
-    updated_at = Column(DateTime(timezone=True))
+    obs_date = Column(UTCDate(), primary_key=True)
+    updated_at = Column(UTCDateTime(), index=True)
 
 
 class TimeSeriesImages(BASE):
@@ -54,41 +138,255 @@ class TimeSeriesImages(BASE):
     """
 
     __tablename__ = "TimeSeriesImages"
-    obs_date = Column(Date(), primary_key=True)
-    updated_at = Column(DateTime(timezone=True))
+    obs_date = Column(UTCDate(), primary_key=True)
+    updated_at = Column(UTCDateTime(), index=True)
+
+
+class Job(BASE):
+    """
+    This class represents the database table of the job queue.
+
+    A job is unique for its task, requested time and product, so the same
+    work is never queued twice.
+
+    Attributes
+    ----------
+    id : int
+        Primary key
+    task : str
+        The task to run, "images" or "timeseries"
+    requested_time : datetime
+        The time to create the images for
+    product : str
+        The SDO product to create, or an empty string for all of them
+    status : str
+        One of "queued", "running", "done" or "failed"
+    attempts : int
+        Number of times the job has been claimed
+    visible_at : datetime
+        The job can not be claimed before this time
+    claimed_by : str
+        The worker that last claimed the job
+    error : str
+        The error of the last failed attempt
+    created_at : datetime
+        Timestamp of when the job was queued
+    updated_at : datetime
+        Timestamp of when the job was last updated
+    """
+
+    __tablename__ = "Jobs"
+    __table_args__ = (UniqueConstraint("task", "requested_time", "product"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task = Column(String(32), nullable=False)
+    requested_time = Column(UTCDateTime(), nullable=False)
+    product = Column(String(64), nullable=False, default="")
+    status = Column(String(16), nullable=False, default="queued", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    visible_at = Column(UTCDateTime(), nullable=False, index=True)
+    claimed_by = Column(String(255))
+    error = Column(Text)
+    created_at = Column(UTCDateTime(), nullable=False)
+    updated_at = Column(UTCDateTime(), nullable=False)
 
 
 VALID_MODELS = {"images": SDOImages, "timeseries": TimeSeriesImages}
 
 
-def create_db(uri=None, *, echo: bool = False):
+def _create_indexes(engine: Engine) -> None:
     """
-    Create a new database at the specified URI if it doesn't exist.
+    Create any indexes missing from tables that already exist.
+
+    ``create_all`` only creates indexes alongside new tables, so databases
+    created before an index was added to a model need this.
+
+    Parameters
+    ----------
+    engine : Engine
+        SQLAlchemy engine object connected to the database.
+    """
+    for table in BASE.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _get_uri(uri: str | None = None) -> str:
+    """
+    Return the given URI or build the default one from the Settings class.
+
+    When ``Settings.db_backend`` is "sqlite", the default is a SQLite
+    database at ``Settings.db_sqlite_path``.
 
     Parameters
     ----------
     uri : str, optional
-        The database connection URI. If not provided, it will use the default
-        configuration from the Settings class.
-    echo : bool, optional
-        If True, enables SQLAlchemy engine logging, by default False
+        The database connection URI.
 
     Returns
     -------
-    Engine
-        SQLAlchemy engine object connected to the database
+    str
+        The database connection URI.
     """
+    if uri:
+        return uri
     from suntoday.config import Settings
 
     settings = Settings()
-    uri = uri or settings.db_url.format(
+    if settings.db_backend == "sqlite":
+        return f"sqlite:///{settings.db_sqlite_path.expanduser().resolve()}"
+    return settings.db_url.format(
         db_user=settings.db_user,
         db_password=settings.db_password,
         db_host=settings.db_host,
         db_port=settings.db_port,
         db_name=settings.db_name,
     )
-    engine = create_engine(uri, echo=echo, connect_args={"options": "-c timezone=utc"})
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:  # NOQA: ARG001
+    """
+    Put every new SQLite connection into WAL mode.
+
+    WAL lets readers carry on while a job is writing.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _get_engine_options(url: URL) -> dict:
+    """
+    Return the keyword arguments used to create an engine for the given URL.
+
+    Parameters
+    ----------
+    url : sqlalchemy.engine.URL
+        The database connection URL.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for ``create_engine``.
+    """
+    from suntoday.config import Settings
+
+    if url.get_backend_name() == "sqlite":
+        # SQLite picks its own pool, connections are shared with the job threads
+        return {"connect_args": {"check_same_thread": False, "timeout": 30}, "pool_pre_ping": True}
+    settings = Settings()
+    return {
+        "connect_args": {"options": "-c timezone=utc"},
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": True,
+    }
+
+
+def get_engine(uri=None, *, echo: bool = False) -> Engine:
+    """
+    Return the process-wide engine for the given URI.
+
+    The engine is created on first use and reused afterwards, so
+    connections are pooled between jobs instead of being set up each time.
+    Connections are checked with a ping before being handed out.
+
+    Parameters
+    ----------
+    uri : str, optional
+        The database connection URI. If not provided, it will use the default
+        configuration from the Settings class.
+    echo : bool, optional
+        If True, enables SQLAlchemy engine logging, by default False
+
+    Returns
+    -------
+    Engine
+        SQLAlchemy engine object connected to the database
+    """
+    uri = _get_uri(uri)
+    with _ENGINE_LOCK:
+        if (uri, echo) not in _ENGINES:
+            url = make_url(uri)
+            engine = create_engine(url, echo=echo, **_get_engine_options(url))
+            if url.get_backend_name() == "sqlite":
+                event.listen(engine, "connect", _set_sqlite_pragmas)
+            _ENGINES[uri, echo] = engine
+        return _ENGINES[uri, echo]
+
+
+def get_async_engine(uri=None, *, echo: bool = False):
+    """
+    Return the process-wide async engine for the given URI.
+
+    The driver in the URI is swapped for ``Settings.db_async_driver``, or
+    ``aiosqlite`` for SQLite.
+
+    Parameters
+    ----------
+    uri : str, optional
+        The database connection URI. If not provided, it will use the default
+        configuration from the Settings class.
+    echo : bool, optional
+        If True, enables SQLAlchemy engine logging, by default False
+
+    Returns
+    -------
+    sqlalchemy.ext.asyncio.AsyncEngine
+        SQLAlchemy async engine object connected to the database
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from suntoday.config import Settings
+
+    settings = Settings()
+    url = make_url(_get_uri(uri))
+    url = url.set(drivername="sqlite+aiosqlite" if url.get_backend_name() == "sqlite" else settings.db_async_driver)
+    key = (url.render_as_string(hide_password=False), echo)
+    with _ENGINE_LOCK:
+        if key not in _ASYNC_ENGINES:
+            engine = create_async_engine(url, echo=echo, **_get_engine_options(url))
+            if url.get_backend_name() == "sqlite":
+                event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+            _ASYNC_ENGINES[key] = engine
+        return _ASYNC_ENGINES[key]
+
+
+def dispose_engines() -> None:
+    """
+    Dispose of every process-wide engine and forget them.
+    """
+    with _ENGINE_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        for engine in _ASYNC_ENGINES.values():
+            engine.sync_engine.dispose()
+        _ENGINES.clear()
+        _ASYNC_ENGINES.clear()
+        _SESSION_FACTORIES.clear()
+        _BOOTSTRAPPED.clear()
+
+
+def create_db(uri=None, *, echo: bool = False):
+    """
+    Create a new database at the specified URI if it doesn't exist.
+
+    Parameters
+    ----------
+    uri : str, optional
+        The database connection URI. If not provided, it will use the default
+        configuration from the Settings class.
+    echo : bool, optional
+        If True, enables SQLAlchemy engine logging, by default False
+
+    Returns
+    -------
+    Engine
+        SQLAlchemy engine object connected to the database
+    """
+    engine = get_engine(uri, echo=echo)
     if not database_exists(engine.url):
         msg = f"Creating database at {engine.url}"
         logger.info(msg)
@@ -99,13 +397,44 @@ def create_db(uri=None, *, echo: bool = False):
         logger.info(msg)
     logger.info("Ensuring all tables are created in the database.")
     BASE.metadata.create_all(engine)
+    _create_indexes(engine)
     return engine
 
 
+def init_db(uri=None, *, echo: bool = False) -> Engine:
+    """
+    Bootstrap the database once per process.
+
+    The first call for a URI runs `create_db`, later calls only return the
+    process-wide engine.
+
+    Parameters
+    ----------
+    uri : str, optional
+        The database connection URI. If not provided, it will use the default
+        configuration from the Settings class.
+    echo : bool, optional
+        If True, enables SQLAlchemy engine logging, by default False
+
+    Returns
+    -------
+    Engine
+        SQLAlchemy engine object connected to the database
+    """
+    uri = _get_uri(uri)
+    with _BOOTSTRAP_LOCK:
+        if uri not in _BOOTSTRAPPED:
+            create_db(uri, echo=echo)
+            _BOOTSTRAPPED.add(uri)
+    return get_engine(uri, echo=echo)
+
+
 def get_session(uri=None, *, echo: bool = False) -> Session:
     """
     Create and return a new database session.
 
+    Sessions share the process-wide engine and its connection pool.
+
     Parameters
     ----------
     uri : str, optional
@@ -119,18 +448,11 @@ def get_session(uri=None, *, echo: bool = False) -> Session:
     Session
         SQLAlchemy session object connected to the database
     """
-    from suntoday.config import Settings
-
-    settings = Settings()
-    uri = uri or settings.db_url.format(
-        db_user=settings.db_user,
-        db_password=settings.db_password,
-        db_host=settings.db_host,
-        db_port=settings.db_port,
-        db_name=settings.db_name,
-    )
-    engine = create_engine(uri, echo=echo)
-    session = sessionmaker(bind=engine)
+    engine = get_engine(uri, echo=echo)
+    with _ENGINE_LOCK:
+        if engine not in _SESSION_FACTORIES:
+            _SESSION_FACTORIES[engine] = sessionmaker(bind=engine)
+        session = _SESSION_FACTORIES[engine]
     return session()
 
 
@@ -203,6 +525,28 @@ def get_record(session: Session, model_type: str, obs_date: datetime.date) -> SD
     return results
 
 
+def _insert(session: Session, model_class):
+    """
+    Return an ``INSERT`` for the dialect of the session that supports ``ON
+    CONFLICT``.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    model_class : type
+        The model to insert into.
+
+    Returns
+    -------
+    sqlalchemy.sql.Insert
+        The dialect specific insert statement.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model_class)
+    return postgresql.insert(model_class)
+
+
 def write_or_update_record(
     session: Session,
     model_type: str,
@@ -214,6 +558,9 @@ def write_or_update_record(
     Write a new record to the database or update an existing one based on the
     observation date.
 
+    This is a single ``INSERT ... ON CONFLICT DO UPDATE`` statement, so
+    concurrent writers can not race between a lookup and the write.
+
     Parameters
     ----------
     session : Session
@@ -234,18 +581,68 @@ def write_or_update_record(
     if model_class is None:
         msg = f"Given type: {model_type} not allowed - {VALID_MODELS.keys()}"
         raise ValueError(msg)
+    statement = _insert(session, model_class).values(obs_date=obs_date, updated_at=updated_at)
+    statement = statement.on_conflict_do_update(
+        index_elements=[model_class.obs_date],
+        set_={"updated_at": statement.excluded.updated_at},
+    ).returning(model_class)
+    try:
+        # populate_existing refreshes any copy of the record already held by the session
+        session.scalars(statement, execution_options={"populate_existing": True}).one()
+        session.commit()
+        logger.info(f"Wrote {model_type} record for {obs_date} with updated_at: {updated_at}")
+    except Exception as e:
+        session.rollback()
+        raise e from None
+
+
+def write_or_update_records(
+    session: Session,
+    model_type: str,
+    records: Mapping[datetime.date, datetime.datetime],
+) -> int:
+    """
+    Write or update many records at once.
+
+    All records are sent as batched ``INSERT ... ON CONFLICT DO UPDATE``
+    statements and committed in a single transaction.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    model_type : str
+        Type of model to create, 'images' or 'timeseries'
+    records : Mapping[datetime.date, datetime.datetime]
+        Mapping of observation date to the timestamp for when the record was updated.
+
+    Returns
+    -------
+    int
+        The number of records written.
+
+    Raises
+    ------
+    ValueError
+        If ``model_type`` is not valid.
+    """
+    model_class = VALID_MODELS.get(model_type)
+    if model_class is None:
+        msg = f"Given type: {model_type} not allowed - {VALID_MODELS.keys()}"
+        raise ValueError(msg)
+    if not records:
+        return 0
+    statement = _insert(session, model_class)
+    statement = statement.on_conflict_do_update(
+        index_elements=[model_class.obs_date],
+        set_={"updated_at": statement.excluded.updated_at},
+    )
+    parameters = [{"obs_date": obs_date, "updated_at": updated_at} for obs_date, updated_at in records.items()]
     try:
-        existing_record = session.query(model_class).filter(model_class.obs_date == obs_date).first()
-        if existing_record:
-            logger.info(f"Found existing {model_type} record for {obs_date}")
-            existing_record.updated_at = updated_at
-            session.commit()
-            logger.info(f"Updated existing {model_type} record for {obs_date} with updated_at: {updated_at}")
-        else:
-            new_record = model_class(obs_date=obs_date, updated_at=updated_at)
-            session.add(new_record)
-            session.commit()
-            logger.info(f"Created new {model_type} record for {obs_date}")
+        session.execute(statement, parameters)
+        session.commit()
+        logger.info(f"Wrote {len(parameters)} {model_type} records")
     except Exception as e:
         session.rollback()
         raise e from None
+    return len(parameters)
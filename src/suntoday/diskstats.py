@@ -0,0 +1,169 @@
+"""
+Provides disk statistics of the calibrated AIA maps, kept as a timeseries.
+
+Every render can compute the mean, sum and percentiles of the
+degradation corrected and exposure normalized AIA maps on the solar
+disk, and append them to the "aia_disk" timeseries of the
+`suntoday.timeseries` archive, in ``Settings.disk_statistics_directory``
+if set. With
+``Settings.lightcurve_source = "disk"`` the lightcurve is plotted from
+these, rather than the ``DATAMEAN`` keyword queried from JSOC, so it
+needs no network at all.
+
+The columns follow the JSOC query, with ``DATAMEAN`` of the whole
+image and ``EXPTIME`` of 1 second as the maps are exposure normalized,
+so the lightcurve plots either.
+"""
+
+import functools
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sunpy.map as smap
+from astropy.coordinates import SkyCoord
+
+from suntoday.config import Settings
+from suntoday.timeseries import append_timeseries, read_timeseries
+
+__all__ = ["DISK_PERCENTILES", "append_disk_statistics", "compute_disk_statistics", "read_disk_statistics"]
+
+DISK_PERCENTILES = [1, 50, 99]
+STATISTICS_TIMESERIES = "aia_disk"
+
+
+@functools.lru_cache(maxsize=4)
+def _get_disk_mask(shape: tuple[int, int], center: tuple[float, float], radius: float) -> np.ndarray:
+    """
+    Return which pixels are on the disk, shared by maps of the same geometry.
+
+    Parameters
+    ----------
+    shape : tuple[int, int]
+        The shape of the map.
+    center : tuple[float, float]
+        The pixel of the disk center, x then y.
+    radius : float
+        The radius of the disk in pixels.
+
+    Returns
+    -------
+    numpy.ndarray
+        The read only mask.
+    """
+    rows, columns = np.ogrid[: shape[0], : shape[1]]
+    mask = (columns - center[0]) ** 2 + (rows - center[1]) ** 2 <= radius**2
+    mask.flags.writeable = False
+    return mask
+
+
+def _get_map_disk_mask(amap: smap.GenericMap) -> np.ndarray:
+    """
+    Return which pixels of a map are on the disk.
+
+    Parameters
+    ----------
+    amap : sunpy.map.GenericMap
+        The map.
+
+    Returns
+    -------
+    numpy.ndarray
+        The read only mask.
+    """
+    disk_center = SkyCoord(0, 0, unit="arcsec", frame=amap.coordinate_frame)
+    center = tuple(round(float(pixel), 2) for pixel in amap.wcs.world_to_pixel(disk_center))
+    radius = round(float((amap.rsun_obs / amap.scale.axis1).to_value("pix")), 2)
+    return _get_disk_mask(amap.data.shape, center, radius)
+
+
+def compute_disk_statistics(maps: list[smap.GenericMap]) -> pd.DataFrame:
+    """
+    Compute the statistics of each calibrated AIA map.
+
+    Parameters
+    ----------
+    maps : list[sunpy.map.GenericMap]
+        The calibrated AIA maps.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A row of each map, indexed by ``DATE-OBS``, with its ``WAVELNTH``,
+        ``DATAMEAN`` of the whole image, ``EXPTIME``, and the ``DISKMEAN``,
+        ``DISKSUM`` and ``DISKP<percentile>`` of the pixels on the disk.
+    """
+    rows = []
+    for amap in maps:
+        data = amap.data
+        # Only the pixels on the disk are copied, once, for all of the statistics
+        on_disk = data[_get_map_disk_mask(amap)]
+        on_disk = on_disk[np.isfinite(on_disk)]
+        row = {
+            "DATE-OBS": amap.date.to_datetime(),
+            "WAVELNTH": f"{amap.wavelength.value:.0f}",
+            "DATAMEAN": float(np.nanmean(data)),
+            "EXPTIME": float(amap.exposure_time.to_value("s")),
+            "DISKMEAN": float(on_disk.mean()) if on_disk.size else np.nan,
+            "DISKSUM": float(on_disk.sum(dtype=np.float64)),
+        }
+        percentiles = np.percentile(on_disk, DISK_PERCENTILES) if on_disk.size else [np.nan] * len(DISK_PERCENTILES)
+        row.update({f"DISKP{q:02d}": float(value) for q, value in zip(DISK_PERCENTILES, percentiles, strict=True)})
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("DATE-OBS")
+
+
+def append_disk_statistics(statistics: pd.DataFrame, directory: Path | None = None) -> list[Path]:
+    """
+    Append statistics to the timeseries archive.
+
+    Statistics of a map already in the archive, e.g., rendered again by
+    a backfill, replace it.
+
+    Parameters
+    ----------
+    statistics : pandas.DataFrame
+        The statistics, as from `compute_disk_statistics`.
+    directory : pathlib.Path, optional
+        The archive, defaults to ``Settings.disk_statistics_directory``,
+        or ``Settings.timeseries_archive_directory`` if that is not set.
+
+    Returns
+    -------
+    list[pathlib.Path]
+        The files written.
+    """
+    return append_timeseries(STATISTICS_TIMESERIES, statistics, directory or Settings().disk_statistics_directory)
+
+
+def read_disk_statistics(
+    end_time: datetime, duration: timedelta = timedelta(days=1), directory: Path | None = None
+) -> pd.DataFrame:
+    """
+    Read the statistics of a time range from the timeseries archive.
+
+    Parameters
+    ----------
+    end_time : datetime.datetime
+        The end of the range.
+    duration : datetime.timedelta, optional
+        The length of the range, defaults to a day.
+    directory : pathlib.Path, optional
+        The archive, defaults to ``Settings.disk_statistics_directory``,
+        or ``Settings.timeseries_archive_directory`` if that is not set.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The statistics in (``end_time - duration``, ``end_time``], in time
+        order, indexed in UTC.
+    """
+    statistics = read_timeseries(
+        STATISTICS_TIMESERIES, end_time, duration, directory=directory or Settings().disk_statistics_directory
+    )
+    if statistics.empty:
+        return pd.DataFrame(
+            columns=["WAVELNTH", "DATAMEAN", "EXPTIME"], index=pd.DatetimeIndex([], tz="UTC", name="DATE-OBS")
+        )
+    return statistics
@@ -1,10 +1,26 @@
 """
-Provides a GOES NRT downloader for the 1 day JSON files.
+Provides a GOES NRT downloader for the SWPC JSON files.
 """
 
+from datetime import timedelta
+
 import pandas as pd
 
-__all__ = ["fetch_goes_timeseries"]
+from suntoday import logger
+from suntoday.metrics import measure
+
+__all__ = ["fetch_goes_timeseries", "get_latest_goes_flux", "goes_class_to_flux"]
+
+# Lower flux bound (W/m^2) of each GOES XRS 0.1-0.8 nm class
+GOES_CLASS_FLUX = {"A": 1e-8, "B": 1e-7, "C": 1e-6, "M": 1e-5, "X": 1e-4}
+# The XRS files SWPC serves, by how much data they have
+GOES_FEEDS = {
+    timedelta(hours=6): "6-hour",
+    timedelta(days=1): "1-day",
+    timedelta(days=3): "3-day",
+    timedelta(days=7): "7-day",
+}
+GOES_URL = "https://services.swpc.noaa.gov/json/goes/{satellite}/xrays-{feed}.json"
 
 
 def _reformat_goes_df(goes_df: pd.DataFrame) -> pd.DataFrame:
@@ -28,17 +44,76 @@ def _reformat_goes_df(goes_df: pd.DataFrame) -> pd.DataFrame:
     return goes_df.astype({"satellite": int, "flux": float, "energy": str}, copy=False)
 
 
-def fetch_goes_timeseries() -> tuple[pd.DataFrame, pd.DataFrame]:
+def fetch_goes_timeseries(duration: timedelta = timedelta(days=1)) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Fetches the GOES XRS JSON data for the previous 24 hours.
+    Fetches the GOES XRS JSON data for the given duration.
+
+    The smallest SWPC file with the duration is downloaded, SWPC has none
+    longer than 7 days.
+
+    Parameters
+    ----------
+    duration : datetime.timedelta, optional
+        How much of the latest data, defaults to a day.
 
     Returns
     -------
     pandas.DataFrame, pandas.DataFrame
-        GOES XRS data for the previous 24 hours for the primary and secondary satellites.
+        GOES XRS data for the primary and secondary satellites.
     """
-    goes_primary = pd.read_json("https://services.swpc.noaa.gov/json/goes/primary/xrays-1-day.json")
-    goes_secondary = pd.read_json("https://services.swpc.noaa.gov/json/goes/secondary/xrays-1-day.json")
+    feed = next((feed for length, feed in GOES_FEEDS.items() if length >= duration), None)
+    if feed is None:
+        feed = list(GOES_FEEDS.values())[-1]
+        logger.warning(f"SWPC has no GOES data for {duration}, using the {feed} file")
+    with measure("download", "goes"):
+        goes_primary = pd.read_json(GOES_URL.format(satellite="primary", feed=feed))
+        goes_secondary = pd.read_json(GOES_URL.format(satellite="secondary", feed=feed))
     goes_primary = _reformat_goes_df(goes_primary)
     goes_secondary = _reformat_goes_df(goes_secondary)
     return goes_primary, goes_secondary
+
+
+def goes_class_to_flux(goes_class: str) -> float:
+    """
+    Converts a GOES class, e.g., "M1" or "X2.5", to a flux.
+
+    Parameters
+    ----------
+    goes_class : str
+        The GOES class.
+
+    Returns
+    -------
+    float
+        The 0.1-0.8 nm flux in W/m^2.
+
+    Raises
+    ------
+    ValueError
+        If the GOES class is not valid.
+    """
+    letter, number = goes_class[:1].upper(), goes_class[1:] or "1"
+    if letter not in GOES_CLASS_FLUX:
+        msg = f"Invalid GOES class {goes_class}, must start with one of {list(GOES_CLASS_FLUX)}"
+        raise ValueError(msg)
+    return GOES_CLASS_FLUX[letter] * float(number)
+
+
+def get_latest_goes_flux(goes_timeseries: pd.DataFrame) -> float:
+    """
+    Gets the latest valid 0.1-0.8 nm flux from a GOES DataFrame.
+
+    Parameters
+    ----------
+    goes_timeseries : pandas.DataFrame
+        GOES XRS data from `fetch_goes_timeseries`.
+
+    Returns
+    -------
+    float
+        The latest flux in W/m^2 or NaN if there is none.
+    """
+    flux = goes_timeseries.loc[goes_timeseries["energy"] == "0.1-0.8nm", "flux"].dropna()
+    if flux.empty:
+        return float("nan")
+    return float(flux.sort_index().iloc[-1])
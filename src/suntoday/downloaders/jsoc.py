@@ -2,7 +2,7 @@
 Provides a JSOC NRT downloader for the AIA level 1.5 series.
 """
 
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 
 import numpy as np
@@ -15,8 +15,16 @@ from suntoday import logger
 from suntoday.config import Settings
 from suntoday.constants import AIA_WAVELENGTHS
 from suntoday.downloaders.downloader import create_downloader
+from suntoday.metrics import measure
 
-__all__ = ["fetch_aia_fits", "fetch_aia_timeseries", "fetch_hmi_fits", "get_aia_urls", "get_hmi_urls"]
+__all__ = [
+    "fetch_aia_fits",
+    "fetch_aia_timeseries",
+    "fetch_hmi_fits",
+    "get_aia_urls",
+    "get_hmi_urls",
+    "get_latest_aia_time",
+]
 
 
 def _get_urls(query: str, keywords: str, segment: str) -> dict:
@@ -178,9 +186,64 @@ def get_hmi_urls(requested_time: datetime) -> pd.DataFrame:
     return hmi_urls
 
 
-def fetch_aia_timeseries(end_time: datetime) -> pd.DataFrame:
+def get_latest_aia_time(lookback: timedelta = timedelta(minutes=10)) -> datetime | None:
     """
-    Fetches the NRT AIA data mean for the previous 24 hours.
+    Gets the time of the newest complete set of NRT AIA data.
+
+    Only the keywords are requested, so this is cheap enough to poll.
+    A set is complete once every wavelength has a record at or after the
+    returned time, which is what `fetch_aia_fits` needs.
+
+    Parameters
+    ----------
+    lookback : datetime.timedelta
+        How far back from now to look for data.
+        Default is 10 minutes.
+
+    Returns
+    -------
+    datetime.datetime | None
+        Time of the newest complete set or None if there is none within ``lookback``.
+
+    Raises
+    ------
+    OSError
+        If the network connection fails to the JSOC.
+    """
+    settings = Settings()
+    end_time = datetime.now(UTC)
+    start_time = end_time - lookback
+    auth = None
+    if settings.test_env:
+        logger.warning("Using test environment credentials for JSOC.")
+        auth = HTTPBasicAuth(settings.jsoc_user, settings.jsoc_password)
+    params = {
+        "ds": f"aia_test.lev1p5[{start_time.strftime(settings.jsoc_str_fmt)}-{end_time.strftime(settings.jsoc_str_fmt)}]",
+        "op": "rs_list",
+        "key": "DATE-OBS,WAVELNTH",
+    }
+    response = requests.get(settings.jsoc_info_url, params=params, auth=auth, timeout=60, verify=False)  # NOQA: S501
+    logger.debug(f"JSOC request for {settings.jsoc_info_url} with params {params} returned {response.status_code}.")
+    if response.status_code != 200:
+        msg = f"JSOC request failed with {response.status_code} and {response.text}."
+        raise OSError(msg)
+    keywords = {ad["name"]: ad["values"] for ad in response.json().get("keywords", [])}
+    if not keywords.get("DATE-OBS"):
+        return None
+    records = pd.DataFrame.from_dict(keywords)
+    records["DATE-OBS"] = pd.to_datetime(records["DATE-OBS"], format="mixed", utc=True)
+    records["WAVELNTH"] = records["WAVELNTH"].astype(str)
+    latest = records.groupby("WAVELNTH")["DATE-OBS"].max()
+    if not set(AIA_WAVELENGTHS).issubset(latest.index):
+        return None
+    # The AIA cadences are shorter than the fetch window, so every wavelength
+    # has a record within the window starting at the oldest of the latest records.
+    return latest[AIA_WAVELENGTHS].min().to_pydatetime()
+
+
+def fetch_aia_timeseries(end_time: datetime, duration: timedelta = timedelta(days=1)) -> pd.DataFrame:
+    """
+    Fetches the NRT AIA data mean for the given duration before the end time.
 
     This uses the test data that John creates on JSOC 2.
 
@@ -188,11 +251,13 @@ def fetch_aia_timeseries(end_time: datetime) -> pd.DataFrame:
     ----------
     end_time : datetime.datetime
         End time for the data.
+    duration : datetime.timedelta, optional
+        How much data before the end time, defaults to a day.
 
     Returns
     -------
     pandas.DataFrame
-        AIA data for the previous 24 hours.
+        AIA data for the duration before the end time.
 
     Raises
     ------
@@ -202,7 +267,7 @@ def fetch_aia_timeseries(end_time: datetime) -> pd.DataFrame:
         If no data is returned.
     """
     settings = Settings()
-    start_time = end_time - timedelta(days=1)
+    start_time = end_time - duration
     auth = None
     if settings.test_env:
         logger.warning("Using test environment credentials for JSOC.")
@@ -213,7 +278,9 @@ def fetch_aia_timeseries(end_time: datetime) -> pd.DataFrame:
         "op": "rs_list",
         "key": "DATE-OBS,WAVELNTH,DATAMEAN,QUALITY,EXPTIME",
     }
-    response = requests.get(settings.jsoc_info_url, params=params, auth=auth, timeout=60, verify=False)  # NOQA: S501
+    with measure("jsoc_query", "aia_timeseries") as metrics:
+        response = requests.get(settings.jsoc_info_url, params=params, auth=auth, timeout=60, verify=False)  # NOQA: S501
+        metrics.add_bytes(len(response.content))
     logger.debug(f"JSOC request for {settings.jsoc_info_url} with params {params} returned {response.status_code}.")
     logger.debug(f"URL: {response.url}")
     if response.status_code != 200:
@@ -257,7 +324,8 @@ def fetch_aia_fits(requested_time: datetime, time_span: str = "36s", save_direct
     OSError
         If parfive fails to download any files.
     """
-    aia_info = get_aia_urls(requested_time, time_span=time_span)
+    with measure("jsoc_query", "aia"):
+        aia_info = get_aia_urls(requested_time, time_span=time_span)
     downloader = create_downloader()
     for idx, row in aia_info.iterrows():
         downloader.enqueue_file(
@@ -265,7 +333,9 @@ def fetch_aia_fits(requested_time: datetime, time_span: str = "36s", save_direct
             path=save_directory,
             filename=f"{idx.strftime('%Y%m%d_%H%M%S')}_{row['WAVELNTH']}.fits",
         )
-    files = downloader.download()
+    with measure("download", "aia") as metrics:
+        files = downloader.download()
+        metrics.add_bytes(sum(Path(file).stat().st_size for file in files))
     if files.errors:
         msg = f"Failed to download {files.errors}."
         raise OSError(msg)
@@ -292,7 +362,8 @@ def fetch_hmi_fits(requested_time: datetime, save_directory: Path = Path("./"))
     OSError
         If parfive fails to download any files.
     """
-    hmi_info = get_hmi_urls(requested_time)
+    with measure("jsoc_query", "hmi"):
+        hmi_info = get_hmi_urls(requested_time)
     downloader = create_downloader()
     for idx, row in hmi_info.iterrows():
         downloader.enqueue_file(
@@ -300,7 +371,9 @@ def fetch_hmi_fits(requested_time: datetime, save_directory: Path = Path("./"))
             path=save_directory,
             filename=f"{idx.strftime('%Y%m%d_%H%M%S')}_{row['WAVELNTH']}.fits",
         )
-    files = downloader.download()
+    with measure("download", "hmi") as metrics:
+        files = downloader.download()
+        metrics.add_bytes(sum(Path(file).stat().st_size for file in files))
     if files.errors:
         msg = f"Failed to download {files.errors}."
         raise OSError(msg)
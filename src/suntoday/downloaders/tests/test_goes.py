@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 import pandas as pd
+import pytest
 
-from suntoday.downloaders.goes import fetch_goes_timeseries
+from suntoday.downloaders.goes import fetch_goes_timeseries, get_latest_goes_flux, goes_class_to_flux
 
 
 def test_fetch_goes_timeseries() -> None:
@@ -17,3 +20,47 @@ def test_fetch_goes_timeseries() -> None:
         assert dataframe["flux"].dtype == "float64"
         assert dataframe["energy"].dtype == "object"
         assert sorted(dataframe["energy"].unique().tolist()) == sorted(["0.05-0.4nm", "0.1-0.8nm"])
+
+
+@pytest.mark.parametrize(
+    ("duration", "feed"),
+    [
+        (timedelta(hours=6), "xrays-6-hour.json"),
+        (timedelta(hours=7), "xrays-1-day.json"),
+        (timedelta(days=3), "xrays-3-day.json"),
+        (timedelta(days=27), "xrays-7-day.json"),
+    ],
+)
+def test_fetch_goes_timeseries_duration(mocker, duration, feed) -> None:
+    goes_json = pd.DataFrame({
+        "time_tag": ["2025-07-30T00:00:00Z"],
+        "satellite": [18],
+        "flux": [1e-6],
+        "observed_flux": [1e-6],
+        "electron_correction": [0.0],
+        "electron_contaminaton": [False],
+        "energy": ["0.1-0.8nm"],
+    })
+    read_json = mocker.patch("suntoday.downloaders.goes.pd.read_json", return_value=goes_json)
+    goes_primary, _goes_secondary = fetch_goes_timeseries(duration)
+    assert [call.args[0].rsplit("/", 1)[-1] for call in read_json.call_args_list] == [feed, feed]
+    assert list(goes_primary.columns) == ["satellite", "flux", "energy"]
+
+
+@pytest.mark.parametrize(
+    ("goes_class", "flux"),
+    [("A1", 1e-8), ("C", 1e-6), ("M1", 1e-5), ("m2.5", 2.5e-5), ("X10", 1e-3)],
+)
+def test_goes_class_to_flux(goes_class, flux) -> None:
+    assert goes_class_to_flux(goes_class) == pytest.approx(flux)
+
+
+def test_goes_class_to_flux_invalid() -> None:
+    with pytest.raises(ValueError, match="Invalid GOES class"):
+        goes_class_to_flux("Q1")
+
+
+def test_get_latest_goes_flux(goes_primary_timeseries) -> None:
+    flux = get_latest_goes_flux(goes_primary_timeseries)
+    long_channel = goes_primary_timeseries[goes_primary_timeseries["energy"] == "0.1-0.8nm"]
+    assert flux == long_channel["flux"].dropna().iloc[-1]
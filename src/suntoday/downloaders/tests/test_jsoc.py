@@ -3,7 +3,14 @@ from datetime import UTC, datetime, timedelta
 import pandas as pd
 
 from suntoday.constants import AIA_WAVELENGTHS
-from suntoday.downloaders.jsoc import fetch_aia_fits, fetch_aia_timeseries, fetch_hmi_fits, get_aia_urls, get_hmi_urls
+from suntoday.downloaders.jsoc import (
+    fetch_aia_fits,
+    fetch_aia_timeseries,
+    fetch_hmi_fits,
+    get_aia_urls,
+    get_hmi_urls,
+    get_latest_aia_time,
+)
 
 
 def test_get_aia_urls() -> None:
@@ -77,3 +84,25 @@ def test_fetch_aia_timeseries() -> None:
     assert aia_ts.loc[aia_ts["QUALITY"] != "0x40000000", "DATAMEAN"].isna().all()
     assert aia_ts["EXPTIME"].dtype == "float64"
     assert aia_ts.index.dtype == "datetime64[ns, UTC]"
+
+
+def test_get_latest_aia_time(mocker) -> None:
+    dates = [f"2025-08-04T00:00:{second:02d}Z" for second in range(len(AIA_WAVELENGTHS))]
+    response = mocker.Mock(status_code=200)
+    response.json.return_value = {
+        "keywords": [
+            {"name": "DATE-OBS", "values": [*dates, "2025-08-04T00:01:00Z"]},
+            {"name": "WAVELNTH", "values": [*AIA_WAVELENGTHS, "171"]},
+        ]
+    }
+    mocker.patch("suntoday.downloaders.jsoc.requests.get", return_value=response)
+    assert get_latest_aia_time() == datetime(2025, 8, 4, 0, 0, 0, tzinfo=UTC)
+
+    # Not every wavelength has data yet
+    response.json.return_value = {
+        "keywords": [
+            {"name": "DATE-OBS", "values": ["2025-08-04T00:01:00Z"]},
+            {"name": "WAVELNTH", "values": ["171"]},
+        ]
+    }
+    assert get_latest_aia_time() is None
@@ -0,0 +1,228 @@
+"""
+Provides a cache of the last calibrated AIA frames of each wavelength.
+
+Every render adds its calibrated AIA maps to the cache, so the running
+difference and base ratio products can be made against earlier frames
+without downloading them again from JSOC.
+
+Each wavelength has a ring buffer of ``Settings.frame_cache_size``
+frames, the oldest frame is replaced by the newest. The buffers are in
+memory, so only live as long as the process, unless
+``Settings.frame_cache_directory`` is set, where they are memory mapped
+``.npy`` files with a JSON index of the time of each frame.
+"""
+
+import json
+import operator
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.publish import write_atomic
+
+__all__ = ["FrameCache", "base_ratio", "get_frame_cache", "running_difference"]
+
+# Process-wide caches, keyed by directory and size, so every render shares the buffers
+_FRAME_CACHES = {}
+_FRAME_CACHES_LOCK = threading.Lock()
+
+
+class FrameCache:
+    """
+    A ring buffer of the last calibrated frames of each wavelength.
+
+    Parameters
+    ----------
+    size : int
+        How many frames to keep of each wavelength.
+    directory : pathlib.Path, optional
+        The directory of the memory mapped buffers.
+        The buffers are in memory if not set.
+    """
+
+    def __init__(self, size: int, directory: Path | None = None) -> None:
+        self.size = size
+        self.directory = Path(directory).expanduser() if directory is not None else None
+        self._buffers: dict[str, np.ndarray] = {}
+        self._times: dict[str, list[str | None]] = {}
+        self._lock = threading.Lock()
+
+    def _write_index(self, key: str) -> None:
+        """
+        Write the times of the frames in the buffer of a wavelength.
+
+        Parameters
+        ----------
+        key : str
+            The wavelength.
+        """
+        if self.directory is not None:
+            write_atomic(self.directory / f"{key}.json", json.dumps(self._times[key]).encode())
+
+    def _load(self, key: str, shape: tuple[int, ...]) -> tuple[np.ndarray, list[str | None]]:
+        """
+        Return the buffer of a wavelength and the times of its frames.
+
+        A buffer that is missing, unreadable or of another size is made
+        again, empty.
+
+        Parameters
+        ----------
+        key : str
+            The wavelength.
+        shape : tuple[int, ...]
+            The shape of the frames.
+
+        Returns
+        -------
+        numpy.ndarray
+            The buffer.
+        list[str | None]
+            The ISO formatted time of each frame, or None for empty slots.
+        """
+        shape = (self.size, *shape)
+        buffer = self._buffers.get(key)
+        if buffer is not None and buffer.shape == shape:
+            return buffer, self._times[key]
+        if self.directory is None:
+            buffer, times = np.zeros(shape, dtype=np.float32), [None] * self.size
+        else:
+            path = self.directory / f"{key}.npy"
+            try:
+                buffer = np.lib.format.open_memmap(path, mode="r+")
+                times = json.loads((self.directory / f"{key}.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                buffer, times = None, []
+            if buffer is None or buffer.shape != shape or buffer.dtype != np.float32 or len(times) != self.size:
+                logger.debug(f"Creating frame cache {path} of {shape} frames")
+                self.directory.mkdir(parents=True, exist_ok=True)
+                buffer = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+                times = [None] * self.size
+        self._buffers[key], self._times[key] = buffer, times
+        return buffer, times
+
+    def get_frames(
+        self, key: str, shape: tuple[int, ...], before: datetime, max_age: timedelta | None = None
+    ) -> list[tuple[datetime, np.ndarray]]:
+        """
+        Return the cached frames of a wavelength from before a time.
+
+        Parameters
+        ----------
+        key : str
+            The wavelength.
+        shape : tuple[int, ...]
+            The shape of the frames.
+        before : datetime.datetime
+            Only frames from before this time are returned.
+        max_age : datetime.timedelta, optional
+            Only frames at most this much older than ``before`` are returned.
+
+        Returns
+        -------
+        list[tuple[datetime.datetime, numpy.ndarray]]
+            The time and a copy of each frame, oldest first. Frames added
+            afterwards, e.g., by another render, do not change them.
+        """
+        with self._lock:
+            buffer, times = self._load(key, shape)
+            frames = []
+            for slot, isotime in enumerate(times):
+                if isotime is None:
+                    continue
+                time = datetime.fromisoformat(isotime)
+                if time < before and (max_age is None or before - time <= max_age):
+                    frames.append((time, np.array(buffer[slot])))
+        return sorted(frames, key=operator.itemgetter(0))
+
+    def add(self, key: str, time: datetime, data: np.ndarray) -> None:
+        """
+        Add a frame, replacing the frame of the same time or the oldest.
+
+        Parameters
+        ----------
+        key : str
+            The wavelength.
+        time : datetime.datetime
+            The time of the frame.
+        data : numpy.ndarray
+            The frame.
+        """
+        with self._lock:
+            buffer, times = self._load(key, data.shape)
+            if time.isoformat() in times:
+                slot = times.index(time.isoformat())
+            elif None in times:
+                slot = times.index(None)
+            else:
+                slot = min(range(self.size), key=lambda slot: times[slot])
+            # The slot is marked empty while it is written, so a crash never pairs a time with the wrong frame
+            times[slot] = None
+            self._write_index(key)
+            buffer[slot] = data
+            if isinstance(buffer, np.memmap):
+                buffer.flush()
+            times[slot] = time.isoformat()
+            self._write_index(key)
+
+
+def get_frame_cache() -> FrameCache | None:
+    """
+    Return the frame cache of this process.
+
+    Returns
+    -------
+    FrameCache | None
+        The cache, or None if ``Settings.frame_cache_size`` is 0.
+    """
+    settings = Settings()
+    if settings.frame_cache_size <= 0:
+        return None
+    key = (settings.frame_cache_directory, settings.frame_cache_size)
+    with _FRAME_CACHES_LOCK:
+        if key not in _FRAME_CACHES:
+            _FRAME_CACHES[key] = FrameCache(settings.frame_cache_size, settings.frame_cache_directory)
+        return _FRAME_CACHES[key]
+
+
+def running_difference(data: np.ndarray, frames: list[tuple[datetime, np.ndarray]]) -> np.ndarray:
+    """
+    Return the difference of a frame and the latest cached frame.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The frame.
+    frames : list[tuple[datetime.datetime, numpy.ndarray]]
+        The cached frames, oldest first, as from `FrameCache.get_frames`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The difference.
+    """
+    return np.subtract(data, frames[-1][1], dtype=np.float32)
+
+
+def base_ratio(data: np.ndarray, frames: list[tuple[datetime, np.ndarray]]) -> np.ndarray:
+    """
+    Return the ratio of a frame to the oldest cached frame.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The frame.
+    frames : list[tuple[datetime.datetime, numpy.ndarray]]
+        The cached frames, oldest first, as from `FrameCache.get_frames`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The ratio, NaN where the base frame has no signal.
+    """
+    base = frames[0][1]
+    return np.divide(data, base, out=np.full(data.shape, np.nan, dtype=np.float32), where=base > 0, dtype=np.float32)
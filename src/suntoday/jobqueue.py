@@ -0,0 +1,671 @@
+"""
+Provides a job queue stored in the database, so many workers can render in
+parallel.
+
+On PostgreSQL a job is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so any number of workers on any number of machines never claim the same
+job and never wait on each other. A claimed job is hidden from other
+workers for ``Settings.queue_visibility_timeout`` seconds, which the
+worker keeps extending while it runs. If a worker dies the job becomes
+visible again and is retried, up to ``Settings.queue_max_attempts`` times,
+after which `reap_jobs` marks it failed.
+
+A job is a task at a requested time: an "images" job downloads,
+calibrates and renders every SDO product, as the products share the
+downloaded and calibrated maps, and a "timeseries" job renders the
+lightcurves. A job can be narrowed to a single product with ``product``,
+e.g., to re-render it, but the download, calibration and rendering are
+not queued as separate jobs.
+
+SQLite also works, as every claim is a single statement, but is only
+meant for workers on one machine.
+
+Run a worker with ``python -m suntoday.jobqueue``.
+"""
+
+import datetime
+import os
+import socket
+import threading
+from collections.abc import Callable, Iterable
+
+import schedule
+from sqlalchemy import Update, or_, select, update
+from sqlalchemy.orm import Session
+
+from suntoday import init_sentry, logger
+from suntoday.config import Settings
+from suntoday.db import Job, _insert, get_session, init_db
+
+__all__ = [
+    "BACKFILL_TASK",
+    "JOB_DONE",
+    "JOB_FAILED",
+    "JOB_QUEUED",
+    "JOB_RUNNING",
+    "TASKS",
+    "claim_job",
+    "complete_job",
+    "enqueue_jobs",
+    "enqueue_latest",
+    "extend_job",
+    "fail_job",
+    "reap_jobs",
+    "requeue_jobs",
+    "run_job",
+    "run_worker",
+    "schedule_enqueue",
+]
+
+# "backfill" renders past SDO images without touching their records
+BACKFILL_TASK = "backfill"
+TASKS = ["images", "timeseries", BACKFILL_TASK]
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+def _get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_jobs(
+    session: Session,
+    task: str,
+    requested_times: Iterable[datetime.datetime],
+    product: str = "",
+) -> int:
+    """
+    Queue a job for each requested time.
+
+    Jobs that are already queued, whatever their status, are left alone.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    task : str
+        The task to run, "images", "timeseries" or "backfill".
+    requested_times : Iterable[datetime.datetime]
+        The times to create the images for.
+    product : str, optional
+        Only create this SDO product, see `suntoday.jpegs.get_product_name`.
+        Defaults to all products.
+
+    Returns
+    -------
+    int
+        The number of new jobs queued.
+
+    Raises
+    ------
+    ValueError
+        If ``task`` is not valid.
+    """
+    if task not in TASKS:
+        msg = f"Given task: {task} not allowed - {TASKS}"
+        raise ValueError(msg)
+    now = _utcnow()
+    parameters = [
+        {
+            "task": task,
+            "requested_time": requested_time,
+            "product": product,
+            "status": JOB_QUEUED,
+            "attempts": 0,
+            "visible_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for requested_time in requested_times
+    ]
+    if not parameters:
+        return 0
+    statement = (
+        _insert(session, Job)
+        .on_conflict_do_nothing(index_elements=["task", "requested_time", "product"])
+        .returning(Job.id)
+    )
+    try:
+        # Only the new jobs are returned, ones that already exist are skipped
+        queued = len(session.connection().execute(statement, parameters).all())
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e from None
+    logger.info(f"Queued {queued} new {task} jobs")
+    return queued
+
+
+def _get_range_conditions(
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> list:
+    """
+    Return the conditions that select jobs of a task and time range.
+
+    Parameters
+    ----------
+    task : str, optional
+        Only select jobs of this task.
+    start : datetime.datetime, optional
+        Only select jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only select jobs requested at or before this time.
+
+    Returns
+    -------
+    list
+        The conditions, empty if all jobs are selected.
+    """
+    conditions = []
+    if task is not None:
+        conditions.append(Job.task == task)
+    if start is not None:
+        conditions.append(Job.requested_time >= start)
+    if end is not None:
+        conditions.append(Job.requested_time <= end)
+    return conditions
+
+
+def reap_jobs(
+    session: Session,
+    *,
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> int:
+    """
+    Mark running jobs whose worker died on their last attempt as failed.
+
+    Such a job is no longer extended, but can not be claimed again as it
+    has been attempted ``Settings.queue_max_attempts`` times, so would
+    otherwise stay running forever.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    task : str, optional
+        Only reap jobs of this task.
+    start : datetime.datetime, optional
+        Only reap jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only reap jobs requested at or before this time.
+
+    Returns
+    -------
+    int
+        The number of jobs marked as failed.
+    """
+    now = _utcnow()
+    statement = (
+        update(Job)
+        .where(
+            Job.status == JOB_RUNNING,
+            Job.visible_at <= now,
+            Job.attempts >= Settings().queue_max_attempts,
+            *_get_range_conditions(task, start, end),
+        )
+        .values(status=JOB_FAILED, error="Worker stopped during the last attempt", updated_at=now)
+        .returning(Job.id)
+    )
+    try:
+        reaped = session.execute(statement, execution_options={"synchronize_session": False}).scalars().all()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e from None
+    if reaped:
+        logger.error(f"Marked jobs {reaped} as failed, their worker stopped during the last attempt")
+    return len(reaped)
+
+
+def _is_orphaned(worker_id: str | None) -> bool:
+    """
+    Return whether a worker was on this machine and its process has stopped.
+
+    Parameters
+    ----------
+    worker_id : str, optional
+        Identifies the worker, starts with the hostname and process ID.
+
+    Returns
+    -------
+    bool
+        True if the worker's process no longer exists.
+    """
+    hostname, _, pid = (worker_id or "").partition(":")
+    pid = pid.split(":")[0]
+    if hostname != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def requeue_jobs(
+    session: Session,
+    *,
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> int:
+    """
+    Queue failed jobs, and running jobs whose worker has stopped, again.
+
+    A running job's worker has stopped if its visibility timeout has
+    passed, or it was on this machine and its process no longer exists.
+    The jobs' attempts are reset, so they are retried
+    ``Settings.queue_max_attempts`` more times.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    task : str, optional
+        Only queue jobs of this task.
+    start : datetime.datetime, optional
+        Only queue jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only queue jobs requested at or before this time.
+
+    Returns
+    -------
+    int
+        The number of jobs queued again.
+    """
+    now = _utcnow()
+    try:
+        jobs = session.execute(
+            select(Job.id, Job.status, Job.visible_at, Job.claimed_by).where(
+                or_(Job.status == JOB_FAILED, Job.status == JOB_RUNNING), *_get_range_conditions(task, start, end)
+            )
+        ).all()
+        job_ids = [
+            job.id for job in jobs if job.status == JOB_FAILED or job.visible_at <= now or _is_orphaned(job.claimed_by)
+        ]
+        if job_ids:
+            session.execute(
+                update(Job)
+                .where(Job.id.in_(job_ids))
+                .values(status=JOB_QUEUED, attempts=0, visible_at=now, updated_at=now),
+                execution_options={"synchronize_session": False},
+            )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e from None
+    if job_ids:
+        logger.info(f"Queued {len(job_ids)} failed or stopped jobs again")
+    return len(job_ids)
+
+
+def _get_claim_statement(
+    worker_id: str,
+    now: datetime.datetime,
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> Update:
+    """
+    Return the statement that claims the oldest visible job.
+
+    Parameters
+    ----------
+    worker_id : str
+        Identifies the worker.
+    now : datetime.datetime
+        The current time.
+    task : str, optional
+        Only claim jobs of this task.
+    start : datetime.datetime, optional
+        Only claim jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only claim jobs requested at or before this time.
+
+    Returns
+    -------
+    sqlalchemy.sql.Update
+        The statement, it returns the claimed job if there was one.
+    """
+    settings = Settings()
+    conditions = [
+        or_(Job.status == JOB_QUEUED, Job.status == JOB_RUNNING),
+        Job.visible_at <= now,
+        Job.attempts < settings.queue_max_attempts,
+        *_get_range_conditions(task, start, end),
+    ]
+    next_job = (
+        select(Job.id)
+        .where(*conditions)
+        .order_by(Job.visible_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Job)
+        .where(Job.id == next_job)
+        .values(
+            status=JOB_RUNNING,
+            attempts=Job.attempts + 1,
+            claimed_by=worker_id,
+            visible_at=now + datetime.timedelta(seconds=settings.queue_visibility_timeout),
+            updated_at=now,
+        )
+        .returning(Job)
+    )
+
+
+def claim_job(
+    session: Session,
+    worker_id: str | None = None,
+    *,
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+) -> Job | None:
+    """
+    Claim the oldest visible job.
+
+    Jobs that are still queued, and running jobs whose worker has not
+    extended them in time, can be claimed. The claimed job is hidden from
+    other workers for ``Settings.queue_visibility_timeout`` seconds.
+    Running jobs that can not be claimed again are reaped first, see
+    `reap_jobs`.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    worker_id : str, optional
+        Identifies the worker, defaults to the hostname and process ID.
+    task : str, optional
+        Only claim jobs of this task.
+    start : datetime.datetime, optional
+        Only claim jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only claim jobs requested at or before this time.
+
+    Returns
+    -------
+    Job | None
+        The claimed job, or None if there is nothing to do.
+    """
+    reap_jobs(session, task=task, start=start, end=end)
+    statement = _get_claim_statement(worker_id or _get_worker_id(), _utcnow(), task, start, end)
+    try:
+        job = session.scalars(
+            statement, execution_options={"populate_existing": True, "synchronize_session": False}
+        ).one_or_none()
+        # Detached, so the job keeps its values after the commit and can be shared with other threads
+        if job is not None:
+            session.expunge(job)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e from None
+    if job is not None:
+        logger.info(f"Claimed {job.task} job {job.id} for {job.requested_time}, attempt {job.attempts}")
+    return job
+
+
+def _update_job(session: Session, job: Job, **values) -> None:
+    """
+    Update a job claimed by this worker.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    job : Job
+        The claimed job.
+    **values
+        The columns to update.
+    """
+    values["updated_at"] = _utcnow()
+    try:
+        session.execute(update(Job).where(Job.id == job.id).values(**values))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e from None
+
+
+def extend_job(session: Session, job: Job) -> None:
+    """
+    Hide a running job from other workers for another visibility timeout.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    job : Job
+        The claimed job.
+    """
+    visible_at = _utcnow() + datetime.timedelta(seconds=Settings().queue_visibility_timeout)
+    _update_job(session, job, visible_at=visible_at)
+
+
+def complete_job(session: Session, job: Job) -> None:
+    """
+    Mark a job as done.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    job : Job
+        The claimed job.
+    """
+    _update_job(session, job, status=JOB_DONE, error=None)
+    logger.info(f"Completed {job.task} job {job.id}")
+
+
+def fail_job(session: Session, job: Job, error: str) -> None:
+    """
+    Record a failed attempt of a job.
+
+    The job is retried after ``Settings.queue_retry_delay`` seconds,
+    doubled for each previous attempt, until it has been attempted
+    ``Settings.queue_max_attempts`` times.
+
+    Parameters
+    ----------
+    session : Session
+        SQLAlchemy session object.
+    job : Job
+        The claimed job.
+    error : str
+        The error of the attempt.
+    """
+    settings = Settings()
+    if job.attempts >= settings.queue_max_attempts:
+        _update_job(session, job, status=JOB_FAILED, error=error)
+        logger.error(f"{job.task} job {job.id} failed after {job.attempts} attempts: {error}")
+        return
+    retry_delay = settings.queue_retry_delay * 2 ** (job.attempts - 1)
+    visible_at = _utcnow() + datetime.timedelta(seconds=retry_delay)
+    _update_job(session, job, status=JOB_QUEUED, visible_at=visible_at, error=error)
+    logger.warning(f"{job.task} job {job.id} failed, retrying in {retry_delay} seconds: {error}")
+
+
+def run_job(job: Job) -> None:
+    """
+    Run the task of a job.
+
+    Like a job run by the scheduler, its metrics are exported, it is
+    profiled and its outputs are published, except those of a backfill,
+    which are of a past day.
+
+    Parameters
+    ----------
+    job : Job
+        The claimed job.
+    """
+    from suntoday.main import create_images, get_save_directory, run_in_job
+
+    save_directory = get_save_directory(job.requested_time)
+    with run_in_job(save_directory, name=f"{job.task}_job", publish=job.task != BACKFILL_TASK):
+        if job.task == BACKFILL_TASK:
+            from suntoday.jpegs import create_sdo_images
+
+            create_sdo_images(job.requested_time, save_directory)
+            return
+        session = get_session()
+        try:
+            create_images(session, job.task, job.requested_time, save_directory, [job.product] if job.product else None)
+        finally:
+            session.close()
+
+
+def _keep_extending(job: Job, stop: threading.Event) -> None:
+    """
+    Extend a job until ``stop`` is set, so other workers do not claim it.
+
+    Parameters
+    ----------
+    job : Job
+        The claimed job.
+    stop : threading.Event
+        Set when the job has finished.
+    """
+    interval = Settings().queue_visibility_timeout / 3
+    while not stop.wait(interval):
+        session = get_session()
+        try:
+            extend_job(session, job)
+        except Exception as e:  # NOQA : BLE001
+            logger.warning(f"Failed to extend job {job.id}: {e}")
+        finally:
+            session.close()
+
+
+def run_worker(
+    worker_id: str | None = None,
+    *,
+    max_jobs: int | None = None,
+    stop: threading.Event | None = None,
+    runner: Callable[[Job], None] | None = None,
+    task: str | None = None,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    until_empty: bool = False,
+) -> int:
+    """
+    Claim and run jobs until stopped.
+
+    Parameters
+    ----------
+    worker_id : str, optional
+        Identifies the worker, defaults to the hostname and process ID.
+    max_jobs : int, optional
+        Stop after this many jobs, by default run forever.
+    stop : threading.Event, optional
+        Stop once this is set.
+    runner : Callable[[Job], None], optional
+        Runs each job, defaults to `run_job`.
+    task : str, optional
+        Only claim jobs of this task.
+    start : datetime.datetime, optional
+        Only claim jobs requested at or after this time.
+    end : datetime.datetime, optional
+        Only claim jobs requested at or before this time.
+    until_empty : bool, optional
+        Stop once there is no job to claim, instead of waiting for more.
+
+    Returns
+    -------
+    int
+        The number of jobs run.
+    """
+    settings = Settings()
+    worker_id = worker_id or _get_worker_id()
+    stop = stop or threading.Event()
+    logger.info(f"Worker {worker_id} started")
+    jobs_run = 0
+    while not stop.is_set() and (max_jobs is None or jobs_run < max_jobs):
+        session = get_session()
+        try:
+            try:
+                job = claim_job(session, worker_id, task=task, start=start, end=end)
+            except Exception as e:  # NOQA : BLE001
+                logger.exception(f"Failed to claim a job: {e}")
+                job = None
+            if job is None:
+                if until_empty:
+                    break
+                stop.wait(settings.queue_poll_interval)
+                continue
+            finished = threading.Event()
+            extender = threading.Thread(target=_keep_extending, args=(job, finished), daemon=True)
+            extender.start()
+            try:
+                (runner or run_job)(job)
+            except Exception as e:  # NOQA : BLE001
+                logger.exception(f"Error occurred in {job.task} job {job.id}: {e}")
+                fail_job(session, job, repr(e))
+            else:
+                complete_job(session, job)
+            finally:
+                finished.set()
+                extender.join()
+            jobs_run += 1
+        finally:
+            session.close()
+    logger.info(f"Worker {worker_id} stopped after {jobs_run} jobs")
+    return jobs_run
+
+
+def enqueue_latest() -> int:
+    """
+    Queue the images and timeseries jobs for the latest available time.
+
+    Each job covers all the products of its task, see the module docstring.
+
+    Returns
+    -------
+    int
+        The number of new jobs queued.
+    """
+    settings = Settings()
+    requested_time = _utcnow() - datetime.timedelta(minutes=settings.jsoc_delay)
+    # Whole minutes, so the job is the same however many times it is queued
+    requested_time = requested_time.replace(second=0, microsecond=0)
+    session = get_session()
+    try:
+        return sum(enqueue_jobs(session, task, [requested_time]) for task in ["timeseries", "images"])
+    finally:
+        session.close()
+
+
+def schedule_enqueue() -> schedule.Job:
+    """
+    Queue the latest jobs every ``Settings.cron_frequency`` minutes.
+
+    Returns
+    -------
+    schedule.Job
+        The scheduled job.
+    """
+    return schedule.every(Settings().cron_frequency).minutes.do(enqueue_latest)
+
+
+if __name__ == "__main__":
+    from suntoday.warmup import warm_up
+
+    init_sentry()
+    init_db()
+    warm_up()
+    run_worker()
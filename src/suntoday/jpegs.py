@@ -2,38 +2,62 @@
 Provides all the functions needed to create SDO/AIA JPEGS.
 """
 
+import contextvars
 import datetime
+import functools
+import io
+import math
 import tempfile
-import warnings
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import astropy.units as u
 import matplotlib.patheffects as pe
-import matplotlib.pyplot as plt
 import numpy as np
 import sunpy.map as smap
-from astropy.io.fits.verify import VerifyWarning
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
 from astropy.visualization import AsinhStretch, LogStretch, ManualInterval, make_rgb
-from matplotlib import colors
+from matplotlib import colormaps, colors
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.image import imread
 from PIL import Image
 from sunpy.coordinates import SphericalScreen
 
 from suntoday import logger
 from suntoday.config import Settings
 from suntoday.constants import AIA_WAVELENGTHS, RGB_COMBINATIONS
-from suntoday.downloaders.jsoc import fetch_aia_fits, fetch_hmi_fits
+from suntoday.diskstats import append_disk_statistics, compute_disk_statistics
+from suntoday.framecache import base_ratio, get_frame_cache, running_difference
 from suntoday.logos import PNG_IMAGE
 from suntoday.maps import (
     create_aia_map,
     create_hmi_map,
 )
+from suntoday.metrics import measure
+from suntoday.movies import archive_frame
+from suntoday.publish import atomic_path, file_lock, write_atomic
+from suntoday.regions import find_active_regions
+from suntoday.sources import get_source
+from suntoday.tiles import TILES_DIRECTORY, write_tile_pyramid
+from suntoday.utils import MATPLOTLIB_LOCK, create_figure
 
 __all__ = [
     "create_blended_figure_from_maps",
+    "create_cutout_figure_from_maps",
+    "create_difference_figure_from_map",
     "create_figure_from_map",
     "create_rgb_figure_from_maps",
     "create_sdo_images",
+    "download_sdo_files",
+    "encode_image",
+    "figure_to_image",
+    "get_product_name",
+    "render_sdo_images",
     "save_figures",
+    "save_map_fits",
 ]
 
 # Aren't magic numbers great?!
@@ -46,24 +70,52 @@ WAVELENGTH_FORMAT_BLEND = "{:03.0f}"
 HMI_MEASUREMENT_JPEG = {"magnetogram": "HMI BLOS", "continuum": " HMI Continuum (AIA scale)"}
 HMI_MEASUREMENT_JPEG_FILENAMES = {"magnetogram": "_HMImag", "continuum": "_HMI_cont_aiascale"}
 HMI_MEASUREMENT_FITS = {"magnetogram": "blos"}
+FITS_COMPRESSION_TYPES = {"rice": "RICE_1", "gzip": "GZIP_2"}
+FITS_DTYPES = {"float32": np.float32, "float64": np.float64, "int16": np.int16}
+# The preview is saved as soon as a product is rendered, the full resolution follows
+PUBLISHING_TIERS = ["preview", "full"]
+# Stored value of missing pixels when saved as scaled integers
+INT16_BLANK = -32768
+# Products made against the frame cache, by filename suffix, with their label and neutral value
+DIFFERENCE_PRODUCTS = {"rd": ("running difference", 0.0), "br": ("base ratio", 1.0)}
+# How each of them is made from the cached frames, oldest first, and which frame it is made against
+DIFFERENCE_FUNCTIONS = {"rd": (running_difference, -1), "br": (base_ratio, 0)}
+# Held while the outputs of a day directory are written, which renders of other times in the day also write
+RENDER_LOCK_FILENAME = ".render.lock"
 
 
-def _add_lmsal_logo(ax: plt.Axes) -> None:
+@functools.cache
+def _read_logo() -> np.ndarray:
+    """
+    Read the LMSAL logo once, every figure shares the same image.
+
+    Returns
+    -------
+    numpy.ndarray
+        The logo image.
+    """
+    logo = imread(PNG_IMAGE)
+    # Shared between figures, so make sure nothing can change it
+    logo.flags.writeable = False
+    return logo
+
+
+def _add_lmsal_logo(ax: Axes) -> None:
     """
     Add LMSAL logo to the given Axes object.
 
     Parameters
     ----------
-    ax : `matplotlib.pyplot.Axes`
+    ax : `matplotlib.axes.Axes`
         The Axes object to add the logo to.
     """
     # Aren't magic numbers great?!
     ax_logo = ax.inset_axes([0.72, 0, 0.28, 0.08])
-    ax_logo.imshow(plt.imread(PNG_IMAGE))
+    ax_logo.imshow(_read_logo())
     ax_logo.set_axis_off()
 
 
-def create_figure_from_map(amap: smap.GenericMap) -> tuple[str, plt.Figure]:
+def create_figure_from_map(amap: smap.GenericMap) -> tuple[str, Figure]:
     """
     Creates the final figure from the input Map.
 
@@ -78,12 +130,12 @@ def create_figure_from_map(amap: smap.GenericMap) -> tuple[str, plt.Figure]:
     -------
     str
         The wavelength of the map(s). This is used as part of the filename.
-    `plt.Figure`
+    `matplotlib.figure.Figure`
         The figure object.
     """
     settings = Settings()
-    fig = plt.figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
-    ax = plt.subplot(projection=amap)
+    fig = create_figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
+    ax = fig.add_subplot(projection=amap)
     clip_interval = (0.01, 99.99) * u.percent if "AIA" in amap.instrument else None
     amap.plot(axes=ax, clip_interval=clip_interval)
     wavelength = (
@@ -96,7 +148,7 @@ def create_figure_from_map(amap: smap.GenericMap) -> tuple[str, plt.Figure]:
         if "AIA" in amap.instrument
         else HMI_MEASUREMENT_JPEG_FILENAMES[amap.measurement]
     )
-    plt.text(
+    ax.text(
         TEXT_X_POS,
         TEXT_Y_POS_MOD,
         LABEL_FORMAT.format(
@@ -116,7 +168,7 @@ def create_figure_from_map(amap: smap.GenericMap) -> tuple[str, plt.Figure]:
     return wavelength_filename, fig
 
 
-def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.Figure]:
+def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, Figure]:
     """
     Creates a RGB figure from a list of 3 maps.
 
@@ -129,7 +181,7 @@ def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.F
     -------
     str
         The wavelength of the map(s).
-    `plt.Figure`
+    `matplotlib.figure.Figure`
         The figure object.
 
     Raises
@@ -141,7 +193,7 @@ def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.F
         msg = "RGB figure needs exactly three maps."
         raise ValueError(msg)
     settings = Settings()
-    fig = plt.figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
+    fig = create_figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
     ax = fig.add_subplot(111)
 
     # Use the maximum value of the 99.8% percentile over all three filters
@@ -187,7 +239,7 @@ def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.F
         color = "red" if i == 0 else "green" if i == 1 else "blue"
         wavelength = WAVELENGTH_FORMAT_BLEND.format(amap.wavelength.value)
         wavelength_names.append(wavelength)
-        plt.text(
+        ax.text(
             TEXT_X_POS,
             TEXT_Y_POS - i * TEXT_Y_POS_MOD,
             LABEL_FORMAT.format(
@@ -207,7 +259,124 @@ def create_rgb_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.F
     return "_" + "_".join(wavelength_names), fig
 
 
-def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, plt.Figure]:
+def create_difference_figure_from_map(
+    amap: smap.GenericMap, data: np.ndarray, kind: str, base_time: datetime.datetime
+) -> tuple[str, Figure]:
+    """
+    Creates a running difference or base ratio figure of an AIA map.
+
+    Parameters
+    ----------
+    amap : sunpy.map.GenericMap
+        The AIA map the difference or ratio was made from.
+    data : numpy.ndarray
+        The difference or ratio.
+    kind : str
+        A key of `DIFFERENCE_PRODUCTS`.
+    base_time : datetime.datetime
+        The time of the frame it was made against.
+
+    Returns
+    -------
+    str
+        The wavelength of the map and the kind. This is used as part of the filename.
+    `matplotlib.figure.Figure`
+        The figure object.
+    """
+    label, neutral = DIFFERENCE_PRODUCTS[kind]
+    settings = Settings()
+    fig = create_figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
+    difference_map = smap.Map(data, amap.meta)
+    ax = fig.add_subplot(projection=difference_map)
+    # Symmetric about the neutral value, from a subsample as the limits do not need every pixel
+    limit = np.nanpercentile(np.abs(data[::4, ::4] - neutral), 99.5) or 1.0
+    cmap = colormaps["gray"].with_extremes(bad="black")
+    difference_map.plot(axes=ax, cmap=cmap, norm=colors.Normalize(vmin=neutral - limit, vmax=neutral + limit))
+    wavelength = WAVELENGTH_FORMAT.format(amap.wavelength.value)
+    ax.text(
+        TEXT_X_POS,
+        TEXT_Y_POS_MOD,
+        LABEL_FORMAT.format(
+            observatory=amap.observatory,
+            instrument=amap.instrument.split()[0],
+            wavelength=f"{wavelength} {label} to {base_time:%H:%M:%S}",
+            date=amap.date.strftime("%Y-%m-%d %H:%M:%S"),
+        ),
+        color="white",
+        transform=ax.transAxes,
+        fontdict={"fontsize": 10},
+        path_effects=[pe.withStroke(linewidth=4, foreground="black")],
+    )
+    ax.set_axis_off()
+    ax.set_title("")
+    _add_lmsal_logo(ax)
+    return f"{WAVELENGTH_FORMAT_BLEND.format(amap.wavelength.value).zfill(4)}_{kind}", fig
+
+
+def create_cutout_figure_from_maps(
+    maps: list[smap.GenericMap], bottom_left: SkyCoord, top_right: SkyCoord, number: int
+) -> tuple[str, Figure]:
+    """
+    Creates a figure of an active region, with a panel of each map cut to it.
+
+    Parameters
+    ----------
+    maps : `list[sunpy.map.GenericMap]`
+        The full disk maps.
+    bottom_left : `astropy.coordinates.SkyCoord`
+        The bottom left corner of the region.
+    top_right : `astropy.coordinates.SkyCoord`
+        The top right corner of the region.
+    number : int
+        The number of the region, 1 being the one with the most flux.
+
+    Returns
+    -------
+    str
+        The number of the region. This is used as part of the filename.
+    `matplotlib.figure.Figure`
+        The figure object.
+    """
+    settings = Settings()
+    columns = math.ceil(len(maps) / 2)
+    fig = create_figure(
+        figsize=(settings.map_fig_size, settings.map_fig_size * 2 / columns), dpi=settings.fig_dpi, frameon=False
+    )
+    fig.subplots_adjust(left=0, right=1, bottom=0, top=1, wspace=0, hspace=0)
+    for i, amap in enumerate(maps):
+        # Slicing the calibrated map, so nothing is read again. The corners are of the magnetogram, which is
+        # observed at another time, so the part of a region past the limb is kept on a screen
+        with SphericalScreen(bottom_left.observer, only_off_disk=True):
+            submap = amap.submap(bottom_left, top_right=top_right)
+        ax = fig.add_subplot(2, columns, i + 1, projection=submap)
+        clip_interval = (1, 99.9) * u.percent if "AIA" in amap.instrument else None
+        submap.plot(axes=ax, clip_interval=clip_interval)
+        wavelength = (
+            WAVELENGTH_FORMAT.format(amap.wavelength.value)
+            if "AIA" in amap.instrument
+            else HMI_MEASUREMENT_JPEG[amap.measurement]
+        )
+        ax.text(
+            TEXT_X_POS,
+            TEXT_Y_POS_MOD,
+            LABEL_FORMAT.format(
+                observatory=amap.observatory,
+                instrument=amap.instrument.split()[0],
+                wavelength=wavelength,
+                date=amap.date.strftime("%Y-%m-%d %H:%M:%S"),
+            ),
+            color="white",
+            transform=ax.transAxes,
+            fontdict={"fontsize": 8},
+            path_effects=[pe.withStroke(linewidth=3, foreground="black")],
+        )
+        ax.set_axis_off()
+        ax.set_title("")
+    _add_lmsal_logo(fig.axes[-1])
+    return f"_ar{number}", fig
+
+
+def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, Figure]:
     """
     Create a blended figure from a list of maps.
 
@@ -224,7 +393,7 @@ def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, p
     -------
     str
         The wavelength of the map(s). This is used as part of the filename.
-    `plt.Figure`
+    `matplotlib.figure.Figure`
         The figure object.
 
     Notes
@@ -234,7 +403,7 @@ def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, p
     The blending is done using a specified colormap and transparency.
     """
     settings = Settings()
-    fig = plt.figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
+    fig = create_figure(figsize=(settings.map_fig_size, settings.map_fig_size), dpi=settings.fig_dpi, frameon=False)
     ax = fig.add_subplot(111, projection=maps[0].wcs)
     clip_interval = (1, 99.9) * u.percent if maps[0].instrument == "AIA" else None
     maps[0].plot(axes=ax, clip_interval=clip_interval)
@@ -251,7 +420,7 @@ def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, p
             else HMI_MEASUREMENT_JPEG_FILENAMES[amap.measurement]
         )
         wavelength_names.append(wavelength_filename)
-        plt.text(
+        ax.text(
             TEXT_X_POS,
             (TEXT_Y_POS - TEXT_Y_POS_MOD) - i * TEXT_Y_POS_MOD,
             LABEL_FORMAT.format(
@@ -267,7 +436,7 @@ def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, p
         )
         if i == 0:
             continue
-        with SphericalScreen(maps[0].observer_coordinate):
+        with SphericalScreen(maps[0].observer_coordinate), measure("reprojection", get_product_name(maps)):
             reprojected_map = amap.reproject_to(maps[0].wcs)
         reprojected_map.plot(axes=ax, alpha=0.7, norm=colors.PowerNorm(gamma=0.4, vmin=0, vmax=2000))
     ax.set_axis_off()
@@ -276,87 +445,595 @@ def create_blended_figure_from_maps(maps: list[smap.GenericMap]) -> tuple[str, p
     return "_".join(wavelength_names), fig
 
 
-def save_figures(list_of_figs: list[tuple[str, plt.figure]], save_directory: Path) -> None:
+def figure_to_image(fig: Figure, width: int | None = None) -> Image.Image:
+    """
+    Render a figure to an RGB image.
+
+    Transparent parts are blended onto white, as matplotlib does when it
+    saves a JPEG.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+        The figure to render.
+    width : int, optional
+        Render the figure this many pixels wide, by changing its dpi for
+        the render, so the text and lines keep their size relative to the
+        image. Defaults to the width at the dpi of the figure.
+
+    Returns
+    -------
+    PIL.Image.Image
+        The rendered figure.
+    """
+    # Drawing is serialised, the preview of the next figure can be drawing while the full resolution of this one is
+    with MATPLOTLIB_LOCK:
+        figure_dpi = fig.dpi
+        if width is not None:
+            fig.dpi = figure_dpi * width / fig.bbox.width
+        try:
+            fig.canvas.draw()
+            rgba = Image.frombuffer(
+                "RGBA", fig.canvas.get_width_height(physical=True), fig.canvas.buffer_rgba(), "raw", "RGBA", 0, 1
+            )
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba)
+        finally:
+            fig.dpi = figure_dpi
+    # The dpi can round the size down by a pixel
+    if width is not None and image.width != width:
+        image = image.resize((width, round(image.height * width / image.width)))
+    return image
+
+
+def encode_image(image: Image.Image, extension: str, dpi: float | None = None) -> bytes:
+    """
+    Encode an image in the format of a file extension.
+
+    The options of the format are taken from ``Settings.sdo_fig_format_options``.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The image to encode.
+    extension : str
+        The file extension, e.g., "jpg", "webp" or "avif".
+    dpi : float, optional
+        The resolution to store in the file, for formats that have one.
+
+    Returns
+    -------
+    bytes
+        The encoded image.
+    """
+    settings = Settings()
+    options = dict(settings.sdo_fig_format_options.get(extension, {}))
+    if dpi is not None:
+        options.setdefault("dpi", (dpi, dpi))
+    encoded_image = io.BytesIO()
+    image.save(encoded_image, format=Image.registered_extensions()[f".{extension.lower()}"], **options)
+    return encoded_image.getvalue()
+
+
+def save_figures(
+    list_of_figs: list[tuple[str, Figure]], save_directory: Path, tiers: list[str] | None = None
+) -> dict[Path, bytes]:
     """
     Save a list of figures as JPEG images.
 
+    The "preview" tier is the figure rendered directly at
+    ``Settings.resize_fig_size``, the "full" tier is the figure at full
+    resolution. Each is saved as a JPEG and in every format of
+    ``Settings.sdo_fig_extra_formats``, which are encoded in parallel.
+
+    If ``Settings.tiles`` is enabled, the Deep Zoom tile pyramid of each
+    full resolution figure is also written to a "tiles" directory.
+
     Parameters
     ----------
-    list_of_figs : (List[Tuple[str, plt.figure]])
+    list_of_figs : (List[Tuple[str, matplotlib.figure.Figure]])
         A list of tuples containing the wavelength and the corresponding figure.
     save_directory : pathlib.Path
         The directory where the JPEG images will be saved.
+    tiers : list[str], optional
+        The tiers to save, defaults to both.
+
+    Returns
+    -------
+    dict[pathlib.Path, bytes]
+        The content of each file written.
     """
     settings = Settings()
-    for wavelength, fig in list_of_figs:
-        fig.savefig(save_directory / settings.sdo_fig_name_large.format(wavelength), dpi=settings.fig_dpi)
-        logger.debug(
-            f"Wavelength: {wavelength} figure saved to {save_directory / settings.sdo_fig_name_large.format(wavelength)}"
-        )
-        # Resize to 1024 - We avoid using MPL to resize the image to font issues
-        full_jpeg = Image.open(str(save_directory / settings.sdo_fig_name_large.format(wavelength)))
-        resized_image = full_jpeg.resize((settings.resize_fig_size, settings.resize_fig_size))
-        resized_image.save(str(save_directory / settings.sdo_fig_name_small.format(wavelength)))
-        logger.debug(
-            f"Resized wavelength: {wavelength} figure saved to {save_directory / settings.sdo_fig_name_small.format(wavelength)}"
+    save_directory = Path(save_directory)
+    tiers = tiers or PUBLISHING_TIERS
+    saved = {}
+    with ThreadPoolExecutor(
+        max_workers=settings.sdo_fig_encode_workers, thread_name_prefix="suntoday-encode"
+    ) as executor:
+        for wavelength, fig in list_of_figs:
+            large_path = save_directory / settings.sdo_fig_name_large.format(wavelength)
+            small_path = save_directory / settings.sdo_fig_name_small.format(wavelength)
+            images = []
+            with measure("encode", wavelength) as metrics:
+                if "preview" in tiers:
+                    # Drawn at a lower dpi rather than resized, so it does not wait for the full image
+                    images.append((small_path, figure_to_image(fig, settings.resize_fig_size)))
+                if "full" in tiers:
+                    full_image = figure_to_image(fig)
+                    images.append((large_path, full_image))
+                paths = {}
+                # Pillow keeps the save options on the image, so each encode needs its own copy
+                for path, image in images:
+                    for extension in [path.suffix[1:], *settings.sdo_fig_extra_formats]:
+                        paths[path.with_suffix(f".{extension}")] = executor.submit(
+                            encode_image, image.copy(), extension, fig.dpi * image.width / fig.bbox.width
+                        )
+                encoded_images = {path: future.result() for path, future in paths.items()}
+                metrics.add_bytes(sum(len(encoded_image) for encoded_image in encoded_images.values()))
+            with measure("write", wavelength) as metrics:
+                for path, encoded_image in encoded_images.items():
+                    metrics.add_bytes(write_atomic(path, encoded_image))
+            saved.update(encoded_images)
+            logger.debug(f"Wavelength: {wavelength} figures saved to {list(encoded_images)}")
+            if "full" in tiers and settings.tiles:
+                with measure("tiles", wavelength) as metrics:
+                    metrics.add_bytes(write_tile_pyramid(full_image, large_path.stem, save_directory / TILES_DIRECTORY))
+    return saved
+
+
+def save_map_fits(
+    amap: smap.GenericMap, fits_path: Path, compression: str | None = None, dtype: str | None = None
+) -> int:
+    """
+    Save a map as a FITS file, replacing any existing file atomically.
+
+    The file is written next to ``fits_path`` and renamed into place, so
+    readers never see a partly written file.
+
+    Parameters
+    ----------
+    amap : sunpy.map.GenericMap
+        The map to save.
+    fits_path : pathlib.Path
+        The path to save to.
+    compression : str, optional
+        "rice" or "gzip" to tile compress the image, or "none".
+        Defaults to ``Settings.fits_compression``.
+    dtype : str, optional
+        "float32", "float64" or "int16", which is scaled from the range
+        of the data with missing pixels set to BLANK.
+        Defaults to ``Settings.fits_dtype``.
+
+    Returns
+    -------
+    int
+        The size of the file in bytes.
+
+    Raises
+    ------
+    ValueError
+        If the compression or dtype is unknown.
+    """
+    settings = Settings()
+    compression = compression or settings.fits_compression
+    dtype = dtype or settings.fits_dtype
+    if compression != "none" and compression not in FITS_COMPRESSION_TYPES:
+        msg = f"Invalid FITS compression: {compression}. Must be one of {[*FITS_COMPRESSION_TYPES, 'none']}."
+        raise ValueError(msg)
+    if dtype not in FITS_DTYPES:
+        msg = f"Invalid FITS dtype: {dtype}. Must be one of {list(FITS_DTYPES)}."
+        raise ValueError(msg)
+    header = amap.fits_header
+    # Only integer data can have a BLANK, astropy warns about it otherwise
+    header.remove("BLANK", ignore_missing=True)
+    data = amap.data
+    bscale = bzero = None
+    if dtype == "int16":
+        vmin, vmax = np.nanmin(data), np.nanmax(data)
+        # Use the full range but the lowest value, which is kept for BLANK
+        bscale = float((vmax - vmin) / (np.iinfo(np.int16).max * 2)) or 1.0
+        bzero = float(vmin + np.iinfo(np.int16).max * bscale)
+        data = np.where(np.isnan(data), bzero + INT16_BLANK * bscale, data)
+    else:
+        data = data.astype(FITS_DTYPES[dtype], copy=False)
+    if compression == "none":
+        hdu = fits.PrimaryHDU(data, header)
+        hdul = fits.HDUList([hdu])
+    else:
+        hdu = fits.CompImageHDU(
+            data,
+            header,
+            compression_type=FITS_COMPRESSION_TYPES[compression],
+            quantize_level=settings.fits_quantize_level,
         )
+        hdul = fits.HDUList([fits.PrimaryHDU(), hdu])
+    if dtype == "int16":
+        hdu.scale("int16", bscale=bscale, bzero=bzero)
+        hdu.header["BLANK"] = INT16_BLANK
+    with atomic_path(fits_path) as temp_path:
+        hdul.writeto(temp_path, overwrite=True)
+        return temp_path.stat().st_size
 
 
-def create_sdo_images(requested_time: datetime, save_directory: Path) -> None:
+def _write_fits(amap: smap.GenericMap, fits_path: Path) -> None:
     """
-    Creates the full set of SDO images for the given datetime and saves it to
-    the given directory.
+    Save a map as a FITS file and record the write.
+
+    Parameters
+    ----------
+    amap : sunpy.map.GenericMap
+        The map to save.
+    fits_path : pathlib.Path
+        The path to save to.
+    """
+    with measure("write", get_product_name([amap])) as metrics:
+        metrics.add_bytes(save_map_fits(amap, fits_path))
+    logger.debug(f"FITS saved to {fits_path}")
 
-    Also saves the FITS files used for planning by someone.
+
+def get_product_name(maps: list[smap.GenericMap]) -> str:
+    """
+    Get the name of the product made from the given maps.
+
+    This is the part of the JPEG filename between the prefix and the
+    extension, e.g., "0171" for ``f0171.jpg`` and "_211_193_171" for
+    ``f_211_193_171.jpg``.
+
+    Parameters
+    ----------
+    maps : `list[sunpy.map.GenericMap]`
+        The maps, in the order they are passed to the figure function.
+
+    Returns
+    -------
+    str
+        The product name.
+    """
+    names = [
+        WAVELENGTH_FORMAT_BLEND.format(amap.wavelength.value)
+        if "AIA" in amap.instrument
+        else HMI_MEASUREMENT_JPEG_FILENAMES[amap.measurement]
+        for amap in maps
+    ]
+    if len(names) == 1:
+        return names[0].zfill(4)
+    if "AIA" in maps[0].instrument:
+        return "_" + "_".join(names)
+    return "_".join(names)
+
+
+def _calibrate_maps(files: list[str], create_map: Callable) -> list[smap.GenericMap]:
+    """
+    Creates a calibrated map for each file, measuring each as its product.
+
+    Parameters
+    ----------
+    files : list[str]
+        The FITS files to load.
+    create_map : Callable
+        Either `create_aia_map` or `create_hmi_map`.
+
+    Returns
+    -------
+    list[sunpy.map.GenericMap]
+        The calibrated maps, in the same order as ``files``.
+    """
+    maps = []
+    for file in files:
+        with measure("calibration") as metrics:
+            maps.append(create_map(file))
+            metrics.product = get_product_name(maps[-1:])
+    return maps
+
+
+def _get_difference_products(
+    aia_maps: list[smap.GenericMap],
+) -> list[tuple[str, list[smap.GenericMap], Callable]]:
+    """
+    Finds the difference products of the AIA maps that can be made.
+
+    Each product is only made if the frame cache has an earlier frame of
+    the wavelength, at most ``Settings.frame_cache_max_age`` older. The
+    difference itself is only computed when the product is rendered,
+    against copies of the frames taken now, so frames cached meanwhile
+    by other renders do not change it.
+
+    Parameters
+    ----------
+    aia_maps : list[sunpy.map.GenericMap]
+        The calibrated AIA maps.
+
+    Returns
+    -------
+    list[tuple[str, list[sunpy.map.GenericMap], Callable]]
+        The name and maps of each product and a callable that creates its figure.
+    """
+    frame_cache = get_frame_cache()
+    if frame_cache is None:
+        return []
+    max_age = datetime.timedelta(minutes=Settings().frame_cache_max_age)
+    products = []
+    for amap in aia_maps:
+        key = WAVELENGTH_FORMAT.format(amap.wavelength.value)
+        frames = frame_cache.get_frames(key, amap.data.shape, amap.date.to_datetime(timezone=datetime.UTC), max_age)
+        if frames:
+            products.extend(
+                (
+                    f"{get_product_name([amap])}_{kind}",
+                    [amap],
+                    functools.partial(_create_difference_figure, amap, frames, kind),
+                )
+                for kind in DIFFERENCE_PRODUCTS
+            )
+    return products
+
+
+def _create_difference_figure(
+    amap: smap.GenericMap, frames: list[tuple[datetime.datetime, np.ndarray]], kind: str
+) -> tuple[str, Figure]:
+    """
+    Computes a difference product of an AIA map and creates its figure.
+
+    Parameters
+    ----------
+    amap : sunpy.map.GenericMap
+        The calibrated AIA map.
+    frames : list[tuple[datetime.datetime, numpy.ndarray]]
+        The cached frames of the wavelength, as from `FrameCache.get_frames`.
+    kind : str
+        A key of `DIFFERENCE_PRODUCTS`.
+
+    Returns
+    -------
+    str
+        The wavelength of the map and the kind. This is used as part of the filename.
+    `matplotlib.figure.Figure`
+        The figure object.
+    """
+    difference, base = DIFFERENCE_FUNCTIONS[kind]
+    with measure("difference", f"{get_product_name([amap])}_{kind}"):
+        data = difference(amap.data, frames)
+    return create_difference_figure_from_map(amap, data, kind, frames[base][0])
+
+
+def _cache_frames(aia_maps: list[smap.GenericMap]) -> None:
+    """
+    Adds the AIA maps to the frame cache.
+
+    This is done once the products are rendered, as the difference
+    products read the frames they replace.
+
+    Parameters
+    ----------
+    aia_maps : list[sunpy.map.GenericMap]
+        The calibrated AIA maps.
+    """
+    frame_cache = get_frame_cache()
+    if frame_cache is None:
+        return
+    for amap in aia_maps:
+        key = WAVELENGTH_FORMAT.format(amap.wavelength.value)
+        with measure("cache", key):
+            frame_cache.add(key, amap.date.to_datetime(timezone=datetime.UTC), amap.data)
+
+
+def _get_cutout_products(
+    aia_maps: list[smap.GenericMap], hmi_maps: list[smap.GenericMap]
+) -> list[tuple[str, list[smap.GenericMap], Callable]]:
+    """
+    Finds the active regions of the HMI magnetogram to cut the maps to.
+
+    Parameters
+    ----------
+    aia_maps : list[sunpy.map.GenericMap]
+        The calibrated AIA maps.
+    hmi_maps : list[sunpy.map.GenericMap]
+        The calibrated HMI maps.
+
+    Returns
+    -------
+    list[tuple[str, list[sunpy.map.GenericMap], Callable]]
+        The name and maps of each product and a callable that creates its figure.
+    """
+    magnetograms = [amap for amap in hmi_maps if amap.measurement == "magnetogram"]
+    if not magnetograms:
+        return []
+    with measure("regions"):
+        regions = find_active_regions(magnetograms[0])
+    logger.info(f"Found {len(regions)} active regions")
+    maps = [
+        amap for amap in aia_maps if WAVELENGTH_FORMAT.format(amap.wavelength.value) in Settings().cutout_wavelengths
+    ] + magnetograms[:1]
+    return [
+        (f"_ar{number}", maps, functools.partial(_create_cutout_figure, maps, bottom_left, top_right, number))
+        for number, (bottom_left, top_right) in enumerate(regions, start=1)
+    ]
+
+
+def _create_cutout_figure(
+    maps: list[smap.GenericMap], bottom_left: SkyCoord, top_right: SkyCoord, number: int
+) -> tuple[str, Figure] | None:
+    """
+    Creates the figure of an active region, or logs why it cannot be made.
+
+    A region the maps cannot be cut to is skipped, rather than stopping
+    the other products.
+
+    Parameters
+    ----------
+    maps : `list[sunpy.map.GenericMap]`
+        The full disk maps.
+    bottom_left : `astropy.coordinates.SkyCoord`
+        The bottom left corner of the region.
+    top_right : `astropy.coordinates.SkyCoord`
+        The top right corner of the region.
+    number : int
+        The number of the region, 1 being the one with the most flux.
+
+    Returns
+    -------
+    tuple[str, Figure] | None
+        As from `create_cutout_figure_from_maps`, or None if it failed.
+    """
+    try:
+        return create_cutout_figure_from_maps(maps, bottom_left, top_right, number)
+    except Exception as e:  # NOQA : BLE001
+        logger.exception(f"Cutout of active region {number} failed: {e}")
+        return None
+
+
+def download_sdo_files(requested_time: datetime, save_directory: Path) -> tuple[list[str], list[str]]:
+    """
+    Downloads the AIA and HMI FITS files needed for the given datetime.
+
+    The files come from the source selected by ``Settings.source``.
 
     Parameters
     ----------
     requested_time : datetime.datetime
-        Datetime to create the plot.
+        Datetime to download the files for.
     save_directory : pathlib.Path
-        Save directory for the plot.
+        Directory to download the files to.
+
+    Returns
+    -------
+    list[str]
+        The AIA files, in the order of `AIA_WAVELENGTHS`.
+    list[str]
+        The HMI files.
 
     Raises
     ------
     OSError
         If the incorrect number of AIA or HMI files are downloaded.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        aia_files = fetch_aia_fits(requested_time, save_directory=temp_dir)
-        if len(aia_files) != len(AIA_WAVELENGTHS):
-            msg = f"Mismatch of AIA files downloaded, expected {len(AIA_WAVELENGTHS)}, got {len(aia_files)}, missing: {set(AIA_WAVELENGTHS) - {f.split('_')[-1].split('.')[0] for f in aia_files}}"
-            raise OSError(msg)
-        aia_files = sorted(aia_files, key=lambda x: AIA_WAVELENGTHS.index(x.split("_")[-1].split(".")[0]))
-        # HMI files are not always available at the same time as AIA files
-        hmi_files = fetch_hmi_fits(requested_time - datetime.timedelta(hours=2), save_directory=temp_dir)
-        if len(hmi_files) != 2:
-            msg = "Mismatch of HMI files downloaded"
-            raise OSError(msg)
-        aia_maps = [create_aia_map(aia_file) for aia_file in aia_files]
-        hmi_maps = [create_hmi_map(hmi_file) for hmi_file in hmi_files]
-        filenames = [
-            WAVELENGTH_FORMAT.format(amap.wavelength.value)
-            if "AIA" in amap.instrument
-            else HMI_MEASUREMENT_FITS.get(amap.measurement)
-            for amap in (aia_maps + hmi_maps)
+    source = get_source()
+    aia_files = source.fetch_aia_fits(requested_time, save_directory)
+    if len(aia_files) != len(AIA_WAVELENGTHS):
+        msg = f"Mismatch of AIA files downloaded, expected {len(AIA_WAVELENGTHS)}, got {len(aia_files)}, missing: {set(AIA_WAVELENGTHS) - {f.split('_')[-1].split('.')[0] for f in aia_files}}"
+        raise OSError(msg)
+    aia_files = sorted(aia_files, key=lambda x: AIA_WAVELENGTHS.index(x.split("_")[-1].split(".")[0]))
+    hmi_files = source.fetch_hmi_fits(requested_time, save_directory)
+    if len(hmi_files) != 2:
+        msg = "Mismatch of HMI files downloaded"
+        raise OSError(msg)
+    return aia_files, hmi_files
+
+
+def render_sdo_images(
+    aia_files: list[str], hmi_files: list[str], save_directory: Path, products: list[str] | None = None
+) -> None:
+    """
+    Creates the SDO images from downloaded FITS files and saves them to the
+    given directory.
+
+    Also saves the FITS files used for planning by someone.
+
+    The preview of each product is saved as soon as it is rendered, while
+    the full resolution images follow in a background thread. With
+    ``Settings.archive_frames``, the preview is also archived and added to
+    the daily movie of the product. With ``Settings.disk_statistics``, the
+    statistics of the AIA maps are added to the local timeseries.
+
+    The maps of several times can be calibrated at once, but only one of
+    them at a time is rendered into a save directory, as the products of
+    every time in a day have the same names.
+
+    Parameters
+    ----------
+    aia_files : list[str]
+        The AIA files, in the order of `AIA_WAVELENGTHS`.
+    hmi_files : list[str]
+        The HMI files.
+    save_directory : pathlib.Path
+        Save directory for the plot.
+    products : list[str], optional
+        Only create these products, named as in `get_product_name`.
+        Only the FITS files of the maps they use are saved.
+        Defaults to all products.
+    """
+    aia_maps = _calibrate_maps(aia_files, create_aia_map)
+    hmi_maps = _calibrate_maps(hmi_files, create_hmi_map)
+    if Settings().disk_statistics and aia_maps:
+        with measure("statistics"):
+            append_disk_statistics(compute_disk_statistics(aia_maps))
+    # Each product is its name, the maps it needs and a callable that creates its figure
+    all_products = [
+        (get_product_name([amap]), [amap], functools.partial(create_figure_from_map, amap))
+        for amap in (aia_maps + hmi_maps)
+    ]
+    for rgb_comb in RGB_COMBINATIONS:
+        maps = [aia_maps[AIA_WAVELENGTHS.index(wavelength)] for wavelength in rgb_comb]
+        all_products.append((get_product_name(maps), maps, functools.partial(create_rgb_figure_from_maps, maps)))
+    # Blend combinations is only HMI B_LOS and AIA 171
+    maps = [hmi_maps[0], aia_maps[AIA_WAVELENGTHS.index("171")]]
+    all_products.append((get_product_name(maps), maps, functools.partial(create_blended_figure_from_maps, maps)))
+    all_products.extend(_get_difference_products(aia_maps))
+    if Settings().cutouts:
+        all_products.extend(_get_cutout_products(aia_maps, hmi_maps))
+    if products is not None:
+        all_products = [product for product in all_products if product[0] in products]
+        logger.info(f"Only creating products: {[name for name, *_ in all_products]}")
+    used_maps = [amap for amap in (aia_maps + hmi_maps) if any(amap is m for _, maps, _ in all_products for m in maps)]
+    filenames = [
+        WAVELENGTH_FORMAT.format(amap.wavelength.value)
+        if "AIA" in amap.instrument
+        else HMI_MEASUREMENT_FITS.get(amap.measurement)
+        for amap in used_maps
+    ]
+    settings = Settings()
+    # The FITS files are compressed and written while the figures render. The threads run in copies of this
+    # context, so they record into the metrics of the job
+    with (
+        file_lock(Path(save_directory) / RENDER_LOCK_FILENAME),
+        ThreadPoolExecutor(max_workers=settings.fits_write_workers, thread_name_prefix="suntoday-fits") as executor,
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="suntoday-full") as full_tier,
+    ):
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, _write_fits, amap, Path(save_directory) / ("f" + filename + ".fits")
+            )
+            for filename, amap in zip(filenames, used_maps, strict=True)
+            if filename is not None
         ]
-        with warnings.catch_warnings():
-            # Need to bypass
-            # VerifyWarning: Invalid 'BLANK' keyword in header.
-            # The 'BLANK' keyword is only applicable to integer data, and will be ignored in this HDU.
-            warnings.simplefilter("ignore", category=VerifyWarning)
-            [
-                amap.save(save_directory / ("f" + filenames[i] + ".fits"), overwrite=True)
-                for i, amap in enumerate(aia_maps + hmi_maps)
-                if filenames[i] is not None
-            ]
-        figures = [create_figure_from_map(aia_map) for aia_map in aia_maps]
-        figures.extend(create_figure_from_map(hmi_map) for hmi_map in hmi_maps)
-        for rgb_comb in RGB_COMBINATIONS:
-            maps = [aia_maps[AIA_WAVELENGTHS.index(wavelength)] for wavelength in rgb_comb]
-            figures.append(create_rgb_figure_from_maps(maps))
-        # Blend combinations is only HMI B_LOS and AIA 171
-        maps = [hmi_maps[0], aia_maps[AIA_WAVELENGTHS.index("171")]]
-        figures.append(create_blended_figure_from_maps(maps))
-        save_figures(figures, save_directory)
-        plt.close("all")
+        for name, maps, create in all_products:
+            with measure("render", name):
+                figure = create()
+            # Products that cannot be made, e.g., a cutout that fails, are skipped
+            if figure is None:
+                continue
+            # Publish the preview right away, the full resolution follows in the background
+            previews = save_figures([figure], save_directory, tiers=["preview"])
+            if settings.archive_frames:
+                preview_path = Path(save_directory) / settings.sdo_fig_name_small.format(figure[0])
+                with measure("archive", name):
+                    archive_frame(preview_path, previews[preview_path], maps[0].date.to_datetime())
+            futures.append(
+                full_tier.submit(contextvars.copy_context().run, save_figures, [figure], save_directory, tiers=["full"])
+            )
+        for future in futures:
+            future.result()
+    _cache_frames(aia_maps)
+
+
+def create_sdo_images(requested_time: datetime, save_directory: Path, products: list[str] | None = None) -> None:
+    """
+    Creates the full set of SDO images for the given datetime and saves it to
+    the given directory.
+
+    Also saves the FITS files used for planning by someone.
+
+    Parameters
+    ----------
+    requested_time : datetime.datetime
+        Datetime to create the plot.
+    save_directory : pathlib.Path
+        Save directory for the plot.
+    products : list[str], optional
+        Only create these products, named as in `get_product_name`.
+        Only the FITS files of the maps they use are saved.
+        Defaults to all products.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        aia_files, hmi_files = download_sdo_files(requested_time, temp_dir)
+        render_sdo_images(aia_files, hmi_files, save_directory, products=products)
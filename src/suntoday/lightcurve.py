@@ -1,23 +1,150 @@
 """
-Generates the SDO/AIA and GOES lightcurve the previous 24 hours.
+Generates the SDO/AIA and GOES lightcurve of the previous 24 hours.
+
+Other windows, e.g., the last 6 hours or 27 days, are set with
+``Settings.lightcurve_windows``. The data are loaded once, for the
+longest window, and each window is rendered from its slice in parallel,
+in threads of this process, which is already warmed up. The figures are
+built without pyplot and drawn under ``MATPLOTLIB_LOCK``, as the
+mathtext parser of matplotlib is not thread safe.
+Lines with more than ``Settings.lightcurve_max_points`` points are
+decimated to the smallest and largest value of each bin of time, so the
+longer windows keep the peaks of flares without drawing more points
+than there are pixels.
 """
 
-from datetime import datetime
+import contextvars
+import io
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import starmap
 from pathlib import Path
 
 import matplotlib.figure
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from matplotlib import dates, ticker
+from matplotlib.axes import Axes
 
 from suntoday import logger
 from suntoday.config import Settings
 from suntoday.constants import AIA_COLORS, AIA_WAVELENGTHS
+from suntoday.downloaders.goes import GOES_FEEDS
+from suntoday.metrics import measure
+from suntoday.publish import write_atomic
+from suntoday.utils import MATPLOTLIB_LOCK, create_figure
+
+__all__ = [
+    "add_aia_lightcurve",
+    "add_goes_lightcurve",
+    "create_lightcurve_figure",
+    "decimate_minmax",
+    "get_aia_lightcurves",
+    "plot_lightcurve_from_timeseries",
+]
+
+# Archived AIA rows further apart than this are a gap, which is fetched again
+AIA_ARCHIVE_MAX_GAP = timedelta(minutes=10)
+
+
+def get_aia_lightcurves(timeseries: pd.DataFrame) -> dict[str, pd.Series]:
+    """
+    Smooths and clips the SDO/AIA lightcurve of every wavelength at once.
+
+    Each wavelength is the exponentially weighted mean of
+    ``DATAMEAN / EXPTIME`` over a span of 5, without the values outside its
+    0.5 and 99.9 percentiles.
+
+    The rows of each wavelength are pivoted into a column of one array, in
+    their order, so the smoothing and the percentiles run over every
+    wavelength together, rather than grouping the timeseries again for
+    each wavelength.
+
+    Parameters
+    ----------
+    timeseries : pandas.DataFrame
+        `~pandas.DataFrame` containing the AIA data.
+
+    Returns
+    -------
+    dict[str, pandas.Series]
+        The lightcurve of each wavelength in the timeseries.
+    """
+    # Rows without a wavelength have a code of -1, and are dropped as by groupby
+    codes, names = pd.factorize(timeseries["WAVELNTH"], sort=True)
+    positions = np.flatnonzero(codes >= 0)
+    codes = codes[positions]
+    # The position of each row in its wavelength, so the columns have no gaps to skew the smoothing
+    counts = np.bincount(codes, minlength=len(names))
+    # A stable sort of small integers is a radix sort
+    by_wavelength = np.argsort(codes.astype(np.uint16), kind="stable")
+    order = np.empty_like(codes)
+    order[by_wavelength] = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+    shape = (counts.max(initial=0), len(names))
+    wide_values = np.full(shape, np.nan)
+    wide_values[order, codes] = (timeseries["DATAMEAN"].to_numpy() / timeseries["EXPTIME"].to_numpy())[positions]
+    rows = np.full(shape, -1)
+    rows[order, codes] = positions
+    values = pd.DataFrame(wide_values, columns=names).ewm(span=5).mean()
+    # The smoothing carries the last value into the padding after the end of the shorter columns
+    values = values.where(rows >= 0)
+    low, high = values.quantile([0.005, 0.999]).to_numpy()
+    keep = (values.to_numpy() >= low) & (values.to_numpy() <= high)
+    lightcurves = {}
+    for column, wavelength in enumerate(names):
+        kept = keep[:, column]
+        lightcurves[wavelength] = pd.Series(
+            values[wavelength].to_numpy()[kept], index=timeseries.index[rows[kept, column]], name=wavelength
+        )
+    return lightcurves
+
+
+def decimate_minmax(series: pd.Series, max_points: int) -> pd.Series:
+    """
+    Decimates a lightcurve to the smallest and largest value of each time bin.
+
+    The time range is split into bins of equal length, about the width of
+    a pixel for a line ``max_points // 2`` pixels wide, and only the first
+    and last point, and the smallest and largest value of each bin are
+    kept, in time order. Unlike taking every nth value, this never loses
+    the peak of a flare, nor changes the time range.
+
+    Parameters
+    ----------
+    series : pandas.Series
+        The lightcurve, with a `~pandas.DatetimeIndex` in time order.
+    max_points : int
+        The most points to keep, 0 keeps every point.
 
-__all__ = ["add_aia_lightcurve", "add_goes_lightcurve", "create_lightcurve_figure", "plot_lightcurve_from_timeseries"]
+    Returns
+    -------
+    pandas.Series
+        The lightcurve itself if it is no longer than ``max_points``,
+        otherwise the kept points, without missing values.
+    """
+    if not max_points or len(series) <= max_points:
+        return series
+    series = series.dropna()
+    if len(series) <= max_points:
+        return series
+    bins = max((max_points - 2) // 2, 1)
+    times = pd.DatetimeIndex(series.index).asi8
+    span = max(times[-1] - times[0], 1)
+    time_bins = np.minimum(((times - times[0]) / span * bins).astype(np.int64), bins - 1)
+    # Sorted by bin and then value, so each bin starts with its smallest value and ends with its largest
+    order = np.lexsort((series.to_numpy(), time_bins))
+    sorted_bins = time_bins[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return series.iloc[np.unique(np.r_[0, order[starts], order[ends], len(order) - 1])]
 
 
-def add_aia_lightcurve(ax: plt.Axes, timeseries: pd.DataFrame, wavelengths: list[str] = AIA_WAVELENGTHS) -> None:
+def add_aia_lightcurve(
+    ax: Axes,
+    timeseries: pd.DataFrame,
+    wavelengths: list[str] = AIA_WAVELENGTHS,
+    lightcurves: dict[str, pd.Series] | None = None,
+) -> None:
     """
     Plots the SDO/AIA lightcurve on the given axis.
 
@@ -30,52 +157,61 @@ def add_aia_lightcurve(ax: plt.Axes, timeseries: pd.DataFrame, wavelengths: list
     wavelengths : list of int
         Wavelengths to plot.
         Defaults to `~suntoday.constants.AIA_WAVELENGTHS`.
+    lightcurves : dict[str, pandas.Series], optional
+        The lightcurves from `get_aia_lightcurves`, if already made from
+        the timeseries, e.g., for another axis.
     """
-    grouped_wavelength = timeseries.groupby(["WAVELNTH"])
+    if lightcurves is None:
+        lightcurves = get_aia_lightcurves(timeseries)
+    plotted = False
     for wavelength in wavelengths:
-        if wavelength not in grouped_wavelength.groups:
+        if wavelength not in lightcurves:
             logger.warning(f"No data for AIA-{wavelength} in the last 24 hours.")
             continue
-        data = grouped_wavelength.get_group((wavelength,))
-        values = (data["DATAMEAN"] / data["EXPTIME"]).ewm(span=5).mean()
         ax.plot(
-            values[values.between(values.quantile(0.005), values.quantile(0.999))],
+            lightcurves[wavelength],
             color=AIA_COLORS[wavelength],
             label=f"AIA-{wavelength}" + r"$\AA$",
             linewidth=2,
         )
-        # Only set the hour and minute as the last axis is the GOES axis
-        # which will have the full date.
-        time_formatter = dates.DateFormatter("%H:%M")
-        ax.xaxis.set_major_formatter(time_formatter)
-        ax.tick_params(which="major", direction="in", size=8, labelsize=10)
-        ax.tick_params(which="minor", direction="in", size=3, labelsize=10)
-        ax.xaxis.grid(visible=True, which="major", color="black")
-        ax.legend(frameon=True, framealpha=1, loc="best")
-        ax.set_ylabel(r"Data Mean (DN)", size=10)
+        plotted = True
+    if not plotted:
+        return
+    # Only set the hour and minute as the last axis is the GOES axis
+    # which will have the full date.
+    time_formatter = dates.DateFormatter("%H:%M")
+    ax.xaxis.set_major_formatter(time_formatter)
+    ax.tick_params(which="major", direction="in", size=8, labelsize=10)
+    ax.tick_params(which="minor", direction="in", size=3, labelsize=10)
+    ax.xaxis.grid(visible=True, which="major", color="black")
+    ax.legend(frameon=True, framealpha=1, loc="best")
+    ax.set_ylabel(r"Data Mean (DN)", size=10)
 
 
-def add_goes_lightcurve(ax: plt.Axes, timeseries: pd.DataFrame) -> None:
+def add_goes_lightcurve(ax: Axes, timeseries: pd.DataFrame, max_points: int = 0) -> None:
     """
     Plots the GOES JSON lightcurve on the given axis.
 
     Parameters
     ----------
-    ax : matplotlib.pyplot.Axes
+    ax : matplotlib.axes.Axes
         Axes to plot the lightcurve on.
     timeseries : pandas.DataFrame
         `~pandas.DataFrame` containing the GOES data.
+    max_points : int, optional
+        The most points of each channel, see `decimate_minmax`.
+        Defaults to 0, every point.
     """
     sat_number = timeseries["satellite"].iloc[0]
     grouped_energy = timeseries.groupby(["energy"])
     ax.plot(
-        grouped_energy.get_group(("0.1-0.8nm",))["flux"],
+        decimate_minmax(grouped_energy.get_group(("0.1-0.8nm",))["flux"], max_points),
         color="red",
         label=f"GOES-{sat_number} 1.0-8.0" + r"$\AA$",
         linewidth=2,
     )
     ax.plot(
-        grouped_energy.get_group(("0.05-0.4nm",))["flux"],
+        decimate_minmax(grouped_energy.get_group(("0.05-0.4nm",))["flux"], max_points),
         color="blue",
         label=f"GOES-{sat_number} 0.5-4.0" + r"$\AA$",
         linewidth=2,
@@ -108,6 +244,7 @@ def add_goes_lightcurve(ax: plt.Axes, timeseries: pd.DataFrame) -> None:
 def plot_lightcurve_from_timeseries(
     goes_timeseries: pd.DataFrame,
     aia_timeseries: pd.DataFrame,
+    max_points: int | None = None,
 ) -> matplotlib.figure.Figure:
     """
     Creates the actual figure from the AIA and GOES dataframes.
@@ -118,6 +255,9 @@ def plot_lightcurve_from_timeseries(
         GOES JSON dataframe.
     aia_timeseries : pandas.DataFrame
         AIA dataframe.
+    max_points : int, optional
+        The most points of each line, see `decimate_minmax`.
+        Defaults to ``Settings.lightcurve_max_points``.
 
     Returns
     -------
@@ -125,25 +265,241 @@ def plot_lightcurve_from_timeseries(
         The figure ready to be saved.
     """
     settings = Settings()
-    fig, axes = plt.subplots(
-        len(AIA_WAVELENGTHS) + 1,
-        1,
+    max_points = settings.lightcurve_max_points if max_points is None else max_points
+    fig = create_figure(
         figsize=(settings.timeseries_fig_x_size, settings.timeseries_fig_y_size),
         dpi=settings.fig_dpi,
     )
+    axes = fig.subplots(len(AIA_WAVELENGTHS) + 1, 1)
+    # Made once for all of the axes
+    lightcurves = {
+        wavelength: decimate_minmax(lightcurve, max_points)
+        for wavelength, lightcurve in get_aia_lightcurves(aia_timeseries).items()
+    }
     for axis, wavelength in zip(axes[:-1], AIA_WAVELENGTHS, strict=True):
-        add_aia_lightcurve(axis, aia_timeseries, [wavelength])
-    add_goes_lightcurve(axes[-1], goes_timeseries)
-    fig.tight_layout()
+        add_aia_lightcurve(axis, aia_timeseries, [wavelength], lightcurves)
+    add_goes_lightcurve(axes[-1], goes_timeseries, max_points)
+    # The layout draws the text, which the SDO images may be doing in another thread
+    with MATPLOTLIB_LOCK:
+        fig.tight_layout()
     return fig
 
 
+def _get_window(timeseries: pd.DataFrame, end_time: datetime, window: timedelta) -> pd.DataFrame:
+    """
+    Return the rows of a timeseries in a window before the given time.
+
+    Parameters
+    ----------
+    timeseries : pandas.DataFrame
+        The timeseries, indexed by time.
+    end_time : datetime.datetime
+        The end of the window, in UTC if it has no timezone.
+    window : datetime.timedelta
+        The length of the window.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The rows in (``end_time - window``, ``end_time``].
+    """
+    end_time = pd.Timestamp(end_time)
+    end_time = end_time.tz_convert("UTC") if end_time.tz else end_time.tz_localize("UTC")
+    if pd.DatetimeIndex(timeseries.index).tz is None:
+        end_time = end_time.tz_localize(None)
+    return timeseries[(timeseries.index > end_time - window) & (timeseries.index <= end_time)]
+
+
+def _render_lightcurve_figure(goes_timeseries: pd.DataFrame, aia_timeseries: pd.DataFrame, product: str) -> bytes:
+    """
+    Renders the lightcurve figure of one window as a PNG.
+
+    Parameters
+    ----------
+    goes_timeseries : pandas.DataFrame
+        GOES JSON dataframe of the window.
+    aia_timeseries : pandas.DataFrame
+        AIA dataframe of the window.
+    product : str
+        The name of the product in the metrics.
+
+    Returns
+    -------
+    bytes
+        The PNG.
+    """
+    with measure("render", product):
+        fig = plot_lightcurve_from_timeseries(goes_timeseries, aia_timeseries)
+    with measure("encode", product) as metrics:
+        plot_image = io.BytesIO()
+        with MATPLOTLIB_LOCK:
+            fig.savefig(plot_image, format="png", dpi=fig.dpi)
+        metrics.add_bytes(plot_image.tell())
+    return plot_image.getvalue()
+
+
+def _render_lightcurve_figures(figures: list[tuple[pd.DataFrame, pd.DataFrame, str]]) -> list[bytes]:
+    """
+    Renders the lightcurve figures of several windows in parallel.
+
+    Parameters
+    ----------
+    figures : list[tuple[pandas.DataFrame, pandas.DataFrame, str]]
+        The GOES and AIA dataframes of each window, and the name of its
+        product in the metrics.
+
+    Returns
+    -------
+    list[bytes]
+        The PNG of each window.
+    """
+    if len(figures) <= 1:
+        return list(starmap(_render_lightcurve_figure, figures))
+    # The threads run in copies of this context, so they record into the metrics of the job
+    with ThreadPoolExecutor(max_workers=len(figures), thread_name_prefix="suntoday-lightcurve") as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, _render_lightcurve_figure, *arguments)
+            for arguments in figures
+        ]
+        return [future.result() for future in futures]
+
+
+def _fetch_aia_timeseries(source, end_time: datetime, duration: timedelta) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fetches the AIA timeseries, reading the part already in the archive.
+
+    The archived rows are used up to the first gap in the archive, e.g.,
+    from jobs that did not run, and only the rest is fetched. The last
+    ``AIA_ARCHIVE_MAX_GAP`` before that is fetched again, as not every
+    wavelength of the newest times may have been there yet. A failure to
+    read the archive is logged and the whole duration fetched.
+
+    Parameters
+    ----------
+    source : suntoday.sources.Source
+        The source to fetch from.
+    end_time : datetime.datetime
+        The end of the timeseries.
+    duration : datetime.timedelta
+        The length of the timeseries.
+
+    Returns
+    -------
+    pandas.DataFrame
+        AIA dataframe of the duration.
+    pandas.DataFrame
+        The part that was fetched, to append to the archive.
+
+    Raises
+    ------
+    ValueError
+        If nothing is archived and the source has no data.
+    """
+    from suntoday.timeseries import read_timeseries
+
+    end = pd.Timestamp(end_time)
+    end = end.tz_convert("UTC") if end.tz else end.tz_localize("UTC")
+    start = end - duration
+    try:
+        with measure("archive", "aia"):
+            archived = read_timeseries("aia", end, duration)
+    except Exception as e:  # NOQA : BLE001
+        logger.exception(f"Reading the archived AIA timeseries failed: {e}")
+        archived = None
+    fetch_start = start
+    if archived is not None and not archived.empty:
+        times = pd.DatetimeIndex([start]).append(archived.index.unique().sort_values())
+        gaps = np.flatnonzero((times[1:] - times[:-1]) > AIA_ARCHIVE_MAX_GAP)
+        last_archived = times[gaps[0]] if len(gaps) else times[-1]
+        fetch_start = max(last_archived - AIA_ARCHIVE_MAX_GAP, start)
+    try:
+        fetched = source.fetch_aia_timeseries(end_time, (end - fetch_start).to_pytimedelta())
+    except ValueError as e:
+        # Nothing new since the archive, the JSOC can be behind
+        if fetch_start == start:
+            raise
+        logger.warning(f"No AIA timeseries fetched since {fetch_start}: {e}")
+        fetched = archived.iloc[:0]
+    logger.debug(f"Fetched the AIA timeseries from {fetch_start}, {duration - (end - fetch_start)} was archived")
+    if fetch_start == start:
+        return fetched, fetched
+    archived = archived[archived.index <= fetch_start]
+    if pd.DatetimeIndex(fetched.index).tz is None:
+        archived = archived.set_axis(archived.index.tz_convert(None))
+    timeseries = pd.concat([archived, fetched])
+    # A source that also returns the first time has it twice
+    timeseries = timeseries[~pd.MultiIndex.from_arrays([timeseries.index, timeseries["WAVELNTH"]]).duplicated("last")]
+    return timeseries, fetched
+
+
+def _archive_timeseries(
+    end_time: datetime,
+    duration: timedelta,
+    aia_timeseries: pd.DataFrame | None,
+    goes_primary_timeseries: pd.DataFrame,
+    goes_secondary_timeseries: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Appends the fetched timeseries to the Parquet archive.
+
+    A failure is logged, the lightcurve is still made from the fetched
+    timeseries.
+
+    Parameters
+    ----------
+    end_time : datetime.datetime
+        The end of the timeseries.
+    duration : datetime.timedelta
+        The length of the timeseries.
+    aia_timeseries : pandas.DataFrame | None
+        AIA dataframe of the rows fetched, or None if the AIA data are not
+        archived.
+    goes_primary_timeseries : pandas.DataFrame
+        GOES JSON dataframe of the primary satellite.
+    goes_secondary_timeseries : pandas.DataFrame
+        GOES JSON dataframe of the secondary satellite.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The GOES dataframe of the primary satellite to plot, from the
+        archive if SWPC does not serve the whole duration.
+    """
+    from suntoday.timeseries import append_timeseries, read_timeseries
+
+    archived = {"goes_primary": goes_primary_timeseries, "goes_secondary": goes_secondary_timeseries}
+    if aia_timeseries is not None:
+        archived["aia"] = aia_timeseries
+    try:
+        with measure("archive", "lightcurve"):
+            for name, timeseries in archived.items():
+                append_timeseries(name, timeseries)
+            # SWPC serves at most a week, the earlier jobs have archived the rest
+            if duration > max(GOES_FEEDS):
+                return read_timeseries("goes_primary", end_time, duration)
+    except Exception as e:  # NOQA : BLE001
+        logger.exception(f"Archiving the timeseries failed: {e}")
+    return goes_primary_timeseries
+
+
 def create_lightcurve_figure(end_time: datetime, save_directory: Path) -> None:
     """
     Creates the full timeseries plot for the given datetime and saves it to the
     given directory.
 
-    This also saves out the data used as text files.
+    A plot is made of each window of ``Settings.lightcurve_windows``, the
+    24 hour window as ``lightcurve_<date>.png`` and the others as
+    ``lightcurve_<hours>h_<date>.png``, from a single load of the data.
+
+    The data come from the source selected by ``Settings.source``, apart
+    from the AIA data with ``Settings.lightcurve_source = "disk"``, which
+    are the disk statistics of our own maps. With
+    ``Settings.timeseries_archive`` they are appended to the Parquet
+    archive of `suntoday.timeseries`, which also has the GOES data of
+    windows longer than SWPC serves, and only the AIA data newer than
+    the archive are fetched. With
+    ``Settings.timeseries_text_export`` this also saves out the data of
+    the previous 24 hours as text files.
 
     Parameters
     ----------
@@ -152,19 +508,53 @@ def create_lightcurve_figure(end_time: datetime, save_directory: Path) -> None:
     save_directory : pathlib.Path
         Save directory for the plot.
     """
-    from suntoday.downloaders.goes import fetch_goes_timeseries
-    from suntoday.downloaders.jsoc import fetch_aia_timeseries
+    from suntoday.sources import get_source
+
+    settings = Settings()
+    windows = sorted({timedelta(hours=hours) for hours in settings.lightcurve_windows})
+    # The text files are always of the last day
+    duration = max([*windows, timedelta(days=1)])
+    source = get_source()
+    # The AIA rows new to the archive, the disk statistics are already kept by suntoday.diskstats
+    fetched_aia_timeseries = None
+    if settings.lightcurve_source == "disk":
+        from suntoday.diskstats import read_disk_statistics
+
+        aia_timeseries = read_disk_statistics(end_time, duration)
+    elif settings.timeseries_archive:
+        aia_timeseries, fetched_aia_timeseries = _fetch_aia_timeseries(source, end_time, duration)
+    else:
+        aia_timeseries = source.fetch_aia_timeseries(end_time, duration)
+    goes_primary_timeseries, goes_secondary_timeseries = source.fetch_goes_timeseries(end_time, duration)
+    if settings.timeseries_archive:
+        goes_primary_timeseries = _archive_timeseries(
+            end_time, duration, fetched_aia_timeseries, goes_primary_timeseries, goes_secondary_timeseries
+        )
 
-    aia_timeseries = fetch_aia_timeseries(end_time)
-    goes_primary_timeseries, _goes_secondary_timeseries = fetch_goes_timeseries()
-    fig = plot_lightcurve_from_timeseries(goes_primary_timeseries, aia_timeseries)
-    plot_path = save_directory / f"lightcurve_{end_time:%Y%m%d}.png"
-    fig.savefig(str(plot_path), dpi=fig.dpi)
-    logger.debug(f"Timeseries figure saved to {plot_path}")
-    plt.close(fig)
+    def get_window(timeseries: pd.DataFrame, window: timedelta) -> pd.DataFrame:
+        # The whole load is kept as it was fetched, SWPC only serves data up to now
+        return timeseries if window == duration else _get_window(timeseries, end_time, window)
+
+    figures = []
+    for window in windows:
+        hours = round(window.total_seconds() / 3600)
+        name = "lightcurve" if window == timedelta(days=1) else f"lightcurve_{hours}h"
+        figures.append((
+            save_directory / f"{name}_{end_time:%Y%m%d}.png",
+            (get_window(goes_primary_timeseries, window), get_window(aia_timeseries, window), name),
+        ))
+    plot_images = _render_lightcurve_figures([arguments for _, arguments in figures])
+    for (plot_path, (*_, name)), plot_image in zip(figures, plot_images, strict=True):
+        with measure("write", name) as metrics:
+            metrics.add_bytes(write_atomic(plot_path, plot_image))
+        logger.debug(f"Timeseries figure saved to {plot_path}")
+    if not settings.timeseries_text_export:
+        return
     aia_path = save_directory / "aia_light_curves.txt"
-    aia_timeseries.to_csv(aia_path, sep="\t", date_format="%Y-%m-%dT%H:%M:%SZ")
-    logger.debug(f"AIA timeseries txt saved to {aia_path}")
     goes_path = save_directory / "goes_light_curves.txt"
-    goes_primary_timeseries.to_csv(goes_path, sep="\t", date_format="%Y-%m-%dT%H:%M:%SZ")
+    with measure("write", "lightcurve") as metrics:
+        for path, timeseries in [(aia_path, aia_timeseries), (goes_path, goes_primary_timeseries)]:
+            text = get_window(timeseries, timedelta(days=1)).to_csv(sep="\t", date_format="%Y-%m-%dT%H:%M:%SZ")
+            metrics.add_bytes(write_atomic(path, text.encode()))
+    logger.debug(f"AIA timeseries txt saved to {aia_path}")
     logger.debug(f"GOES timeseries txt saved to {goes_path}")
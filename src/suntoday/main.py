@@ -5,25 +5,28 @@ This module contains the main entry point for the application, as well
 as the scheduled jobs for creating JPEG images and timeseries data.
 """
 
+import contextlib
+import contextvars
 import datetime
 import functools
+import threading
 import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
 import schedule
-import sentry_sdk
 from sentry_sdk.integrations.serverless import serverless_function
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import Session
 
-from suntoday import logger
+from suntoday import init_sentry, logger
 from suntoday.config import Settings
-from suntoday.db import create_db, get_record, write_or_update_record
-from suntoday.jpegs import create_sdo_images
-from suntoday.lightcurve import create_lightcurve_figure
-
-sentry_sdk.init(
-    dsn="https://a16063ea547141a4862651c80df74f68@o4505489018060800.ingest.sentry.io/4505489021337600",
-)
+from suntoday.db import get_record, get_session, init_db, write_or_update_record
+from suntoday.metrics import export_metrics, job_metrics, measure
+from suntoday.profiling import profile_job
+from suntoday.publish import publish_latest
+from suntoday.scheduler import schedule_flare_cadence, schedule_jsoc_trigger
+from suntoday.warmup import warm_up
 
 
 def catch_exceptions(*, cancel_on_failure=False):
@@ -58,13 +61,20 @@ def catch_exceptions(*, cancel_on_failure=False):
 
 @serverless_function
 def create_images(
-    database_session: Session, image_type: str, requested_time: datetime.datetime, save_directory: Path
+    database_session: Session,
+    image_type: str,
+    requested_time: datetime.datetime,
+    save_directory: Path,
+    products: list[str] | None = None,
 ) -> None:
     """
     Create images for the requested time. It checks if the nearest record and
     the observation date are within a reasonable range. If not, it creates SDO
     images and updates the record in the database.
 
+    If only some SDO products are requested, they are always created and
+    the record is left alone, since it tracks the full set.
+
     Parameters
     ----------
     database_session : Session
@@ -75,16 +85,27 @@ def create_images(
         The date for which to create images.
     save_directory : Path
         The directory where the images will be saved.
+    products : list[str], optional
+        Only create these SDO products, see `suntoday.jpegs.get_product_name`.
+        Defaults to all products.
 
     Raises
     ------
     ValueError
         If the image_type is not "images" or "timeseries".
     """
+    # These pull in sunpy and matplotlib, so only import them when needed
+    from suntoday.jpegs import create_sdo_images
+    from suntoday.lightcurve import create_lightcurve_figure
+
     if image_type not in {"images", "timeseries"}:
         msg = f"Invalid image type: {image_type}. Must be 'images' or 'timeseries'."
         raise ValueError(msg)
     requested_time = requested_time.astimezone(datetime.UTC)
+    if image_type == "images" and products is not None:
+        logger.info(f"Creating {products} for {requested_time} in {save_directory}")
+        create_sdo_images(requested_time, save_directory, products=products)
+        return
     nearest_record = get_record(database_session, image_type, requested_time.date())
     if nearest_record is not None and nearest_record.updated_at > requested_time - datetime.timedelta(minutes=10):
         logger.info(f"{image_type} for {requested_time} are too new, skipping creation.")
@@ -104,15 +125,130 @@ def create_images(
     logger.info(f"{image_type} creation and record update completed")
 
 
+def run_pipeline(
+    image_type: str, requested_time: datetime.datetime, save_directory: Path, products: list[str] | None = None
+) -> None:
+    """
+    Run one pipeline with its own database session.
+
+    Errors are logged and not raised, so a failure in one pipeline does not
+    affect the other.
+
+    Parameters
+    ----------
+    image_type : str
+        The type of images to create, either "images" or "timeseries".
+    requested_time : datetime.datetime
+        The date for which to create images.
+    save_directory : Path
+        The directory where the images will be saved.
+    products : list[str], optional
+        Only create these SDO products.
+        Defaults to all products.
+    """
+    # Names the pipeline in the logs and as the root frame of profiles
+    threading.current_thread().name = f"suntoday-{image_type}"
+    session = get_session()
+    try:
+        logger.info(f"Creating {image_type}")
+        create_images(session, image_type, requested_time, save_directory, products)
+    except Exception as e:  # NOQA : BLE001
+        logger.exception(f"Error occurred creating {image_type}: {e}")
+    finally:
+        session.close()
+
+
+def get_save_directory(requested_time: datetime.datetime, root_save_directory: Path | None = None) -> Path:
+    """
+    Return the directory for the outputs of the requested time, creating it
+    if needed.
+
+    Parameters
+    ----------
+    requested_time : datetime.datetime
+        The time the outputs are for.
+    root_save_directory : Path, optional
+        The root directory, the outputs are saved under a year/month/day
+        tree within it. Defaults to ``Settings.save_directory``.
+
+    Returns
+    -------
+    Path
+        The save directory.
+    """
+    root_save_directory = root_save_directory or Settings().save_directory
+    root_save_directory = Path(root_save_directory).expanduser().resolve()
+    logger.info(f"Root save directory: {root_save_directory}")
+    save_directory = (
+        root_save_directory
+        / requested_time.strftime("%Y")
+        / requested_time.strftime("%m")
+        / requested_time.strftime("%d")
+    )
+    save_directory.mkdir(parents=True, exist_ok=True)
+    return save_directory
+
+
+@contextlib.contextmanager
+def run_in_job(
+    save_directory: Path, root_save_directory: Path | None = None, name: str = "main_job", *, publish: bool = True
+) -> Iterator[None]:
+    """
+    Run the enclosed block as a job, however the job was scheduled.
+
+    The block records into its own metrics and is profiled. Afterwards,
+    even if it failed, the outputs are published as the "latest" release
+    and the metrics are exported.
+
+    Parameters
+    ----------
+    save_directory : pathlib.Path
+        The day directory the job saves its outputs to.
+    root_save_directory : pathlib.Path, optional
+        The root directory ``latest`` is published in.
+        Defaults to ``Settings.save_directory``.
+    name : str, optional
+        Name of the profile. Defaults to "main_job".
+    publish : bool, optional
+        Publish the outputs, which jobs of past days, e.g., a backfill,
+        should not. Defaults to True.
+
+    Yields
+    ------
+    None
+        While the job runs.
+    """
+    settings = Settings()
+    # Its own metrics, so a job running at the same time does not reset them
+    with job_metrics():
+        try:
+            # The save directory is <root>/<year>/<month>/<day>, the last profiles are kept across all the days
+            with profile_job(save_directory, name, root_directory=save_directory.parents[2]):
+                yield
+        finally:
+            if publish and settings.publish_latest:
+                try:
+                    with measure("publish"):
+                        publish_latest(save_directory, root_save_directory)
+                except Exception as e:  # NOQA : BLE001
+                    logger.exception(f"Error occurred publishing {save_directory}: {e}")
+            export_metrics()
+
+
 @catch_exceptions(cancel_on_failure=True)
-def main_job(requested_time: datetime.datetime | None = None, root_save_directory: Path | None = None) -> None:
+def main_job(
+    requested_time: datetime.datetime | None = None,
+    root_save_directory: Path | None = None,
+    products: list[str] | None = None,
+) -> None:
     """
     Main job to create SDO Images and lightcurve images.
 
     This function is scheduled to run periodically based on the cron
     frequency defined in the settings. It creates SDO Images and
     lightcurve images for the requested time, or the current time if not
-    specified.
+    specified. ``products`` limits which SDO Images are created. The
+    outputs are then published as the "latest" release.
     """
     logger.info("Running main job to create SDO Images and lightcurve images")
     settings = Settings()
@@ -120,30 +256,24 @@ def main_job(requested_time: datetime.datetime | None = None, root_save_director
         requested_time = datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=settings.jsoc_delay)
     else:
         requested_time = requested_time.astimezone(datetime.UTC)
-    root_save_directory = root_save_directory or settings.save_directory
-    root_save_directory = Path(root_save_directory).expanduser().resolve()
-    logger.info(f"Root save directory: {root_save_directory}")
-    save_directory = (
-        root_save_directory
-        / requested_time.strftime("%Y")
-        / requested_time.strftime("%m")
-        / requested_time.strftime("%d")
-    )
-    save_directory.mkdir(parents=True, exist_ok=True)
+    save_directory = get_save_directory(requested_time, root_save_directory)
     logger.info(f"Requested time: {requested_time}, Save directory: {save_directory}")
-    logger.info("Checking and creating database if necessary")
-    engine = create_db()
-    try:
-        session = sessionmaker(bind=engine)()
-        logger.info("Creating SDO Images")
-        create_images(session, "images", requested_time, save_directory)
-        logger.info("Creating lightcurve images")
-        create_images(session, "timeseries", requested_time, save_directory)
-    except Exception as e:  # NOQA : BLE001
-        logger.exception(f"Error occurred: {e}")
-    finally:
-        session.close()
-        engine.dispose()
+    # This is a no-op once the database has been bootstrapped by this process
+    init_db()
+    # The lightcurve is cheap, so it should not wait behind the SDO images. Neither uses pyplot and both draw
+    # under MATPLOTLIB_LOCK, so their figures can be built in parallel. Each runs in a copy of this context,
+    # so records into the metrics of this job
+    with (
+        run_in_job(save_directory, root_save_directory),
+        ThreadPoolExecutor(max_workers=2, thread_name_prefix="suntoday") as executor,
+    ):
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run, run_pipeline, image_type, requested_time, save_directory, products
+            )
+            for image_type in ["timeseries", "images"]
+        ]
+        wait(futures)
     logger.info("Main job completed")
 
 
@@ -153,10 +283,41 @@ def main() -> None:
     Main function to start the scheduled job.
     """
     settings = Settings()
-    logger.info(f"Starting main job with cron frequency: {settings.cron_frequency} minutes")
-    schedule.every(settings.cron_frequency).minutes.do(main_job)
-    logger.info("Running first job immediately")
-    main_job()
+    init_sentry()
+    logger.info("Checking and creating database if necessary")
+    init_db()
+    warm_up()
+    if settings.scheduler_mode == "jsoc":
+        logger.info(
+            f"Starting main job when new JSOC data is found, polling every {settings.jsoc_poll_frequency} seconds"
+        )
+        trigger = schedule_jsoc_trigger(main_job)
+        logger.info("Polling the JSOC immediately")
+        trigger.poll()
+    elif settings.scheduler_mode == "queue":
+        from suntoday.jobqueue import enqueue_latest, schedule_enqueue
+
+        logger.info(
+            f"Queueing jobs with cron frequency: {settings.cron_frequency} minutes, "
+            "run workers with python -m suntoday.jobqueue"
+        )
+        schedule_enqueue()
+        logger.info("Queueing first jobs immediately")
+        enqueue_latest()
+    elif settings.scheduler_mode == "flare":
+        logger.info(
+            f"Starting main job with cron frequency: {settings.cron_frequency} minutes, "
+            f"{settings.flare_cron_frequency} minutes above {settings.flare_threshold}"
+        )
+        monitor = schedule_flare_cadence(main_job)
+        logger.info("Running first job immediately, unless there is a flare")
+        monitor.run_full()
+        monitor.run()
+    else:
+        logger.info(f"Starting main job with cron frequency: {settings.cron_frequency} minutes")
+        schedule.every(settings.cron_frequency).minutes.do(main_job)
+        logger.info("Running first job immediately")
+        main_job()
     logger.info(f"Next job in {schedule.idle_seconds()} seconds")
     while True:
         schedule.run_pending()
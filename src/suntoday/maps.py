@@ -2,14 +2,15 @@
 Functions to create sunpy maps from FITS files.
 """
 
+import functools
 from pathlib import Path
 
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 import numpy as np
 import sunpy.map as smap
 from aiapy.calibrate import correct_degradation
 from aiapy.calibrate.util import get_correction_table
+from astropy.table import QTable
 from sunpy.map import all_coordinates_from_map, coordinate_is_on_solar_disk
 
 from suntoday.data import RESPONSE_TABLE_V10
@@ -17,6 +18,19 @@ from suntoday.data import RESPONSE_TABLE_V10
 __all__ = ["create_aia_map", "create_hmi_map"]
 
 
+@functools.cache
+def _get_correction_table() -> QTable:
+    """
+    Parse the degradation correction table once per process.
+
+    Returns
+    -------
+    astropy.table.QTable
+        The correction table.
+    """
+    return get_correction_table(str(RESPONSE_TABLE_V10))
+
+
 def create_aia_map(file: Path) -> smap.GenericMap:
     """
     Creates a degradation corrected and exposure normalized AIA Map.
@@ -34,7 +48,7 @@ def create_aia_map(file: Path) -> smap.GenericMap:
         Degradation corrected and exposure normalized AIA Map.
     """
     aia_map = smap.Map(file)
-    aia_map = correct_degradation(aia_map, correction_table=get_correction_table(str(RESPONSE_TABLE_V10)))
+    aia_map = correct_degradation(aia_map, correction_table=_get_correction_table())
     aia_map /= aia_map.exposure_time
     aia_map.meta["exptime"] = 1.0
     aia_map.meta["BUNIT"] = "ct / s"
@@ -63,7 +77,7 @@ def create_hmi_map(file: Path) -> smap.GenericMap:
     fill_value = np.nan if map_hmi.measurement == "magnetogram" else 0
     map_hmi.data[~coordinate_is_on_solar_disk(all_coordinates_from_map(map_hmi))] = fill_value
     if map_hmi.measurement == "magnetogram":
-        map_hmi.plot_settings["norm"] = plt.Normalize(-1000, 1000)
+        map_hmi.plot_settings["norm"] = mpl.colors.Normalize(-1000, 1000)
         map_hmi.plot_settings["cmap"] = "hmimag"
         cmap = mpl.colormaps.get_cmap(map_hmi.plot_settings["cmap"])
         cmap.set_bad(color="black")
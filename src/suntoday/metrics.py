@@ -0,0 +1,318 @@
+"""
+Provides per-stage timing and resource metrics for each job.
+
+Each stage records its wall time, CPU time, how much the RSS of the
+process grew and the number of bytes it moved. The metrics of a job are
+exported as a Prometheus textfile or a JSON snapshot, so local tooling
+can scrape them without any external service.
+
+Each job records into its own registry, see `job_metrics`, so jobs
+running at the same time do not mix or reset each other's metrics.
+Threads started by a job record into its registry if they run in a copy
+of its context, e.g., ``executor.submit(contextvars.copy_context().run,
+function)``.
+"""
+
+import contextvars
+import json
+import resource
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.publish import write_atomic
+
+__all__ = ["METRICS", "MetricsRegistry", "StageMetrics", "export_metrics", "get_metrics", "job_metrics", "measure"]
+
+PROMETHEUS_FILENAME = "suntoday.prom"
+JSON_FILENAME = "suntoday_metrics.json"
+PROMETHEUS_METRICS = {
+    "wall_time": ("suntoday_stage_wall_seconds", "Wall time spent in the stage."),
+    "cpu_time": ("suntoday_stage_cpu_seconds", "CPU time spent in the stage by the thread running it."),
+    "rss_growth": (
+        "suntoday_stage_rss_growth_bytes",
+        "Largest growth of the resident set size of the process over one run of the stage.",
+    ),
+    "bytes": ("suntoday_stage_bytes", "Bytes downloaded, encoded or written by the stage."),
+    "count": ("suntoday_stage_count", "Number of times the stage ran."),
+}
+
+
+def _rss() -> int:
+    """
+    Return the current resident set size of the process.
+
+    Returns
+    -------
+    int
+        The resident set size in bytes, 0 where it cannot be read, e.g., on macOS.
+    """
+    try:
+        resident_pages = int(Path("/proc/self/statm").read_text(encoding="ascii").split()[1])
+    except OSError:
+        return 0
+    return resident_pages * resource.getpagesize()
+
+
+class StageMetrics:
+    """
+    The metrics of one stage for one product.
+
+    Repeated runs of the same stage and product within a job are summed,
+    apart from the RSS growth which is the largest of any run. The growth
+    is of the whole process, so includes memory allocated by stages
+    running in other threads at the same time.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, e.g., "download" or "render".
+    product : str
+        The product the stage was run for.
+    """
+
+    def __init__(self, stage: str, product: str) -> None:
+        self.stage = stage
+        self.product = product
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rss_growth = 0
+        self.bytes = 0
+        self.count = 0
+
+    def add_bytes(self, nbytes: int) -> None:
+        """
+        Add to the number of bytes moved by the stage.
+
+        Parameters
+        ----------
+        nbytes : int
+            Number of bytes.
+        """
+        self.bytes += int(nbytes)
+
+    def to_dict(self) -> dict:
+        """
+        Return the metrics as a dictionary.
+
+        Returns
+        -------
+        dict
+            The metrics.
+        """
+        return {
+            "stage": self.stage,
+            "product": self.product,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "rss_growth": self.rss_growth,
+            "bytes": self.bytes,
+            "count": self.count,
+        }
+
+
+class MetricsRegistry:
+    """
+    A thread-safe store of the metrics of a job.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.started_at = time.time()
+
+    def reset(self) -> None:
+        """
+        Forget all metrics.
+        """
+        with self._lock:
+            self._stages = {}
+            self.started_at = time.time()
+
+    def record(self, metrics: StageMetrics) -> None:
+        """
+        Add the metrics of a finished stage.
+
+        Parameters
+        ----------
+        metrics : StageMetrics
+            The metrics to add.
+        """
+        with self._lock:
+            key = (metrics.stage, metrics.product)
+            if key not in self._stages:
+                self._stages[key] = StageMetrics(metrics.stage, metrics.product)
+            total = self._stages[key]
+            total.wall_time += metrics.wall_time
+            total.cpu_time += metrics.cpu_time
+            total.rss_growth = max(total.rss_growth, metrics.rss_growth)
+            total.bytes += metrics.bytes
+            total.count += metrics.count
+
+    def snapshot(self) -> list[dict]:
+        """
+        Return the metrics of every stage.
+
+        Returns
+        -------
+        list[dict]
+            The metrics of each stage and product.
+        """
+        with self._lock:
+            return [self._stages[key].to_dict() for key in sorted(self._stages)]
+
+    def to_json(self) -> str:
+        """
+        Return the metrics as a JSON document.
+
+        Returns
+        -------
+        str
+            The JSON document.
+        """
+        return json.dumps({"started_at": self.started_at, "stages": self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics, one gauge per measurement.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP suntoday_job_started_timestamp_seconds Start time of the job the metrics are for.",
+            "# TYPE suntoday_job_started_timestamp_seconds gauge",
+            f"suntoday_job_started_timestamp_seconds {self.started_at}",
+        ]
+        for field, (name, description) in PROMETHEUS_METRICS.items():
+            lines.extend((f"# HELP {name} {description}", f"# TYPE {name} gauge"))
+            lines.extend(
+                f'{name}{{stage="{stage["stage"]}",product="{stage["product"]}"}} {stage[field]}' for stage in snapshot
+            )
+        return "\n".join(lines) + "\n"
+
+
+# Records the stages run outside of any job
+METRICS = MetricsRegistry()
+_JOB_METRICS = contextvars.ContextVar("suntoday_job_metrics", default=METRICS)
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Return the registry of the current job.
+
+    Returns
+    -------
+    MetricsRegistry
+        The registry of the job, or `METRICS` outside of a job.
+    """
+    return _JOB_METRICS.get()
+
+
+@contextmanager
+def job_metrics() -> Iterator[MetricsRegistry]:
+    """
+    Record the metrics of the stages run in this context in a new registry.
+
+    Yields
+    ------
+    MetricsRegistry
+        The registry of the job.
+    """
+    registry = MetricsRegistry()
+    token = _JOB_METRICS.set(registry)
+    try:
+        yield registry
+    finally:
+        _JOB_METRICS.reset(token)
+
+
+@contextmanager
+def measure(stage: str, product: str = "all"):
+    """
+    Measure a stage of a job and add it to the registry of the job.
+
+    The CPU time is that of the calling thread, so stages running in
+    other threads at the same time are not counted.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, e.g., "download" or "render".
+    product : str, optional
+        The product the stage is run for.
+        Defaults to "all".
+
+    Yields
+    ------
+    StageMetrics
+        The metrics of the stage, use ``add_bytes`` to record bytes moved.
+    """
+    metrics = StageMetrics(stage, product)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    rss_start = _rss()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - wall_start
+        metrics.cpu_time = time.thread_time() - cpu_start
+        metrics.rss_growth = max(_rss() - rss_start, 0)
+        metrics.count = 1
+        get_metrics().record(metrics)
+
+
+def export_metrics(
+    directory: Path | None = None, metrics_format: str | None = None, registry: MetricsRegistry | None = None
+) -> Path | None:
+    """
+    Write the metrics of a job to disk.
+
+    The file is written next to its final name and then renamed, so a
+    scraper never reads a partial file.
+
+    Parameters
+    ----------
+    directory : pathlib.Path, optional
+        Directory to write the metrics to.
+        Defaults to ``Settings.metrics_directory``, nothing is written if that is not set.
+    metrics_format : str, optional
+        Either "prometheus" or "json".
+        Defaults to ``Settings.metrics_format``.
+    registry : MetricsRegistry, optional
+        The metrics to write, defaults to those of the current job.
+
+    Returns
+    -------
+    pathlib.Path | None
+        The file written, if any.
+
+    Raises
+    ------
+    ValueError
+        If ``metrics_format`` is not valid.
+    """
+    settings = Settings()
+    directory = directory or settings.metrics_directory
+    if directory is None:
+        return None
+    metrics_format = metrics_format or settings.metrics_format
+    registry = registry or get_metrics()
+    if metrics_format == "prometheus":
+        path, content = Path(directory) / PROMETHEUS_FILENAME, registry.to_prometheus()
+    elif metrics_format == "json":
+        path, content = Path(directory) / JSON_FILENAME, registry.to_json()
+    else:
+        msg = f"Invalid metrics format: {metrics_format}. Must be 'prometheus' or 'json'."
+        raise ValueError(msg)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, content.encode())
+    logger.debug(f"Metrics saved to {path}")
+    return path
@@ -0,0 +1,248 @@
+"""
+Provides the archive of each cycle's preview frames and daily movies.
+
+With ``Settings.archive_frames`` enabled, the preview of each product is
+kept under a time stamped name in a "frames" directory, rather than only
+being overwritten by the next cycle, and is appended to a daily Motion
+JPEG AVI of the product in a "movies" directory.
+
+The frames are already JPEGs, so a movie is extended in place by writing
+the frame over the small index at the end of the file, followed by the
+new index, there is no decoding or encoding. A movie left partly
+extended, e.g., by a crash, is written again from the archived frames.
+The published releases hard link the movies, so a movie still in a
+release is copied before it is extended, the release keeps its movie.
+
+Each movie has a lock file, so renders of the same day in other threads
+or processes add their frames one at a time.
+"""
+
+import io
+import os
+import shutil
+import struct
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.publish import atomic_path, file_lock, write_atomic
+
+__all__ = ["append_movie_frame", "archive_frame", "write_movie"]
+
+FRAMES_DIRECTORY = "frames"
+MOVIES_DIRECTORY = "movies"
+FRAME_TIME_FORMAT = "%Y%m%d_%H%M%S"
+# Offsets in the header written by _get_avi_header
+RIFF_SIZE_OFFSET = 4
+AVIH_TOTAL_FRAMES_OFFSET = 48
+AVIH_BUFFER_SIZE_OFFSET = 60
+STRH_LENGTH_OFFSET = 140
+STRH_BUFFER_SIZE_OFFSET = 144
+MOVI_SIZE_OFFSET = 216
+MOVI_OFFSET = 220
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+
+
+def _get_avi_header(width: int, height: int, fps: int) -> bytes:
+    """
+    Return the header of a Motion JPEG AVI with no frames.
+
+    Parameters
+    ----------
+    width : int
+        The width of the frames.
+    height : int
+        The height of the frames.
+    fps : int
+        Frames per second.
+
+    Returns
+    -------
+    bytes
+        The header, up to and including the "movi" list, but no index.
+    """
+    avih = struct.pack("<14I", 1_000_000 // fps, 0, 0, AVIF_HASINDEX, 0, 0, 1, 0, width, height, 0, 0, 0, 0)
+    strh = struct.pack(
+        "<4s4sIHHIIIIIIII4h", b"vids", b"MJPG", 0, 0, 0, 0, 1, fps, 0, 0, 0, 0xFFFFFFFF, 0, 0, 0, width, height
+    )
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0)
+    strl = b"strl" + b"strh" + struct.pack("<I", len(strh)) + strh + b"strf" + struct.pack("<I", len(strf)) + strf
+    hdrl = b"hdrl" + b"avih" + struct.pack("<I", len(avih)) + avih + b"LIST" + struct.pack("<I", len(strl)) + strl
+    header = b"RIFF" + struct.pack("<I", 0) + b"AVI " + b"LIST" + struct.pack("<I", len(hdrl)) + hdrl
+    return header + b"LIST" + struct.pack("<I", 4) + b"movi"
+
+
+def _get_frame_chunk(frame: bytes) -> bytes:
+    """
+    Return a frame as a video chunk, padded to an even size.
+
+    Parameters
+    ----------
+    frame : bytes
+        The JPEG.
+
+    Returns
+    -------
+    bytes
+        The chunk.
+    """
+    return b"00dc" + struct.pack("<I", len(frame)) + frame + b"\0" * (len(frame) % 2)
+
+
+def _update_sizes(movie, index: bytes, movi_end: int) -> None:
+    """
+    Update the sizes and frame counts in the header to match the index.
+
+    Parameters
+    ----------
+    movie : io.BufferedRandom
+        The open movie, with the index written at ``movi_end``.
+    index : bytes
+        The entries of the index.
+    movi_end : int
+        The end of the "movi" list.
+    """
+    entries = list(struct.iter_unpack("<4sIII", index))
+    largest_frame = max((size for *_, size in entries), default=0)
+    for offset, value in [
+        # The RIFF size is of everything after it, which ends with the index
+        (RIFF_SIZE_OFFSET, movi_end + len(index)),
+        (AVIH_TOTAL_FRAMES_OFFSET, len(entries)),
+        (AVIH_BUFFER_SIZE_OFFSET, largest_frame),
+        (STRH_LENGTH_OFFSET, len(entries)),
+        (STRH_BUFFER_SIZE_OFFSET, largest_frame),
+        (MOVI_SIZE_OFFSET, movi_end - MOVI_OFFSET),
+    ]:
+        movie.seek(offset)
+        movie.write(struct.pack("<I", value))
+
+
+def write_movie(path: Path, frames: list[bytes], fps: int | None = None) -> None:
+    """
+    Write a Motion JPEG AVI from JPEG frames.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The movie to write.
+    frames : list[bytes]
+        The JPEGs, all the same size.
+    fps : int, optional
+        Frames per second, defaults to ``Settings.movie_fps``.
+    """
+    fps = fps or Settings().movie_fps
+    with Image.open(io.BytesIO(frames[0])) as image:
+        width, height = image.size
+    movie = io.BytesIO(_get_avi_header(width, height, fps))
+    movie.seek(0, io.SEEK_END)
+    index = b""
+    for frame in frames:
+        index += struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, movie.tell() - MOVI_OFFSET, len(frame))
+        movie.write(_get_frame_chunk(frame))
+    movi_end = movie.tell()
+    movie.write(b"idx1" + struct.pack("<I", len(index)) + index)
+    _update_sizes(movie, index, movi_end)
+    write_atomic(path, movie.getvalue())
+
+
+def append_movie_frame(path: Path, frame: bytes) -> None:
+    """
+    Append a JPEG frame to a Motion JPEG AVI written by `write_movie`.
+
+    The frame and the new index are written over the old index, then the
+    header is updated, so only the end of the movie and the header are
+    written. If the movie is hard linked, e.g., into a published release,
+    it is first replaced by a copy so the link keeps the old movie.
+
+    The caller holds the lock of the movie, see `archive_frame`.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The movie.
+    frame : bytes
+        The JPEG, the same size as the other frames.
+
+    Raises
+    ------
+    ValueError
+        If the movie was not written by `write_movie`, or was left partly
+        appended.
+    """
+    path = Path(path)
+    if path.stat().st_nlink > 1:
+        with atomic_path(path) as temp_path:
+            shutil.copyfile(path, temp_path)
+    with path.open("r+b") as movie:
+        movie.seek(MOVI_SIZE_OFFSET - 4)
+        list_id, movi_size, movi_id = struct.unpack("<4sI4s", movie.read(12))
+        movi_end = MOVI_OFFSET + movi_size
+        movie.seek(movi_end)
+        index_id, index_size = struct.unpack("<4sI", movie.read(8).ljust(8, b"\0"))
+        index = movie.read(index_size)
+        if (list_id, movi_id, index_id) != (b"LIST", b"movi", b"idx1") or len(index) != index_size:
+            msg = f"{path} is not a movie written by suntoday"
+            raise ValueError(msg)
+        index += struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, movi_end - MOVI_OFFSET, len(frame))
+        # Until the header is updated the old index is gone, which the check above finds in the next append
+        movie.seek(movi_end)
+        movie.write(_get_frame_chunk(frame))
+        movi_end = movie.tell()
+        movie.write(b"idx1" + struct.pack("<I", len(index)) + index)
+        movie.truncate()
+        _update_sizes(movie, index, movi_end)
+        movie.flush()
+        os.fsync(movie.fileno())
+
+
+def archive_frame(preview_path: Path, frame: bytes, observation_time: datetime) -> Path:
+    """
+    Archive a preview frame and add it to the daily movie of its product.
+
+    The frame is normally appended to the movie. If it is not the latest
+    frame of the day, e.g., from a backfill, or the movie cannot be
+    appended to, the movie is written again from the archived frames in
+    time order, which still needs no encoding.
+
+    Parameters
+    ----------
+    preview_path : pathlib.Path
+        The preview, which names the archived frame and the movie.
+    frame : bytes
+        The encoded preview, rather than the file, which the next render
+        of the day can replace before it is archived.
+    observation_time : datetime.datetime
+        The time of the observation.
+
+    Returns
+    -------
+    pathlib.Path
+        The archived frame.
+    """
+    preview_path = Path(preview_path)
+    frames_directory = preview_path.parent / FRAMES_DIRECTORY / preview_path.stem
+    frames_directory.mkdir(parents=True, exist_ok=True)
+    frame_path = frames_directory / f"{preview_path.stem}_{observation_time:{FRAME_TIME_FORMAT}}{preview_path.suffix}"
+    movie_path = preview_path.parent / MOVIES_DIRECTORY / f"{preview_path.stem}.avi"
+    movie_path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(movie_path.with_name(f".{movie_path.name}.lock")):
+        frame_paths = sorted(path for path in frames_directory.iterdir() if not path.name.startswith("."))
+        rebuild = bool(frame_paths) and frame_paths[-1].name >= frame_path.name
+        write_atomic(frame_path, frame)
+        if not rebuild and movie_path.exists():
+            try:
+                append_movie_frame(movie_path, frame)
+            except ValueError as e:
+                logger.warning(f"Writing {movie_path} again from the frames: {e}")
+                rebuild = True
+            else:
+                logger.debug(f"Frame {frame_path.name} appended to {movie_path}")
+        if rebuild or not movie_path.exists():
+            frame_paths = sorted(path for path in frames_directory.iterdir() if not path.name.startswith("."))
+            write_movie(movie_path, [path.read_bytes() for path in frame_paths])
+            logger.debug(f"Movie {movie_path} written from {len(frame_paths)} frames")
+    return frame_path
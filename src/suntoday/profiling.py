@@ -0,0 +1,188 @@
+"""
+Provides opt-in profiling of each job.
+
+When ``Settings.profiling`` is enabled, every job is sampled by a
+stack sampler and traced by `tracemalloc`. The samples of every thread
+are written as folded stacks, which can be turned into a flamegraph by
+``flamegraph.pl`` or loaded by speedscope, and the allocations as a
+`tracemalloc` snapshot plus a plain text summary of the largest ones.
+"""
+
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+
+from suntoday import logger
+from suntoday.config import Settings
+
+__all__ = ["ALL_PROFILES", "StackSampler", "profile_job", "prune_profiles"]
+
+PROFILE_DIRECTORY = "profiles"
+# The profiles of every save directory under the root, which are <year>/<month>/<day>
+ALL_PROFILES = f"*/*/*/{PROFILE_DIRECTORY}/*"
+TRACEMALLOC_FRAMES = 25
+TRACEMALLOC_TOP = 50
+
+
+class StackSampler:
+    """
+    Periodically samples the call stack of every other thread.
+
+    Sampling is used rather than `cProfile`, as the pipelines of a job
+    run in worker threads and only one deterministic profiler can be
+    active at a time.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between samples.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start sampling in a background thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="suntoday-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop sampling and wait for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """
+        Take one sample of the stack of every thread but the sampler.
+        """
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        sampler_ident = threading.get_ident()
+        for ident, top_frame in sys._current_frames().items():  # NOQA: SLF001
+            if ident == sampler_ident:
+                continue
+            stack = []
+            frame = top_frame
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, str(ident)))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def to_folded(self) -> str:
+        """
+        Return the samples as folded stacks.
+
+        Returns
+        -------
+        str
+            One line per unique stack, with the thread name as the root
+            frame followed by the number of samples.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+def prune_profiles(directory: Path, keep_last: int, pattern: str = "*") -> None:
+    """
+    Delete all but the last ``keep_last`` profiles in a directory.
+
+    The files of one profile share a stem which ends in the time it
+    was taken, so they are ordered by that time, across every directory
+    matched by ``pattern``.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        The profile directory, or the root of ``pattern``.
+    keep_last : int
+        Number of profiles to keep.
+    pattern : str, optional
+        The files of the profiles relative to ``directory``, e.g.,
+        `ALL_PROFILES`. Defaults to those in ``directory``.
+    """
+    profiles = {}
+    for path in Path(directory).glob(pattern):
+        profiles.setdefault((path.parent, path.stem), []).append(path)
+    by_time = sorted(profiles, key=lambda profile: (profile[1].rsplit("_", 1)[-1], profile[1]))
+    for profile in by_time[: max(len(profiles) - keep_last, 0)]:
+        for path in profiles[profile]:
+            path.unlink(missing_ok=True)
+        logger.debug(f"Deleted old profile {profile[0] / profile[1]}")
+
+
+@contextmanager
+def profile_job(save_directory: Path, name: str = "main_job", root_directory: Path | None = None):
+    """
+    Profile the enclosed block if ``Settings.profiling`` is enabled.
+
+    The profile is written to a "profiles" directory inside
+    ``save_directory``, and only the last ``Settings.profiling_keep_last``
+    profiles are kept.
+
+    Parameters
+    ----------
+    save_directory : pathlib.Path
+        The directory the job saves its outputs to.
+    name : str, optional
+        Name of the profile, used as the start of the filenames.
+        Defaults to "main_job".
+    root_directory : pathlib.Path, optional
+        The root of the save directories, the last profiles are kept of
+        all of them rather than of each day. Defaults to only keeping the
+        last profiles of ``save_directory``.
+
+    Yields
+    ------
+    StackSampler | None
+        The sampler, or None if profiling is disabled.
+    """
+    settings = Settings()
+    if not settings.profiling:
+        yield None
+        return
+    started_at = datetime.now(UTC)
+    sampler = StackSampler(settings.profiling_interval)
+    # Someone else may already be tracing, if so leave it running
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+        profile_directory = Path(save_directory) / PROFILE_DIRECTORY
+        profile_directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{name}_{started_at:%Y%m%dT%H%M%S}"
+        (profile_directory / f"{stem}.folded").write_text(sampler.to_folded(), encoding="utf-8")
+        snapshot.dump(str(profile_directory / f"{stem}.tracemalloc"))
+        top_allocations = snapshot.statistics("lineno")[:TRACEMALLOC_TOP]
+        (profile_directory / f"{stem}.txt").write_text(
+            "".join(f"{statistic}\n" for statistic in top_allocations), encoding="utf-8"
+        )
+        logger.info(f"Profile of {name} saved to {profile_directory / stem}")
+        if root_directory is None:
+            prune_profiles(profile_directory, settings.profiling_keep_last)
+        else:
+            prune_profiles(root_directory, settings.profiling_keep_last, ALL_PROFILES)
@@ -0,0 +1,300 @@
+"""
+Provides the atomic publication of the latest outputs for mirrors.
+
+The outputs of a job are written into the day directory as they are
+made, so a mirror syncing that directory can see half of a cycle. After
+each job the day directory is staged as a new release, which hard links
+every output so it costs no extra space, and a ``latest`` symlink in
+the root save directory is switched to it with a single rename.
+
+Every release has a manifest with the size, SHA-256 and modification
+time of each output, and which outputs changed or were removed since
+the previous release, so mirrors only need to fetch what changed.
+
+Hard links share the file with the day directory, so the outputs must
+be replaced with `write_atomic` rather than rewritten in place, or the
+published release would change under the mirrors.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+
+from suntoday import logger
+from suntoday.config import Settings
+
+__all__ = ["atomic_path", "build_manifest", "file_lock", "publish_latest", "write_atomic"]
+
+LATEST_DIRECTORY = "latest"
+RELEASES_DIRECTORY = ".releases"
+MANIFEST_FILENAME = "manifest.json"
+# Not outputs, they are only useful next to the job that made them
+EXCLUDED_DIRECTORIES = {"profiles"}
+# mkstemp creates files only the owner can read, outputs get the usual permissions instead
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextlib.contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """
+    Return a temporary file to write, which is then renamed to a path.
+
+    Every call has its own temporary file, so writers of the same path
+    never touch each other's partly written file, the last rename wins.
+    The temporary file is deleted if the write fails.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to write.
+
+    Yields
+    ------
+    pathlib.Path
+        The temporary file, hidden and in the same directory as the file.
+    """
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    temp_path = Path(temp_name)
+    try:
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        os.close(fd)
+        yield temp_path
+        temp_path.replace(path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive lock of a file, blocking until it is free.
+
+    The lock is shared by every thread and process that locks the same
+    file, it is created if it does not exist.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The lock file, hidden so it is not published.
+
+    Yields
+    ------
+    None
+        While the lock is held.
+    """
+    # Each open is its own lock, so this also serialises the threads of a process
+    with Path(path).open("ab") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_atomic(path: Path, content: bytes) -> int:
+    """
+    Write a file next to its final name and then rename it.
+
+    Readers never see a partly written file, and hard links to the old
+    file keep the old content.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The file to write.
+    content : bytes
+        The content of the file.
+
+    Returns
+    -------
+    int
+        The number of bytes written.
+    """
+    with atomic_path(path) as temp_path:
+        return temp_path.write_bytes(content)
+
+
+def _get_outputs(directory: Path) -> list[Path]:
+    """
+    Return the outputs in a directory.
+
+    Hidden files, which are partly written, and excluded directories are
+    left out.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        The directory.
+
+    Returns
+    -------
+    list[pathlib.Path]
+        The outputs, relative to the directory.
+    """
+    outputs = []
+    for root, directories, filenames in os.walk(directory):
+        directories[:] = sorted(
+            name for name in directories if not name.startswith(".") and name not in EXCLUDED_DIRECTORIES
+        )
+        outputs.extend(
+            (Path(root) / name).relative_to(directory) for name in sorted(filenames) if not name.startswith(".")
+        )
+    return outputs
+
+
+def build_manifest(directory: Path, previous_manifest: dict | None = None) -> dict:
+    """
+    Build the manifest of the outputs in a directory.
+
+    Outputs with the same size and modification time as in the previous
+    manifest keep their hash, so only new outputs are read.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        The directory.
+    previous_manifest : dict, optional
+        The manifest of the previous release.
+
+    Returns
+    -------
+    dict
+        The manifest, with the outputs by their path relative to the
+        directory, and the outputs changed or removed since the previous
+        manifest.
+    """
+    directory = Path(directory)
+    previous_files = (previous_manifest or {}).get("files", {})
+    files = {}
+    for output in _get_outputs(directory):
+        name = output.as_posix()
+        stat = (directory / output).stat()
+        previous = previous_files.get(name, {})
+        if previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+            sha256 = previous["sha256"]
+        else:
+            with (directory / output).open("rb") as file:
+                sha256 = hashlib.file_digest(file, "sha256").hexdigest()
+        files[name] = {
+            "size": stat.st_size,
+            "sha256": sha256,
+            "mtime": datetime.fromtimestamp(stat.st_mtime, UTC).isoformat(),
+            "mtime_ns": stat.st_mtime_ns,
+        }
+    return {
+        "created_at": datetime.now(UTC).isoformat(),
+        "files": files,
+        "changed": [
+            name for name, file in files.items() if previous_files.get(name, {}).get("sha256") != file["sha256"]
+        ],
+        "removed": sorted(set(previous_files) - set(files)),
+    }
+
+
+def _read_manifest(path: Path) -> dict | None:
+    """
+    Read a manifest, if it exists and can be read.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The manifest.
+
+    Returns
+    -------
+    dict | None
+        The manifest.
+    """
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_releases(releases_directory: Path, keep_last: int, current: Path) -> None:
+    """
+    Delete all but the last ``keep_last`` releases, never the current one.
+
+    Parameters
+    ----------
+    releases_directory : pathlib.Path
+        The directory of the releases.
+    keep_last : int
+        Number of releases to keep.
+    current : pathlib.Path
+        The release ``latest`` points to.
+    """
+    releases = sorted(path for path in releases_directory.iterdir() if path.is_dir() and not path.name.startswith("."))
+    for release in releases[: max(len(releases) - keep_last, 0)]:
+        if release == current:
+            continue
+        shutil.rmtree(release, ignore_errors=True)
+        logger.debug(f"Deleted old release {release}")
+
+
+def publish_latest(save_directory: Path, root_save_directory: Path | None = None) -> Path:
+    """
+    Publish the outputs of a day directory as the ``latest`` release.
+
+    Parameters
+    ----------
+    save_directory : pathlib.Path
+        The day directory the job saved its outputs to.
+    root_save_directory : pathlib.Path, optional
+        The root directory ``latest`` is published in.
+        Defaults to ``Settings.save_directory``.
+
+    Returns
+    -------
+    pathlib.Path
+        The new release.
+
+    Raises
+    ------
+    FileExistsError
+        If ``latest`` exists and is not a symlink.
+    """
+    settings = Settings()
+    save_directory = Path(save_directory).expanduser().resolve()
+    root_save_directory = Path(root_save_directory or settings.save_directory).expanduser().resolve()
+    latest = root_save_directory / LATEST_DIRECTORY
+    if latest.exists() and not latest.is_symlink():
+        msg = f"{latest} exists and is not a symlink, move it away to publish"
+        raise FileExistsError(msg)
+    releases_directory = root_save_directory / RELEASES_DIRECTORY
+    release = releases_directory / datetime.now(UTC).strftime("%Y%m%dT%H%M%S%fZ")
+    staging = release.with_name(f".{release.name}.staging")
+    previous_manifest = _read_manifest(latest / MANIFEST_FILENAME)
+    manifest = build_manifest(save_directory, previous_manifest)
+    manifest["source"] = Path(os.path.relpath(save_directory, root_save_directory)).as_posix()
+    for name in manifest["files"]:
+        staged_path = staging / name
+        staged_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            staged_path.hardlink_to(save_directory / name)
+        except OSError:
+            # e.g., the file system has no hard links
+            shutil.copy2(save_directory / name, staged_path)
+    staging.mkdir(parents=True, exist_ok=True)
+    write_atomic(staging / MANIFEST_FILENAME, json.dumps(manifest, indent=1).encode())
+    staging.rename(release)
+    # Replacing a symlink is atomic, so mirrors see either the old or the new release
+    temp_latest = latest.with_name(f".{latest.name}.tmp")
+    temp_latest.unlink(missing_ok=True)
+    temp_latest.symlink_to(release.relative_to(root_save_directory), target_is_directory=True)
+    temp_latest.replace(latest)
+    logger.info(
+        f"Published {len(manifest['files'])} outputs to {latest}, {len(manifest['changed'])} changed, "
+        f"{len(manifest['removed'])} removed"
+    )
+    _prune_releases(releases_directory, settings.publish_keep_last, release)
+    return release
@@ -0,0 +1,125 @@
+"""
+Provides the active regions of an HMI magnetogram, for the cutout products.
+
+The magnetogram is reduced to blocks of ``REGION_BLOCK_SIZE`` pixels
+holding their strongest field, thresholded at
+``Settings.cutout_threshold`` and grown a little so that the polarities
+and plage of a region join, then labelled, all as whole array
+operations. Each labelled region large enough becomes a square box on
+the disk, which the calibrated AIA and HMI maps are cut to.
+"""
+
+import numpy as np
+import sunpy.map as smap
+from astropy.coordinates import SkyCoord
+from scipy import ndimage
+
+from suntoday.config import Settings
+
+__all__ = ["find_active_regions"]
+
+# Pixels of the magnetogram reduced to one, 4096 pixels become 512
+REGION_BLOCK_SIZE = 8
+# Blocks a region is grown by, so its polarities join
+REGION_DILATION = 2
+# Regions smaller than this many blocks are not active regions
+REGION_MIN_BLOCKS = 16
+
+
+def _reduce_to_blocks(data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce the field strength to blocks of ``REGION_BLOCK_SIZE`` pixels.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        The magnetogram, NaN off the disk.
+
+    Returns
+    -------
+    numpy.ndarray
+        The strongest unsigned field of each block.
+    numpy.ndarray
+        The unsigned flux of each block.
+    """
+    field = np.nan_to_num(np.abs(data), copy=False)
+    rows, columns = (size // REGION_BLOCK_SIZE * REGION_BLOCK_SIZE for size in field.shape)
+    blocks = field[:rows, :columns].reshape(
+        rows // REGION_BLOCK_SIZE, REGION_BLOCK_SIZE, columns // REGION_BLOCK_SIZE, REGION_BLOCK_SIZE
+    )
+    return blocks.max(axis=(1, 3)), blocks.sum(axis=(1, 3))
+
+
+def _get_corners(magnetogram: smap.GenericMap, box: tuple[slice, slice], min_size: float) -> tuple[SkyCoord, SkyCoord]:
+    """
+    Return the corners of a square around a box of blocks.
+
+    Parameters
+    ----------
+    magnetogram : sunpy.map.GenericMap
+        The HMI magnetogram.
+    box : tuple[slice, slice]
+        The rows and columns of blocks of the region.
+    min_size : float
+        The smallest side of the square, in blocks.
+
+    Returns
+    -------
+    astropy.coordinates.SkyCoord
+        The bottom left corner.
+    astropy.coordinates.SkyCoord
+        The top right corner.
+    """
+    rows, columns = box
+    size = max(rows.stop - rows.start, columns.stop - columns.start, min_size)
+    row_center = (rows.start + rows.stop) / 2
+    column_center = (columns.start + columns.stop) / 2
+    corners = magnetogram.wcs.pixel_to_world(
+        np.array([column_center - size / 2, column_center + size / 2]) * REGION_BLOCK_SIZE - 0.5,
+        np.array([row_center - size / 2, row_center + size / 2]) * REGION_BLOCK_SIZE - 0.5,
+    )
+    return corners[0], corners[1]
+
+
+def find_active_regions(
+    magnetogram: smap.GenericMap, threshold: float | None = None, max_regions: int | None = None
+) -> list[tuple[SkyCoord, SkyCoord]]:
+    """
+    Find the active regions of an HMI magnetogram.
+
+    Parameters
+    ----------
+    magnetogram : sunpy.map.GenericMap
+        The HMI magnetogram, NaN off the disk.
+    threshold : float, optional
+        The field strength of active regions, in Gauss.
+        Defaults to ``Settings.cutout_threshold``.
+    max_regions : int, optional
+        How many regions to return at most.
+        Defaults to ``Settings.cutout_max_regions``.
+
+    Returns
+    -------
+    list[tuple[astropy.coordinates.SkyCoord, astropy.coordinates.SkyCoord]]
+        The bottom left and top right corners of a square box around each
+        region, with the most unsigned flux first.
+    """
+    settings = Settings()
+    threshold = settings.cutout_threshold if threshold is None else threshold
+    max_regions = max_regions or settings.cutout_max_regions
+    block_field, block_flux = _reduce_to_blocks(magnetogram.data)
+    strong = ndimage.binary_dilation(block_field >= threshold, iterations=REGION_DILATION)
+    labels, count = ndimage.label(strong)
+    if count == 0:
+        return []
+    indices = np.arange(1, count + 1)
+    areas = ndimage.sum_labels(strong, labels, indices)
+    fluxes = ndimage.sum_labels(block_flux, labels, indices)
+    boxes = ndimage.find_objects(labels)
+    min_size = settings.cutout_min_size / magnetogram.scale.axis1.to_value("arcsec / pix") / REGION_BLOCK_SIZE
+    regions = [
+        _get_corners(magnetogram, boxes[index], min_size)
+        for index in np.argsort(fluxes)[::-1]
+        if areas[index] >= REGION_MIN_BLOCKS
+    ]
+    return regions[:max_regions]
@@ -0,0 +1,233 @@
+"""
+Provides the schedulers that decide when the main job runs.
+"""
+
+import datetime
+import threading
+from collections.abc import Callable
+
+import schedule
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.downloaders.goes import fetch_goes_timeseries, get_latest_goes_flux, goes_class_to_flux
+from suntoday.downloaders.jsoc import get_latest_aia_time
+
+__all__ = ["FlareMonitor", "JSOCTrigger", "schedule_flare_cadence", "schedule_jsoc_trigger"]
+
+
+class JSOCTrigger:
+    """
+    Runs a job as soon as the JSOC has a newer complete set of AIA data.
+
+    Only one run is ever active. Triggers that arrive during a run are
+    coalesced into a single follow up run for the newest time.
+
+    Parameters
+    ----------
+    job : Callable[[datetime.datetime], object]
+        The job to run, it is passed the time of the new data.
+    """
+
+    def __init__(self, job: Callable[[datetime.datetime], object]) -> None:
+        self.job = job
+        self.last_time = None
+        self._pending_time = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def poll(self) -> None:
+        """
+        Check the JSOC for newer data and trigger a run if there is any.
+        """
+        try:
+            latest_time = get_latest_aia_time()
+        except Exception as e:  # NOQA : BLE001
+            logger.warning(f"Polling the JSOC failed: {e}")
+            return
+        if latest_time is None:
+            logger.debug("No complete set of AIA data found on the JSOC.")
+            return
+        if self.last_time is not None and latest_time <= self.last_time:
+            logger.debug(f"No new AIA data since {self.last_time}")
+            return
+        logger.info(f"New AIA data found for {latest_time}")
+        self.last_time = latest_time
+        self.trigger(latest_time)
+
+    def trigger(self, requested_time: datetime.datetime) -> None:
+        """
+        Run the job for the given time, or queue it if a run is active.
+
+        Parameters
+        ----------
+        requested_time : datetime.datetime
+            The time to run the job for.
+        """
+        with self._lock:
+            if self._pending_time is None or requested_time > self._pending_time:
+                self._pending_time = requested_time
+            if self._running:
+                logger.info(f"Run already active, queued {self._pending_time}")
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="suntoday-jsoc-trigger", daemon=True)
+            self._thread.start()
+
+    def join(self, timeout: float | None = None) -> None:
+        """
+        Wait for the active run, and any queued run, to finish.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                requested_time = self._pending_time
+                self._pending_time = None
+                if requested_time is None:
+                    self._running = False
+                    return
+            try:
+                self.job(requested_time)
+            except Exception as e:  # NOQA : BLE001
+                logger.exception(f"Error occurred in triggered job for {requested_time}: {e}")
+
+
+def schedule_jsoc_trigger(job: Callable[[datetime.datetime], object]) -> JSOCTrigger:
+    """
+    Schedule polling of the JSOC for new data.
+
+    The polling frequency is ``Settings.jsoc_poll_frequency``.
+
+    Parameters
+    ----------
+    job : Callable[[datetime.datetime], object]
+        The job to run, it is passed the time of the new data.
+
+    Returns
+    -------
+    JSOCTrigger
+        The trigger that was scheduled.
+    """
+    settings = Settings()
+    trigger = JSOCTrigger(job)
+    schedule.every(settings.jsoc_poll_frequency).seconds.do(trigger.poll)
+    return trigger
+
+
+class FlareMonitor:
+    """
+    Watches the GOES primary XRS flux and runs a job at a high cadence during
+    flares.
+
+    Parameters
+    ----------
+    job : Callable[..., object]
+        The job to run, it is passed the time of the newest complete set of
+        AIA data and ``products`` as a keyword argument.
+    threshold : str
+        The GOES class at or above which the high cadence is used, e.g., "M1".
+    products : list[str]
+        The products to create at the high cadence.
+    """
+
+    def __init__(self, job: Callable[..., object], threshold: str, products: list[str]) -> None:
+        self.job = job
+        self.threshold = goes_class_to_flux(threshold)
+        self.products = products
+        self.flaring = False
+        self.last_time = None
+
+    def update(self) -> bool:
+        """
+        Fetch the latest GOES flux and update whether there is a flare.
+
+        If the fetch fails, the previous state is kept.
+
+        Returns
+        -------
+        bool
+            True if the flux is at or above the threshold.
+        """
+        try:
+            goes_primary_timeseries, _goes_secondary_timeseries = fetch_goes_timeseries()
+        except Exception as e:  # NOQA : BLE001
+            logger.warning(f"Fetching the GOES flux failed: {e}")
+            return self.flaring
+        flux = get_latest_goes_flux(goes_primary_timeseries)
+        flaring = flux >= self.threshold
+        if flaring and not self.flaring:
+            logger.info(f"GOES flux {flux:.2e} is above {self.threshold:.2e}, switching to high cadence")
+        if not flaring and self.flaring:
+            logger.info(f"GOES flux {flux:.2e} is below {self.threshold:.2e}, switching back to normal cadence")
+        self.flaring = flaring
+        return self.flaring
+
+    def run(self) -> None:
+        """
+        Run the job for the high cadence products if there is a flare.
+
+        The job is run for the newest complete set of AIA data, as in
+        `JSOCTrigger`, rather than ``Settings.jsoc_delay`` before now, and
+        only if there is a set newer than the last run.
+        """
+        if not self.update():
+            return
+        try:
+            latest_time = get_latest_aia_time()
+        except Exception as e:  # NOQA : BLE001
+            logger.warning(f"Polling the JSOC failed: {e}")
+            return
+        if latest_time is None:
+            logger.debug("No complete set of AIA data found on the JSOC.")
+            return
+        if self.last_time is not None and latest_time <= self.last_time:
+            logger.debug(f"No new AIA data since {self.last_time}")
+            return
+        self.last_time = latest_time
+        self.job(latest_time, products=self.products)
+
+    def run_full(self) -> None:
+        """
+        Run the job for every product, unless there is a flare.
+
+        Scheduled jobs run one at a time, so during a flare the full job is
+        skipped, rather than delaying the high cadence runs behind it.
+        """
+        if self.update():
+            logger.info("Skipping the full job during the flare")
+            return
+        self.job()
+
+
+def schedule_flare_cadence(job: Callable[..., object]) -> FlareMonitor:
+    """
+    Schedule the job at ``Settings.cron_frequency`` and at
+    ``Settings.flare_cron_frequency`` during flares.
+
+    During flares only ``Settings.flare_products`` are created, so that each
+    run fits inside the shorter interval, and the full job is skipped.
+
+    Parameters
+    ----------
+    job : Callable[..., object]
+        The job to run.
+
+    Returns
+    -------
+    FlareMonitor
+        The monitor that was scheduled.
+    """
+    settings = Settings()
+    monitor = FlareMonitor(job, settings.flare_threshold, settings.flare_products)
+    schedule.every(settings.cron_frequency).minutes.do(monitor.run_full)
+    schedule.every(settings.flare_cron_frequency).minutes.do(monitor.run)
+    return monitor
@@ -0,0 +1,385 @@
+"""
+Provides the sources the pipeline gets its FITS files and timeseries from.
+
+The default source is the JSOC and SWPC, the replay source instead reads
+a local directory laid out like ``suntoday/data/test``, i.e., FITS files
+named ``YYYYMMDD_HHMMSS_<wavelength or measurement>.fits`` as written by
+the JSOC downloader, next to ``aia_timeseries.csv``,
+``goes_primary_timeseries.csv`` and ``goes_secondary_timeseries.csv``.
+Replaying needs no network, so archives can be reprocessed, and jobs
+profiled and load tested, at disk speed.
+
+Replay a time range with::
+
+    python -m suntoday.sources 2025-08-04T00:00 --directory /archive
+"""
+
+import abc
+import argparse
+import datetime
+import functools
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from suntoday import init_sentry, logger
+from suntoday.config import Settings
+from suntoday.constants import AIA_WAVELENGTHS
+from suntoday.data.test import TEST_DATA_ROOTDIR
+from suntoday.downloaders.goes import fetch_goes_timeseries
+from suntoday.downloaders.jsoc import fetch_aia_fits, fetch_aia_timeseries, fetch_hmi_fits
+
+__all__ = ["JSOCSource", "ReplaySource", "Source", "get_source"]
+
+FITS_FILENAME = re.compile(r"^(?P<time>\d{8}_\d{6})_(?P<channel>\w+)\.fits$")
+FITS_TIME_FORMAT = "%Y%m%d_%H%M%S"
+HMI_MEASUREMENTS = ["magnetogram", "continuum"]
+AIA_TIMESERIES_FILENAME = "aia_timeseries.csv"
+GOES_TIMESERIES_FILENAMES = ["goes_primary_timeseries.csv", "goes_secondary_timeseries.csv"]
+
+
+class Source(abc.ABC):
+    """
+    Where the pipeline gets its FITS files and timeseries from.
+    """
+
+    @abc.abstractmethod
+    def fetch_aia_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:
+        """
+        Return an AIA FITS file for each wavelength near the given time.
+
+        Parameters
+        ----------
+        requested_time : datetime.datetime
+            The time the files are for.
+        save_directory : pathlib.Path
+            Directory any downloaded files are saved to.
+
+        Returns
+        -------
+        list[str]
+            The AIA files, in any order.
+        """
+
+    @abc.abstractmethod
+    def fetch_hmi_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:
+        """
+        Return the HMI magnetogram and continuum FITS files near the given time.
+
+        Parameters
+        ----------
+        requested_time : datetime.datetime
+            The time the files are for.
+        save_directory : pathlib.Path
+            Directory any downloaded files are saved to.
+
+        Returns
+        -------
+        list[str]
+            The HMI files, magnetogram first.
+        """
+
+    @abc.abstractmethod
+    def fetch_aia_timeseries(
+        self, end_time: datetime.datetime, duration: datetime.timedelta = datetime.timedelta(days=1)
+    ) -> pd.DataFrame:
+        """
+        Return the AIA timeseries for the given duration before the given time.
+
+        Parameters
+        ----------
+        end_time : datetime.datetime
+            The end of the timeseries.
+        duration : datetime.timedelta, optional
+            The length of the timeseries, defaults to a day.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The AIA timeseries.
+        """
+
+    @abc.abstractmethod
+    def fetch_goes_timeseries(
+        self, end_time: datetime.datetime, duration: datetime.timedelta = datetime.timedelta(days=1)
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Return the GOES XRS timeseries for the given duration before the given time.
+
+        Parameters
+        ----------
+        end_time : datetime.datetime
+            The end of the timeseries.
+        duration : datetime.timedelta, optional
+            The length of the timeseries, defaults to a day.
+
+        Returns
+        -------
+        pandas.DataFrame, pandas.DataFrame
+            The timeseries of the primary and secondary satellites.
+        """
+
+
+class JSOCSource(Source):
+    """
+    Downloads the FITS files from the JSOC and the timeseries from the
+    JSOC and SWPC.
+    """
+
+    def fetch_aia_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:  # NOQA: D102, PLR6301
+        return fetch_aia_fits(requested_time, save_directory=save_directory)
+
+    def fetch_hmi_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:  # NOQA: D102, PLR6301
+        # HMI files are not always available at the same time as AIA files
+        return fetch_hmi_fits(requested_time - datetime.timedelta(hours=2), save_directory=save_directory)
+
+    def fetch_aia_timeseries(  # NOQA: D102, PLR6301
+        self, end_time: datetime.datetime, duration: datetime.timedelta = datetime.timedelta(days=1)
+    ) -> pd.DataFrame:
+        return fetch_aia_timeseries(end_time, duration)
+
+    def fetch_goes_timeseries(  # NOQA: D102, PLR6301
+        self,
+        end_time: datetime.datetime,  # NOQA: ARG002
+        duration: datetime.timedelta = datetime.timedelta(days=1),
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # SWPC only serves the latest data
+        return fetch_goes_timeseries(duration)
+
+
+class ReplaySource(Source):
+    """
+    Reads the FITS files and timeseries from a local directory.
+
+    The files are used in place, nothing is copied.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        The directory to replay.
+    tolerance : datetime.timedelta
+        How far from the requested time a FITS file can be.
+    """
+
+    def __init__(self, directory: Path, tolerance: datetime.timedelta) -> None:
+        self.directory = Path(directory).expanduser().resolve()
+        self.tolerance = tolerance
+        self._files = None
+
+    @property
+    def files(self) -> dict[str, list[tuple[datetime.datetime, Path]]]:
+        """
+        The FITS files in the directory by wavelength or measurement.
+
+        The directory is only scanned the first time this is used, and
+        again by `_get_nearest` when a file is missing, so files added to
+        or removed from the directory later are seen.
+
+        Returns
+        -------
+        dict[str, list[tuple[datetime.datetime, pathlib.Path]]]
+            The time and path of each file.
+        """
+        if self._files is None:
+            self._files = {}
+            for path in sorted(self.directory.rglob("*.fits")):
+                match = FITS_FILENAME.match(path.name)
+                if match is None:
+                    continue
+                time = datetime.datetime.strptime(match["time"], FITS_TIME_FORMAT).replace(tzinfo=datetime.UTC)
+                self._files.setdefault(match["channel"], []).append((time, path))
+            logger.debug(f"Found {sum(len(files) for files in self._files.values())} FITS files in {self.directory}")
+        return self._files
+
+    def _get_nearest(self, channels: list[str], requested_time: datetime.datetime) -> list[str]:
+        """
+        Return the file nearest the requested time of each channel.
+
+        Channels with no file within the tolerance are left out.
+
+        Parameters
+        ----------
+        channels : list[str]
+            The wavelengths or measurements.
+        requested_time : datetime.datetime
+            The time the files are for.
+
+        Returns
+        -------
+        list[str]
+            The files, in the order of ``channels``.
+        """
+        requested_time = requested_time.astimezone(datetime.UTC)
+        nearest_files = self._find_nearest(channels, requested_time)
+        if None in nearest_files:
+            # The files may have been added since the directory was scanned
+            self._files = None
+            nearest_files = self._find_nearest(channels, requested_time)
+        for channel, path in zip(channels, nearest_files, strict=True):
+            if path is None:
+                logger.warning(f"No {channel} file within {self.tolerance} of {requested_time} in {self.directory}")
+        return [path for path in nearest_files if path is not None]
+
+    def _find_nearest(self, channels: list[str], requested_time: datetime.datetime) -> list[str | None]:
+        """
+        Return the file nearest the requested time of each channel in the scanned files.
+
+        Parameters
+        ----------
+        channels : list[str]
+            The wavelengths or measurements.
+        requested_time : datetime.datetime
+            The time the files are for, in UTC.
+
+        Returns
+        -------
+        list[str | None]
+            The file of each channel, or None if it has none within the
+            tolerance, or it no longer exists.
+        """
+        nearest_files = []
+        for channel in channels:
+            candidates = [
+                (abs(time - requested_time), path)
+                for time, path in self.files.get(channel, [])
+                if abs(time - requested_time) <= self.tolerance
+            ]
+            nearest = min(candidates)[1] if candidates else None
+            # A file removed since the scan is missing too
+            nearest_files.append(str(nearest) if nearest is not None and nearest.exists() else None)
+        return nearest_files
+
+    def fetch_aia_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:  # NOQA: D102, ARG002
+        return self._get_nearest(AIA_WAVELENGTHS, requested_time)
+
+    def fetch_hmi_fits(self, requested_time: datetime.datetime, save_directory: Path) -> list[str]:  # NOQA: D102, ARG002
+        return self._get_nearest(HMI_MEASUREMENTS, requested_time)
+
+    def _read_timeseries(
+        self, filename: str, end_time: datetime.datetime, duration: datetime.timedelta
+    ) -> pd.DataFrame:
+        """
+        Read a timeseries and keep the given duration before the given time.
+
+        Parameters
+        ----------
+        filename : str
+            The name of the CSV file in the directory.
+        end_time : datetime.datetime
+            The end of the timeseries.
+        duration : datetime.timedelta
+            The length of the timeseries.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The timeseries.
+        """
+        timeseries = pd.read_csv(self.directory / filename, index_col=0)
+        timeseries.index = pd.to_datetime(timeseries.index, format="mixed", utc=True)
+        end_time = pd.Timestamp(end_time.astimezone(datetime.UTC))
+        timeseries = timeseries[(timeseries.index > end_time - duration) & (timeseries.index <= end_time)]
+        if timeseries.empty:
+            logger.warning(f"No data in {filename} for the {duration} before {end_time}")
+        return timeseries
+
+    def fetch_aia_timeseries(  # NOQA: D102
+        self, end_time: datetime.datetime, duration: datetime.timedelta = datetime.timedelta(days=1)
+    ) -> pd.DataFrame:
+        return self._read_timeseries(AIA_TIMESERIES_FILENAME, end_time, duration).astype({
+            "WAVELNTH": str,
+            "DATAMEAN": float,
+            "EXPTIME": float,
+        })
+
+    def fetch_goes_timeseries(  # NOQA: D102
+        self, end_time: datetime.datetime, duration: datetime.timedelta = datetime.timedelta(days=1)
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        goes_primary, goes_secondary = (
+            self._read_timeseries(filename, end_time, duration) for filename in GOES_TIMESERIES_FILENAMES
+        )
+        return goes_primary, goes_secondary
+
+
+@functools.cache
+def _get_replay_source(directory: Path, tolerance: datetime.timedelta) -> ReplaySource:
+    """
+    Return the replay source of a directory, shared by every job of the process.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        The resolved directory to replay.
+    tolerance : datetime.timedelta
+        How far from the requested time a FITS file can be.
+
+    Returns
+    -------
+    ReplaySource
+        The source, which keeps the files it found in the directory.
+    """
+    return ReplaySource(directory, tolerance)
+
+
+def get_source() -> Source:
+    """
+    Return the source selected by ``Settings.source``.
+
+    Returns
+    -------
+    Source
+        The source.
+
+    Raises
+    ------
+    ValueError
+        If the source is not "jsoc" or "replay".
+    """
+    settings = Settings()
+    if settings.source == "jsoc":
+        return JSOCSource()
+    if settings.source == "replay":
+        return _get_replay_source(
+            Path(settings.replay_directory or TEST_DATA_ROOTDIR).expanduser().resolve(),
+            datetime.timedelta(minutes=settings.replay_tolerance),
+        )
+    msg = f"Invalid source: {settings.source}. Must be 'jsoc' or 'replay'."
+    raise ValueError(msg)
+
+
+def main(args: list[str] | None = None) -> None:
+    """
+    Replay the full pipeline for one or more times from the command line.
+
+    Parameters
+    ----------
+    args : list[str], optional
+        The command line arguments, defaults to ``sys.argv``.
+    """
+    from suntoday.backfill import get_backfill_times
+    from suntoday.main import main_job
+
+    parser = argparse.ArgumentParser(description="Replay the pipeline from a local archive.")
+    parser.add_argument("start", type=datetime.datetime.fromisoformat, help="First time, ISO format, UTC if naive")
+    parser.add_argument("end", type=datetime.datetime.fromisoformat, nargs="?", help="Last time, defaults to start")
+    parser.add_argument("--cadence", type=int, default=60, help="Minutes between each time, default 60")
+    parser.add_argument("--directory", type=Path, default=None, help="Defaults to SUNTODAY_REPLAY_DIRECTORY")
+    parser.add_argument("--save-directory", type=Path, default=None, help="Defaults to SUNTODAY_SAVE_DIRECTORY")
+    parsed = parser.parse_args(args)
+    start, end = (
+        time.replace(tzinfo=datetime.UTC) if time.tzinfo is None else time
+        for time in (parsed.start, parsed.end or parsed.start)
+    )
+    # The pipelines read the settings from the environment in their own threads
+    os.environ["SUNTODAY_SOURCE"] = "replay"
+    if parsed.directory is not None:
+        os.environ["SUNTODAY_REPLAY_DIRECTORY"] = str(parsed.directory)
+    for requested_time in get_backfill_times(start, end, datetime.timedelta(minutes=parsed.cadence)):
+        main_job(requested_time, parsed.save_directory)
+
+
+if __name__ == "__main__":
+    init_sentry()
+    main()
@@ -0,0 +1,82 @@
+import socket
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+from suntoday.backfill import Backfill, get_backfill_times
+from suntoday.db import Job
+from suntoday.jobqueue import BACKFILL_TASK, JOB_DONE, JOB_FAILED, JOB_RUNNING, enqueue_jobs
+
+START = datetime(2025, 8, 4, tzinfo=UTC)
+
+
+def test_get_backfill_times() -> None:
+    times = get_backfill_times(START, START + timedelta(hours=2), timedelta(hours=1))
+    assert times == [START, START + timedelta(hours=1), START + timedelta(hours=2)]
+    assert get_backfill_times(START, START + timedelta(minutes=59), timedelta(hours=1)) == [START]
+    with pytest.raises(ValueError, match="Cadence must be positive"):
+        get_backfill_times(START, START, timedelta(0))
+    with pytest.raises(ValueError, match="is before start"):
+        get_backfill_times(START, START - timedelta(hours=1), timedelta(hours=1))
+
+
+def test_backfill(db_session, mocker, tmp_path) -> None:
+    mocker.patch("suntoday.backfill.init_db")
+    mocker.patch("suntoday.backfill.get_session", side_effect=db_session)
+    mocker.patch("suntoday.jobqueue.get_session", side_effect=db_session)
+    lock = threading.Lock()
+    rendering = []
+    most_rendering = []
+
+    def render(aia_files, hmi_files, save_directory) -> None:  # NOQA: ARG001
+        with lock:
+            rendering.append(save_directory)
+            most_rendering.append(len(rendering))
+        time.sleep(0.01)
+        with lock:
+            rendering.pop()
+
+    mocker.patch("suntoday.jpegs.download_sdo_files", return_value=([], []))
+    render_sdo_images = mocker.patch("suntoday.jpegs.render_sdo_images", side_effect=render)
+    backfill = Backfill(START, START + timedelta(hours=5), timedelta(hours=1), tmp_path, max_downloads=2, max_renders=1)
+    assert backfill.run() == 6
+    assert render_sdo_images.call_count == 6
+    assert max(most_rendering) == 1
+    assert (tmp_path / "2025" / "08" / "04").is_dir()
+    # Times that are done are skipped when the backfill is run again
+    assert backfill.run() == 0
+    session = db_session()
+    assert {job.status for job in session.query(Job)} == {JOB_DONE}
+    session.execute(delete(Job))
+    session.commit()
+    session.close()
+
+
+def test_backfill_requeues_failed_and_stopped_jobs(db_session, mocker, tmp_path) -> None:
+    mocker.patch("suntoday.backfill.init_db")
+    mocker.patch("suntoday.backfill.get_session", side_effect=db_session)
+    mocker.patch("suntoday.jobqueue.get_session", side_effect=db_session)
+    mocker.patch("suntoday.jpegs.download_sdo_files", return_value=([], []))
+    render_sdo_images = mocker.patch("suntoday.jpegs.render_sdo_images")
+    backfill = Backfill(START, START + timedelta(hours=2), timedelta(hours=1), tmp_path)
+    session = db_session()
+    enqueue_jobs(session, BACKFILL_TASK, backfill.times)
+    # A failed job, one left running by a stopped worker on this machine and one running elsewhere
+    hidden = datetime.now(UTC) + timedelta(hours=1)
+    statuses = [
+        {"status": JOB_FAILED, "attempts": 3},
+        {"status": JOB_RUNNING, "attempts": 3, "visible_at": hidden, "claimed_by": f"{socket.gethostname()}:{2**30}"},
+        {"status": JOB_RUNNING, "attempts": 1, "visible_at": hidden, "claimed_by": "elsewhere:1"},
+    ]
+    for requested_time, values in zip(backfill.times, statuses, strict=True):
+        session.execute(update(Job).where(Job.requested_time == requested_time).values(**values))
+    session.commit()
+    assert backfill.run() == 2
+    assert render_sdo_images.call_count == 2
+    assert backfill.count_jobs() == {JOB_DONE: 2, JOB_RUNNING: 1}
+    session.execute(delete(Job))
+    session.commit()
+    session.close()
@@ -1,15 +1,29 @@
-from datetime import UTC, date, datetime
+from datetime import UTC, date, datetime, timedelta, timezone
 
 import pytest
 from sqlalchemy import inspect
 
-from suntoday.db import SDOImages, TimeSeriesImages, get_latest_record, get_record, write_or_update_record
+from suntoday.config import Settings
+from suntoday.db import (
+    SDOImages,
+    TimeSeriesImages,
+    create_db,
+    dispose_engines,
+    get_async_engine,
+    get_engine,
+    get_latest_record,
+    get_record,
+    get_session,
+    init_db,
+    write_or_update_record,
+    write_or_update_records,
+)
 
 
 def test_db_creation(db_session) -> None:
     session = db_session()
     inspector = inspect(session.bind)
-    assert inspector.get_table_names() == ["SDOImages", "TimeSeriesImages"]
+    assert inspector.get_table_names() == ["Jobs", "SDOImages", "TimeSeriesImages"]
 
     session.close()
 
@@ -73,9 +87,7 @@ def test_update_record(db_session) -> None:
     )
     sdo_image_db = get_record(session, "images", "2021-01-01+00:00")
     assert sdo_image_db.obs_date == date(2021, 1, 1)
-    # This is a string as the test is not using a real database, so the type is not converted
-    # to datetime automatically. I hope
-    assert sdo_image_db.updated_at == "2024-06-01+00:00"
+    assert sdo_image_db.updated_at == datetime(2024, 6, 1, 0, 0, tzinfo=UTC)
 
     session.close()
 
@@ -86,3 +98,71 @@ def test_write_or_update_record_invalid_model(db_session) -> None:
         write_or_update_record(session, "invalid_model", "2021-01-01", updated_at="2024-01-01+00:00")
 
     session.close()
+
+
+def test_write_or_update_records(db_session) -> None:
+    session = db_session()
+    start = date(1990, 1, 1)
+    updated_at = datetime(1995, 1, 1, tzinfo=UTC)
+    records = {start + timedelta(days=day): updated_at for day in range(365 * 3)}
+    assert write_or_update_records(session, "images", records) == len(records)
+    assert session.query(SDOImages).filter(SDOImages.obs_date < date(1995, 1, 1)).count() == len(records)
+
+    # Overlapping records are updated in place
+    newer = datetime(1996, 1, 1, tzinfo=UTC)
+    assert write_or_update_records(session, "images", dict.fromkeys(list(records)[:10], newer)) == 10
+    assert session.query(SDOImages).filter(SDOImages.obs_date < date(1995, 1, 1)).count() == len(records)
+    assert get_record(session, "images", start).updated_at == newer
+    assert write_or_update_records(session, "images", {}) == 0
+
+    session.query(SDOImages).filter(SDOImages.obs_date < date(1995, 1, 1)).delete()
+    session.commit()
+    session.close()
+
+
+def test_get_engine_is_shared() -> None:
+    uri = "postgresql+psycopg2://suntoday_user@localhost:5432/suntoday_engine_test"
+    engine = get_engine(uri)
+    assert get_engine(uri) is engine
+    assert get_session(uri).bind is engine
+    settings = Settings()
+    assert engine.pool.size() == settings.db_pool_size
+    assert engine.pool._pre_ping  # NOQA: SLF001
+    dispose_engines()
+    assert get_engine(uri) is not engine
+    dispose_engines()
+
+
+def test_init_db_bootstraps_once(mocker) -> None:
+    uri = "postgresql+psycopg2://suntoday_user@localhost:5432/suntoday_init_test"
+    create_db = mocker.patch("suntoday.db.create_db")
+    engine = init_db(uri)
+    assert init_db(uri) is engine
+    create_db.assert_called_once_with(uri, echo=False)
+    dispose_engines()
+
+
+def test_get_async_engine() -> None:
+    uri = "postgresql+psycopg2://suntoday_user@localhost:5432/suntoday_async_test"
+    engine = get_async_engine(uri)
+    assert get_async_engine(uri) is engine
+    assert engine.url.drivername == Settings().db_async_driver
+    dispose_engines()
+
+
+def test_sqlite_backend(tmp_path) -> None:
+    uri = f"sqlite:///{tmp_path / 'suntoday.sqlite'}"
+    engine = create_db(uri)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    session = get_session(uri)
+    # Stored in UTC even though SQLite has no timezone support
+    write_or_update_record(
+        session, "images", date(2021, 1, 1), updated_at=datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))
+    )
+    session.expunge_all()
+    record = get_record(session, "images", date(2021, 1, 1))
+    assert record.updated_at == datetime(2024, 1, 1, 0, tzinfo=UTC)
+    assert record.updated_at.tzinfo == UTC
+    session.close()
+    dispose_engines()
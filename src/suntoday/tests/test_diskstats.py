@@ -0,0 +1,89 @@
+from datetime import UTC, datetime, timedelta
+
+import astropy.units as u
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+import sunpy.map as smap
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import frames, get_earth
+
+from suntoday.diskstats import append_disk_statistics, compute_disk_statistics, read_disk_statistics
+from suntoday.lightcurve import plot_lightcurve_from_timeseries
+
+
+def _aia_map(date: str, wavelength: int, disk_value: float):
+    data = np.full((400, 400), 5.0)
+    reference_coordinate = SkyCoord(
+        0 * u.arcsec, 0 * u.arcsec, obstime=date, observer=get_earth(date), frame=frames.Helioprojective
+    )
+    header = smap.make_fitswcs_header(
+        data,
+        reference_coordinate,
+        scale=[6, 6] * u.arcsec / u.pixel,
+        instrument="AIA_3",
+        detector="AIA",
+        telescope="SDO/AIA",
+        wavelength=wavelength * u.angstrom,
+        exposure=1 * u.s,
+    )
+    amap = smap.Map(data, header)
+    radius = (amap.rsun_obs / amap.scale.axis1).to_value("pix")
+    rows, columns = np.ogrid[:400, :400]
+    amap.data[(columns - 199.5) ** 2 + (rows - 199.5) ** 2 <= radius**2] = disk_value
+    amap.data[0, 0] = np.nan
+    return amap
+
+
+def test_compute_disk_statistics() -> None:
+    statistics = compute_disk_statistics([
+        _aia_map("2025-08-04T00:00:00", 171, 100),
+        _aia_map("2025-08-04T00:00:00", 193, 50),
+    ])
+    assert list(statistics["WAVELNTH"]) == ["171", "193"]
+    assert list(statistics["DISKMEAN"]) == [100, 50]
+    assert list(statistics["DISKP50"]) == [100, 50]
+    assert list(statistics["EXPTIME"]) == [1, 1]
+    # About pi r^2 pixels on the disk, r being 158 pixels
+    disk_pixels = statistics["DISKSUM"].iloc[0] / 100
+    assert disk_pixels == pytest.approx(np.pi * 158**2, rel=0.01)
+    # The image mean counts the pixels off the disk too
+    assert 5 < statistics["DATAMEAN"].iloc[0] < 100
+
+
+def test_append_and_read_disk_statistics(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("SUNTODAY_DISK_STATISTICS_DIRECTORY", str(tmp_path))
+    for date, value in [("2025-08-03T23:00:00", 10), ("2025-08-04T00:00:00", 20), ("2025-08-04T01:00:00", 30)]:
+        append_disk_statistics(compute_disk_statistics([_aia_map(date, 171, value)]))
+    # Rendered again, the latest statistics are kept
+    append_disk_statistics(compute_disk_statistics([_aia_map("2025-08-04T00:00:00", 171, 25)]))
+    # Kept in the timeseries archive
+    assert sorted(path.name for path in (tmp_path / "aia_disk").glob("*.parquet")) == [
+        "aia_disk_20250803.parquet",
+        "aia_disk_20250804.parquet",
+    ]
+    statistics = read_disk_statistics(datetime(2025, 8, 4, 0, 30, tzinfo=UTC))
+    assert list(statistics["DISKMEAN"]) == [10, 25]
+    assert str(statistics.index.tz) == "UTC"
+    assert statistics["WAVELNTH"].dtype == object
+    statistics = read_disk_statistics(datetime(2025, 8, 4, 1, tzinfo=UTC), timedelta(hours=1))
+    assert list(statistics["DISKMEAN"]) == [30]
+    assert read_disk_statistics(datetime(2025, 9, 1, tzinfo=UTC)).empty
+
+
+def test_plot_lightcurve_from_disk_statistics(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("SUNTODAY_DISK_STATISTICS_DIRECTORY", str(tmp_path))
+    for minutes in range(0, 120, 12):
+        date = f"2025-08-04T{minutes // 60:02d}:{minutes % 60:02d}:00"
+        append_disk_statistics(compute_disk_statistics([_aia_map(date, 171, minutes)]))
+    statistics = read_disk_statistics(datetime(2025, 8, 4, 2, tzinfo=UTC))
+    goes = pd.DataFrame(
+        {"satellite": 16, "flux": 1e-6, "energy": ["0.1-0.8nm", "0.05-0.4nm"] * 5},
+        index=pd.date_range("2025-08-04", periods=10, freq="12min", tz="UTC"),
+    )
+    fig = plot_lightcurve_from_timeseries(goes, statistics)
+    assert [line.get_label() for ax in fig.axes for line in ax.get_lines() if "AIA" in line.get_label()] == [
+        "AIA-171" + r"$\AA$"
+    ]
+    plt.close(fig)
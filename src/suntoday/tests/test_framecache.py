@@ -0,0 +1,70 @@
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from suntoday.framecache import FrameCache, base_ratio, get_frame_cache, running_difference
+
+START_TIME = datetime(2025, 8, 4, tzinfo=UTC)
+
+
+def _frame(value: float) -> np.ndarray:
+    return np.full((4, 6), value, dtype=np.float32)
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_frame_cache_ring_buffer(tmp_path, in_memory) -> None:
+    frame_cache = FrameCache(3, None if in_memory else tmp_path)
+    assert frame_cache.get_frames("0171", (4, 6), START_TIME) == []
+    for minutes in range(5):
+        frame_cache.add("0171", START_TIME + timedelta(minutes=minutes), _frame(minutes))
+    frames = frame_cache.get_frames("0171", (4, 6), START_TIME + timedelta(minutes=10))
+    # Only the last 3 are kept, oldest first
+    assert [time.minute for time, _ in frames] == [2, 3, 4]
+    assert [frame[0, 0] for _, frame in frames] == [2, 3, 4]
+    # Copies, which frames added later do not change
+    frame_cache.add("0171", START_TIME + timedelta(minutes=5), _frame(5))
+    assert frames[0][1][0, 0] == 2
+    # Only frames before the time and in the maximum age
+    frames = frame_cache.get_frames("0171", (4, 6), START_TIME + timedelta(minutes=4), timedelta(minutes=1))
+    assert [time.minute for time, _ in frames] == [3]
+    # The same time replaces its frame
+    frame_cache.add("0171", START_TIME + timedelta(minutes=3), _frame(30))
+    frames = frame_cache.get_frames("0171", (4, 6), START_TIME + timedelta(minutes=10))
+    assert [frame[0, 0] for _, frame in frames] == [30, 4, 5]
+    # Wavelengths are separate
+    assert frame_cache.get_frames("0193", (4, 6), START_TIME + timedelta(minutes=10)) == []
+
+
+def test_frame_cache_on_disk(tmp_path) -> None:
+    FrameCache(2, tmp_path).add("0171", START_TIME, _frame(1))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["0171.json", "0171.npy"]
+    # Another process sees the frames
+    frames = FrameCache(2, tmp_path).get_frames("0171", (4, 6), START_TIME + timedelta(minutes=1))
+    assert [(time, frame[0, 0]) for time, frame in frames] == [(START_TIME, 1)]
+    # Frames of another size, or a buffer of another size, start again
+    assert FrameCache(2, tmp_path).get_frames("0171", (8, 6), START_TIME + timedelta(minutes=1)) == []
+    assert FrameCache(3, tmp_path).get_frames("0171", (8, 6), START_TIME + timedelta(minutes=1)) == []
+
+
+def test_get_frame_cache(monkeypatch, tmp_path) -> None:
+    assert get_frame_cache() is None
+    monkeypatch.setenv("SUNTODAY_FRAME_CACHE_SIZE", "2")
+    monkeypatch.setenv("SUNTODAY_FRAME_CACHE_DIRECTORY", str(tmp_path))
+    frame_cache = get_frame_cache()
+    assert frame_cache.size == 2
+    assert frame_cache.directory == tmp_path
+    assert get_frame_cache() is frame_cache
+
+
+def test_running_difference_and_base_ratio() -> None:
+    frames = [(START_TIME, _frame(2)), (START_TIME + timedelta(minutes=1), _frame(4))]
+    frames[0][1][0, 0] = 0
+    data = _frame(8).astype(np.float64)
+    difference = running_difference(data, frames)
+    assert difference.dtype == np.float32
+    np.testing.assert_array_equal(difference, _frame(4))
+    ratio = base_ratio(data, frames)
+    assert ratio.dtype == np.float32
+    assert np.isnan(ratio[0, 0])
+    np.testing.assert_array_equal(ratio.ravel()[1:], 4)
@@ -0,0 +1,132 @@
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql
+
+from suntoday.db import Job
+from suntoday.jobqueue import (
+    BACKFILL_TASK,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_QUEUED,
+    _get_claim_statement,
+    claim_job,
+    complete_job,
+    enqueue_jobs,
+    fail_job,
+    reap_jobs,
+    run_job,
+    run_worker,
+)
+
+REQUESTED_TIME = datetime(2025, 8, 4, tzinfo=UTC)
+
+
+@pytest.fixture
+def queue_session(db_session):
+    session = db_session()
+    yield session
+    session.execute(delete(Job))
+    session.commit()
+    session.close()
+
+
+def test_enqueue_jobs(queue_session) -> None:
+    assert enqueue_jobs(queue_session, "images", [REQUESTED_TIME]) == 1
+    # The same job is only queued once
+    assert enqueue_jobs(queue_session, "images", [REQUESTED_TIME]) == 0
+    assert enqueue_jobs(queue_session, "images", [REQUESTED_TIME], product="0171") == 1
+    assert enqueue_jobs(queue_session, "timeseries", [REQUESTED_TIME]) == 1
+    with pytest.raises(ValueError, match="Given task: invalid not allowed"):
+        enqueue_jobs(queue_session, "invalid", [REQUESTED_TIME])
+
+
+def test_claim_job(queue_session) -> None:
+    enqueue_jobs(queue_session, "images", [REQUESTED_TIME])
+    job = claim_job(queue_session, "worker-1")
+    assert job.requested_time == REQUESTED_TIME
+    assert job.attempts == 1
+    assert job.claimed_by == "worker-1"
+    # Hidden from other workers until it times out
+    assert claim_job(queue_session, "worker-2") is None
+    complete_job(queue_session, job)
+    assert queue_session.get(Job, job.id).status == JOB_DONE
+    assert claim_job(queue_session, "worker-2") is None
+
+
+def test_claim_job_after_visibility_timeout(queue_session, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_QUEUE_VISIBILITY_TIMEOUT", "0")
+    enqueue_jobs(queue_session, "images", [REQUESTED_TIME])
+    job = claim_job(queue_session, "worker-1")
+    # worker-1 died without extending the job, so another worker retries it
+    retried_job = claim_job(queue_session, "worker-2")
+    assert retried_job.id == job.id
+    assert retried_job.attempts == 2
+
+
+def test_fail_job(queue_session, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_QUEUE_RETRY_DELAY", "0")
+    monkeypatch.setenv("SUNTODAY_QUEUE_MAX_ATTEMPTS", "2")
+    enqueue_jobs(queue_session, "images", [REQUESTED_TIME])
+    job = claim_job(queue_session)
+    fail_job(queue_session, job, "JSOC is down")
+    assert queue_session.get(Job, job.id).status == JOB_QUEUED
+    job = claim_job(queue_session)
+    assert job.attempts == 2
+    fail_job(queue_session, job, "JSOC is still down")
+    queue_session.expire_all()
+    failed_job = queue_session.get(Job, job.id)
+    assert failed_job.status == JOB_FAILED
+    assert failed_job.error == "JSOC is still down"
+    assert claim_job(queue_session) is None
+
+
+def test_reap_jobs(queue_session, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_QUEUE_VISIBILITY_TIMEOUT", "0")
+    monkeypatch.setenv("SUNTODAY_QUEUE_MAX_ATTEMPTS", "1")
+    enqueue_jobs(queue_session, "images", [REQUESTED_TIME])
+    job = claim_job(queue_session, "worker-1")
+    # worker-1 died on the last attempt, so the job is failed rather than left running
+    assert claim_job(queue_session, "worker-2") is None
+    queue_session.expire_all()
+    failed_job = queue_session.get(Job, job.id)
+    assert failed_job.status == JOB_FAILED
+    assert failed_job.error == "Worker stopped during the last attempt"
+    assert reap_jobs(queue_session) == 0
+
+
+def test_claim_statement_skips_locked_rows() -> None:
+    statement = _get_claim_statement("worker-1", REQUESTED_TIME)
+    assert "FOR UPDATE SKIP LOCKED" in str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_run_worker(queue_session, db_session, mocker) -> None:
+    mocker.patch("suntoday.jobqueue.get_session", side_effect=db_session)
+    run_job = mocker.patch("suntoday.jobqueue.run_job", side_effect=[None, OSError("JSOC is down")])
+    enqueue_jobs(queue_session, "timeseries", [REQUESTED_TIME])
+    enqueue_jobs(queue_session, "images", [REQUESTED_TIME])
+    assert run_worker("worker-1", max_jobs=2) == 2
+    assert run_job.call_count == 2
+    queue_session.expire_all()
+    statuses = {job.task: job.status for job in queue_session.query(Job)}
+    assert statuses == {"timeseries": JOB_DONE, "images": JOB_QUEUED}
+
+
+def test_run_job_like_main_job(mocker, monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("SUNTODAY_SAVE_DIRECTORY", str(tmp_path))
+    monkeypatch.setenv("SUNTODAY_METRICS_DIRECTORY", str(tmp_path / "metrics"))
+    mocker.patch("suntoday.jobqueue.get_session")
+    create_images = mocker.patch("suntoday.main.create_images", side_effect=OSError("JSOC is down"))
+    create_sdo_images = mocker.patch("suntoday.jpegs.create_sdo_images")
+    with pytest.raises(OSError, match="JSOC is down"):
+        run_job(Job(task="images", requested_time=REQUESTED_TIME, product="0171"))
+    assert create_images.call_args.args[1:] == ("images", REQUESTED_TIME, tmp_path / "2025" / "08" / "04", ["0171"])
+    # Published and the metrics exported, even though it failed
+    assert (tmp_path / "latest").resolve().is_relative_to(tmp_path / ".releases")
+    assert [path.name for path in (tmp_path / "metrics").iterdir()] == ["suntoday.prom"]
+    # A backfill is of a past day, so is not published
+    (tmp_path / "latest").unlink()
+    run_job(Job(task=BACKFILL_TASK, requested_time=REQUESTED_TIME))
+    create_sdo_images.assert_called_once_with(REQUESTED_TIME, tmp_path / "2025" / "08" / "04")
+    assert not (tmp_path / "latest").exists()
@@ -1,14 +1,32 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime, timedelta
 
+import astropy.units as u
+import matplotlib.pyplot as plt
+import numpy as np
 import pytest
+import sunpy.map as smap
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
 from PIL import Image
+from sunpy.coordinates import frames, get_earth
 
 from suntoday.jpegs import (
+    _cache_frames,
+    _create_cutout_figure,
+    _get_difference_products,
     create_blended_figure_from_maps,
+    create_cutout_figure_from_maps,
+    create_difference_figure_from_map,
     create_figure_from_map,
     create_rgb_figure_from_maps,
     create_sdo_images,
+    encode_image,
+    figure_to_image,
+    get_product_name,
     save_figures,
+    save_map_fits,
 )
 from suntoday.maps import create_aia_map, create_hmi_map
 
@@ -173,6 +191,20 @@ def test_save_figures_from_maps_hmi_cont(hmi_cont_test_file, tmpdir) -> None:
         assert img.size == (1024, 1024)
 
 
+def test_get_product_name(aia_94_test_file, aia_335_test_file, aia_193_test_file, hmi_blos_test_file) -> None:
+    aia_94_map = create_aia_map(aia_94_test_file)
+    aia_335_map = create_aia_map(aia_335_test_file)
+    aia_193_map = create_aia_map(aia_193_test_file)
+    hmi_blos_map = create_hmi_map(hmi_blos_test_file)
+    assert get_product_name([aia_94_map]) == "0094"
+    assert get_product_name([hmi_blos_map]) == "_HMImag"
+    assert get_product_name([aia_94_map, aia_335_map, aia_193_map]) == "_094_335_193"
+    # These have to match the filenames of the figures
+    assert (
+        get_product_name([hmi_blos_map, aia_193_map]) == create_blended_figure_from_maps([hmi_blos_map, aia_193_map])[0]
+    )
+
+
 def test_create_sdo_images_offline(  # NOQA: PLR0917
     mocker,
     tmpdir,
@@ -190,7 +222,7 @@ def test_create_sdo_images_offline(  # NOQA: PLR0917
 ) -> None:
     assert len(tmpdir.listdir()) == 0
     mocker.patch(
-        "suntoday.jpegs.fetch_aia_fits",
+        "suntoday.sources.fetch_aia_fits",
         return_value=[
             aia_131_test_file,
             aia_1600_test_file,
@@ -204,7 +236,7 @@ def test_create_sdo_images_offline(  # NOQA: PLR0917
         ],
     )
     mocker.patch(
-        "suntoday.jpegs.fetch_hmi_fits",
+        "suntoday.sources.fetch_hmi_fits",
         return_value=[
             hmi_blos_test_file,
             hmi_cont_test_file,
@@ -320,3 +352,215 @@ def test_create_sdo_images_online(tmpdir) -> None:
     assert len(tmpdir.listdir()) == len(canonical_filelist)
     for file in tmpdir.listdir():
         assert file.basename in canonical_filelist
+
+
+@pytest.fixture
+def synthetic_aia_map():
+    return _synthetic_map("2025-08-04T00:00:00")
+
+
+def _synthetic_map(date: str) -> smap.GenericMap:
+    data = np.random.default_rng(0).gamma(2, 200, (256, 256))
+    data[:8, :8] = np.nan
+    reference_coordinate = SkyCoord(
+        0 * u.arcsec, 0 * u.arcsec, obstime=date, observer=get_earth(date), frame=frames.Helioprojective
+    )
+    header = smap.make_fitswcs_header(
+        data,
+        reference_coordinate,
+        scale=[10, 10] * u.arcsec / u.pixel,
+        instrument="AIA_3",
+        detector="AIA",
+        telescope="SDO/AIA",
+        wavelength=171 * u.angstrom,
+    )
+    # Calibrated AIA maps keep the BLANK of the level 1 files
+    header["BLANK"] = -32768
+    return smap.Map(data, header)
+
+
+@pytest.mark.parametrize(
+    ("compression", "dtype", "atol"),
+    [
+        ("none", "float64", 0),
+        ("none", "float32", 1e-3),
+        # Quantized to a 16th of the noise, which is large in random data
+        ("gzip", "float32", 20),
+        ("rice", "float32", 20),
+        ("rice", "int16", 0.1),
+    ],
+)
+def test_save_map_fits(tmp_path, synthetic_aia_map, compression, dtype, atol) -> None:
+    fits_path = tmp_path / "f0171.fits"
+    fits_path.write_bytes(b"old")
+    size = save_map_fits(synthetic_aia_map, fits_path, compression=compression, dtype=dtype)
+    assert size == fits_path.stat().st_size
+    assert [path.name for path in tmp_path.iterdir()] == ["f0171.fits"]
+    with fits.open(fits_path) as hdul:
+        assert isinstance(hdul[-1], fits.CompImageHDU) == (compression != "none")
+    saved_map = smap.Map(fits_path)
+    assert saved_map.wavelength == synthetic_aia_map.wavelength
+    assert saved_map.date == synthetic_aia_map.date
+    assert np.isnan(saved_map.data[:8, :8]).all()
+    np.testing.assert_allclose(saved_map.data[8:, 8:], synthetic_aia_map.data[8:, 8:], rtol=1e-6, atol=atol)
+
+
+def test_save_map_fits_smaller(tmp_path, synthetic_aia_map) -> None:
+    uncompressed = save_map_fits(synthetic_aia_map, tmp_path / "none.fits", compression="none", dtype="float64")
+    assert save_map_fits(synthetic_aia_map, tmp_path / "rice.fits") < uncompressed / 4
+    assert save_map_fits(synthetic_aia_map, tmp_path / "int16.fits", dtype="int16") < uncompressed / 3
+
+
+def test_save_map_fits_invalid(tmp_path, synthetic_aia_map) -> None:
+    with pytest.raises(ValueError, match="Invalid FITS compression"):
+        save_map_fits(synthetic_aia_map, tmp_path / "f0171.fits", compression="bzip2")
+    with pytest.raises(ValueError, match="Invalid FITS dtype"):
+        save_map_fits(synthetic_aia_map, tmp_path / "f0171.fits", dtype="uint8")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_save_figures_extra_formats(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_FIG_DPI", "100")
+    monkeypatch.setenv("SUNTODAY_RESIZE_FIG_SIZE", "128")
+    monkeypatch.setenv("SUNTODAY_SDO_FIG_EXTRA_FORMATS", '["webp", "avif"]')
+    fig = plt.figure(figsize=(5.12, 5.12), dpi=100)
+    save_figures([("0171", fig)], tmp_path)
+    plt.close(fig)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "f0171.avif",
+        "f0171.jpg",
+        "f0171.webp",
+        "l0171.avif",
+        "l0171.jpg",
+        "l0171.webp",
+    ]
+    for path in tmp_path.iterdir():
+        with Image.open(path) as img:
+            assert img.format == {"jpg": "JPEG", "webp": "WEBP", "avif": "AVIF"}[path.suffix[1:]]
+            assert img.size == ((512, 512) if path.name.startswith("f") else (128, 128))
+
+
+def test_encode_image_options(monkeypatch) -> None:
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (256, 256, 3), dtype=np.uint8))
+    baseline = encode_image(image, "jpg")
+    monkeypatch.setenv("SUNTODAY_SDO_FIG_FORMAT_OPTIONS", '{"jpg": {"quality": 20, "progressive": true}}')
+    progressive = encode_image(image, "jpg", dpi=300)
+    assert len(progressive) < len(baseline)
+    with Image.open(io.BytesIO(progressive)) as img:
+        assert img.info["progressive"]
+        assert img.info["dpi"] == (300, 300)
+
+
+def test_figure_to_image_width() -> None:
+    fig = plt.figure(figsize=(4096 / 300, 4096 / 300), dpi=300)
+    fig.text(0.5, 0.5, "SDO/AIA", fontsize=100)
+    assert figure_to_image(fig, 1024).size == (1024, 1024)
+    assert fig.dpi == 300
+    plt.close(fig)
+
+
+def test_save_figures_tiers(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_FIG_DPI", "100")
+    monkeypatch.setenv("SUNTODAY_RESIZE_FIG_SIZE", "128")
+    fig = plt.figure(figsize=(5.12, 5.12), dpi=100)
+    save_figures([("0171", fig)], tmp_path, tiers=["preview"])
+    assert [path.name for path in tmp_path.iterdir()] == ["l0171.jpg"]
+    with Image.open(tmp_path / "l0171.jpg") as img:
+        assert img.size == (128, 128)
+    save_figures([("0171", fig)], tmp_path, tiers=["full"])
+    plt.close(fig)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["f0171.jpg", "l0171.jpg"]
+    with Image.open(tmp_path / "f0171.jpg") as img:
+        assert img.size == (512, 512)
+
+
+@pytest.mark.parametrize(("kind", "neutral"), [("rd", 0), ("br", 1)])
+def test_create_difference_figure_from_map(synthetic_aia_map, kind, neutral) -> None:
+    data = np.full(synthetic_aia_map.data.shape, neutral, dtype=np.float32)
+    data[100:120, 100:120] += 0.5
+    name, fig = create_difference_figure_from_map(
+        synthetic_aia_map, data, kind, datetime(2025, 8, 3, 23, 50, tzinfo=UTC)
+    )
+    assert name == f"0171_{kind}"
+    image = fig.axes[0].get_images()[0]
+    assert image.norm.vmin == pytest.approx(neutral - 0.5)
+    assert image.norm.vmax == pytest.approx(neutral + 0.5)
+    assert "to 23:50:00" in fig.axes[0].texts[0].get_text()
+    plt.close(fig)
+
+
+def test_get_difference_products(synthetic_aia_map, monkeypatch, tmp_path, mocker) -> None:
+    monkeypatch.setenv("SUNTODAY_FRAME_CACHE_SIZE", "1")
+    monkeypatch.setenv("SUNTODAY_FRAME_CACHE_DIRECTORY", str(tmp_path))
+    assert _get_difference_products([synthetic_aia_map]) == []
+    earlier_map = smap.Map(synthetic_aia_map.data / 2, synthetic_aia_map.meta.copy())
+    earlier_map.meta["date-obs"] = "2025-08-03T23:50:00"
+    _cache_frames([earlier_map])
+    products = _get_difference_products([synthetic_aia_map])
+    # Named apart from the AIA product, so they can be selected on their own
+    assert [name for name, *_ in products] == ["0171_rd", "0171_br"]
+    assert all(maps == [synthetic_aia_map] for _, maps, _ in products)
+    # Another render caching its frame before these are rendered does not change them
+    later_map = smap.Map(synthetic_aia_map.data * 3, synthetic_aia_map.meta.copy())
+    later_map.meta["date-obs"] = "2025-08-03T23:55:00"
+    _cache_frames([later_map])
+    create_difference_figure = mocker.patch(
+        "suntoday.jpegs.create_difference_figure_from_map", wraps=create_difference_figure_from_map
+    )
+    for name, _, create in products:
+        figure_name, fig = create()
+        assert figure_name == name
+        assert "to 23:50:00" in fig.axes[0].texts[0].get_text()
+        plt.close(fig)
+    running_difference, base_ratio = (call.args[1] for call in create_difference_figure.call_args_list)
+    np.testing.assert_allclose(running_difference, synthetic_aia_map.data / 2, rtol=1e-6)
+    np.testing.assert_allclose(base_ratio[synthetic_aia_map.data > 0], 2, rtol=1e-6)
+
+
+def test_create_cutout_figure_from_maps(synthetic_aia_map) -> None:
+    bottom_left = SkyCoord(-300 * u.arcsec, -200 * u.arcsec, frame=synthetic_aia_map.coordinate_frame)
+    top_right = SkyCoord(-100 * u.arcsec, 0 * u.arcsec, frame=synthetic_aia_map.coordinate_frame)
+    name, fig = create_cutout_figure_from_maps([synthetic_aia_map] * 3, bottom_left, top_right, 2)
+    assert name == "_ar2"
+    # A panel of each map, in two rows, and the logo
+    panels = [ax for ax in fig.axes if ax.get_images() and hasattr(ax, "wcs")]
+    assert len(panels) == 3
+    assert panels[0].get_images()[0].get_array().shape == (21, 21)
+    assert fig.get_size_inches()[0] == pytest.approx(fig.get_size_inches()[1])
+    plt.close(fig)
+
+
+@pytest.mark.parametrize("x", [-300, -900, -1000])
+def test_create_cutout_figure_from_maps_limb(synthetic_aia_map, x) -> None:
+    # The magnetogram the corners come from is observed 35 seconds before the AIA map
+    hmi_map = _synthetic_map("2025-08-03T23:59:25")
+    bottom_left = SkyCoord(x * u.arcsec, -100 * u.arcsec, frame=hmi_map.coordinate_frame)
+    top_right = SkyCoord((x + 200) * u.arcsec, 100 * u.arcsec, frame=hmi_map.coordinate_frame)
+    name, fig = create_cutout_figure_from_maps([synthetic_aia_map, hmi_map], bottom_left, top_right, 1)
+    assert name == "_ar1"
+    panels = [ax for ax in fig.axes if ax.get_images() and hasattr(ax, "wcs")]
+    assert len(panels) == 2
+    assert all(min(panel.get_images()[0].get_array().shape) >= 20 for panel in panels)
+    plt.close(fig)
+
+
+def test_create_cutout_figure_failed(synthetic_aia_map, mocker) -> None:
+    mocker.patch.object(type(synthetic_aia_map), "submap", side_effect=ValueError("NaN corners"))
+    bottom_left = SkyCoord(-300 * u.arcsec, -200 * u.arcsec, frame=synthetic_aia_map.coordinate_frame)
+    top_right = SkyCoord(-100 * u.arcsec, 0 * u.arcsec, frame=synthetic_aia_map.coordinate_frame)
+    figures = plt.get_fignums()
+    assert _create_cutout_figure([synthetic_aia_map], bottom_left, top_right, 1) is None
+    # No figure of the failed cutout is left open
+    assert plt.get_fignums() == figures
+
+
+def test_figures_drawn_in_threads(synthetic_aia_map) -> None:
+    figures = plt.get_fignums()
+    products = [create_figure_from_map(synthetic_aia_map) for _ in range(4)]
+    # Not managed by pyplot, so nothing has to close them
+    assert plt.get_fignums() == figures
+    expected = np.asarray(figure_to_image(products[0][1], 128))
+    # Drawn in several threads at once, as the previews and full resolution images are
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        images = list(executor.map(lambda product: figure_to_image(product[1], 128), products))
+    assert all(np.array_equal(np.asarray(image), expected) for image in images)
@@ -1,16 +1,23 @@
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import pytest
 
 from suntoday.lightcurve import (
+    _fetch_aia_timeseries,
+    _get_window,
     add_aia_lightcurve,
     add_goes_lightcurve,
     create_lightcurve_figure,
+    decimate_minmax,
+    get_aia_lightcurves,
     plot_lightcurve_from_timeseries,
 )
+from suntoday.metrics import job_metrics
+from suntoday.timeseries import append_timeseries
 
 
 @pytest.mark.mpl_image_compare(savefig_kwargs={"format": "png"}, style="default")
@@ -34,11 +41,112 @@ def test_add_aia_lightcurve(aia_timeseries):
     return fig
 
 
+def test_get_aia_lightcurves(aia_timeseries) -> None:
+    aia_timeseries = aia_timeseries.copy()
+    aia_timeseries.iloc[::7, aia_timeseries.columns.get_loc("DATAMEAN")] = np.nan
+    lightcurves = get_aia_lightcurves(aia_timeseries)
+    assert sorted(lightcurves) == sorted(aia_timeseries["WAVELNTH"].unique())
+    # The same as smoothing and clipping each wavelength on its own
+    for wavelength, data in aia_timeseries.groupby("WAVELNTH"):
+        values = (data["DATAMEAN"] / data["EXPTIME"]).ewm(span=5).mean()
+        expected = values[values.between(values.quantile(0.005), values.quantile(0.999))]
+        pd.testing.assert_series_equal(lightcurves[wavelength], expected, check_names=False)
+    assert get_aia_lightcurves(aia_timeseries.iloc[:0]) == {}
+
+
+def test_decimate_minmax() -> None:
+    index = pd.date_range("2025-07-30", periods=100_000, freq="12s", tz="UTC")
+    rng = np.random.default_rng(0)
+    series = pd.Series(rng.normal(1.0, 0.1, len(index)), index=index)
+    series.iloc[12_345] = 100.0
+    series.iloc[54_321] = -100.0
+    decimated = decimate_minmax(series, 1000)
+    assert len(decimated) <= 1000
+    assert decimated.index.is_monotonic_increasing
+    # The peaks and the ends are kept, as they are
+    assert decimated.max() == 100.0
+    assert decimated.min() == -100.0
+    assert decimated.index[0] == index[0]
+    assert decimated.index[-1] == index[-1]
+    pd.testing.assert_series_equal(decimated, series[decimated.index])
+    assert decimate_minmax(series, len(series)) is series
+    assert decimate_minmax(series, 0) is series
+
+
+def test_create_lightcurve_figure_windows(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("SUNTODAY_SOURCE", "replay")
+    monkeypatch.setenv("SUNTODAY_LIGHTCURVE_WINDOWS", "[6, 24, 72]")
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_ARCHIVE_DIRECTORY", str(tmp_path / "timeseries"))
+    end_time = datetime(2025, 7, 30, 21, tzinfo=UTC)
+    with job_metrics() as registry:
+        create_lightcurve_figure(end_time, tmp_path)
+    for name in ["lightcurve_6h_20250730.png", "lightcurve_20250730.png", "lightcurve_72h_20250730.png"]:
+        assert (tmp_path / name).is_file()
+    # Rendered in threads, which record into the metrics of the job
+    assert sum(stage["stage"] == "render" for stage in registry.snapshot()) == 3
+    assert sorted(path.name for path in (tmp_path / "timeseries").iterdir()) == [
+        "aia",
+        "goes_primary",
+        "goes_secondary",
+    ]
+    # The text files are of the last day, not the longest window
+    aia_lightcurve = pd.read_csv(tmp_path / "aia_light_curves.txt", sep="\t", index_col=0, parse_dates=True)
+    assert not aia_lightcurve.empty
+    assert aia_lightcurve.index.min() > end_time - timedelta(days=1)
+
+
+@pytest.mark.parametrize(
+    ("archived_until", "gap", "fetched"),
+    [
+        # Only the last hour is new, the end of the archive is fetched again
+        (timedelta(hours=1), None, timedelta(hours=1, minutes=10)),
+        # Jobs that did not run leave a gap, which is fetched again
+        (timedelta(hours=1), (timedelta(hours=10), timedelta(hours=8)), timedelta(hours=10, minutes=10)),
+        # Nothing archived yet
+        (timedelta(days=2), None, timedelta(days=1)),
+    ],
+)
+def test_fetch_aia_timeseries_from_archive(  # NOQA: PLR0917
+    monkeypatch, tmp_path, mocker, aia_timeseries, archived_until, gap, fetched
+) -> None:
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_ARCHIVE_DIRECTORY", str(tmp_path))
+    end_time = datetime(2025, 7, 30, 21, tzinfo=UTC)
+    archived = aia_timeseries[aia_timeseries.index <= end_time - archived_until]
+    if gap is not None:
+        archived = archived[(archived.index <= end_time - gap[0]) | (archived.index > end_time - gap[1])]
+    append_timeseries("aia", archived)
+    source = mocker.Mock()
+    source.fetch_aia_timeseries.side_effect = lambda end, duration: _get_window(aia_timeseries, end, duration)
+    timeseries, fetched_timeseries = _fetch_aia_timeseries(source, end_time, timedelta(days=1))
+    assert source.fetch_aia_timeseries.call_args.args[1] == pytest.approx(fetched, abs=timedelta(minutes=1))
+    assert fetched_timeseries.index.min() > end_time - fetched - timedelta(minutes=1)
+    expected = _get_window(aia_timeseries, end_time, timedelta(days=1))
+    assert set(zip(timeseries.index, timeseries["WAVELNTH"], strict=True)) == set(
+        zip(expected.index, expected["WAVELNTH"], strict=True)
+    )
+
+
+def test_create_lightcurve_figure_no_text_export(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("SUNTODAY_SOURCE", "replay")
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_ARCHIVE", "false")
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_TEXT_EXPORT", "false")
+    create_lightcurve_figure(datetime(2025, 7, 30, 21, tzinfo=UTC), tmp_path)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["lightcurve_20250730.png"]
+
+
 @pytest.mark.mpl_image_compare(savefig_kwargs={"format": "png"}, style="default")
 def test_plot_lightcurve_from_timeseries(aia_timeseries, goes_primary_timeseries):
     return plot_lightcurve_from_timeseries(goes_primary_timeseries, aia_timeseries)
 
 
+def test_plot_lightcurve_from_timeseries_without_pyplot(aia_timeseries, goes_primary_timeseries) -> None:
+    figures = plt.get_fignums()
+    fig = plot_lightcurve_from_timeseries(goes_primary_timeseries, aia_timeseries)
+    # Not managed by pyplot, so it can be built while the SDO images are
+    assert plt.get_fignums() == figures
+    assert fig.axes[0].get_ylabel() == "Data Mean (DN)"
+
+
 @pytest.mark.mpl_image_compare(savefig_kwargs={"format": "png"}, style="default")
 def test_lightcurve_figure_latest():
     from suntoday.downloaders.goes import fetch_goes_timeseries
@@ -49,7 +157,8 @@ def test_lightcurve_figure_latest():
     return plot_lightcurve_from_timeseries(goes_primary_timeseries, aia_timeseries)
 
 
-def test_create_lightcurve_figure(tmpdir) -> None:
+def test_create_lightcurve_figure(monkeypatch, tmpdir) -> None:
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_ARCHIVE_DIRECTORY", str(tmpdir / "timeseries"))
     datetime_now = datetime.now(UTC)
     create_lightcurve_figure(datetime_now, tmpdir)
     saved_figure = tmpdir / Path("lightcurve_" + datetime_now.strftime("%Y%m%d") + ".png")
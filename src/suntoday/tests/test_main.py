@@ -1,10 +1,11 @@
+import json
 from datetime import UTC, datetime
 from pathlib import Path
 
 import pytest
 
 from suntoday.db import SDOImages, TimeSeriesImages
-from suntoday.main import create_images
+from suntoday.main import create_images, main_job
 
 
 def test_create_images_invalid_type(mocker) -> None:
@@ -13,7 +14,8 @@ def test_create_images_invalid_type(mocker) -> None:
         create_images("", "invalid_type", datetime.now(UTC), "")
 
 
-def test_timeseries_creation(db_session, mocker, tmpdir) -> None:
+def test_timeseries_creation(db_session, mocker, monkeypatch, tmpdir) -> None:
+    monkeypatch.setenv("SUNTODAY_TIMESERIES_ARCHIVE_DIRECTORY", str(tmpdir / "timeseries"))
     session = db_session()
     assert session.query(TimeSeriesImages).count() == 0
 
@@ -65,3 +67,29 @@ def test_images_creation(db_session, mocker, tmpdir) -> None:
     assert model.updated_at != old_updated_at
 
     session.close()
+
+
+def test_main_job_pipelines_are_isolated(mocker, tmp_path) -> None:
+    mocker.patch("suntoday.main.init_db")
+    get_session = mocker.patch("suntoday.main.get_session")
+
+    completed = []
+
+    def _create_images(session, image_type, requested_time, save_directory, products=None):  # NOQA: ARG001
+        if image_type == "images":
+            msg = "JSOC is down"
+            raise OSError(msg)
+        completed.append(image_type)
+
+    create_images = mocker.patch("suntoday.main.create_images", side_effect=_create_images)
+    main_job(datetime(2025, 7, 23, 14, 0, 0, tzinfo=UTC), tmp_path)
+
+    assert sorted(call.args[1] for call in create_images.call_args_list) == ["images", "timeseries"]
+    # The timeseries is still created when the images fail
+    assert completed == ["timeseries"]
+    # Each pipeline gets and closes its own session
+    assert get_session.call_count == 2
+    assert get_session.return_value.close.call_count == 2
+    assert (tmp_path / "2025" / "07" / "23").is_dir()
+    # The outputs are published even when a pipeline fails
+    assert json.loads((tmp_path / "latest" / "manifest.json").read_text(encoding="utf-8"))["source"] == "2025/07/23"
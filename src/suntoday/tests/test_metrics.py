@@ -0,0 +1,89 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from suntoday.metrics import METRICS, export_metrics, get_metrics, job_metrics, measure
+
+
+def test_measure_records_stage() -> None:
+    METRICS.reset()
+    with measure("download", "0171") as metrics:
+        metrics.add_bytes(100)
+    with measure("download", "0171") as metrics:
+        metrics.add_bytes(50)
+    with measure("render"):
+        pass
+    snapshot = METRICS.snapshot()
+    assert [(stage["stage"], stage["product"]) for stage in snapshot] == [("download", "0171"), ("render", "all")]
+    assert snapshot[0]["bytes"] == 150
+    assert snapshot[0]["count"] == 2
+    assert snapshot[0]["wall_time"] >= 0
+    assert snapshot[0]["rss_growth"] >= 0
+
+
+def test_measure_rss_growth() -> None:
+    with job_metrics() as registry:
+        with measure("calibration", "0171"):
+            data = np.ones((4096, 4096))
+        # Only the memory allocated during the stage counts
+        with measure("render", "0171"):
+            pass
+    del data
+    calibration, render = registry.snapshot()
+    assert calibration["rss_growth"] >= 4096 * 4096 * 8 * 0.9
+    assert render["rss_growth"] < calibration["rss_growth"]
+
+
+def test_job_metrics() -> None:
+    METRICS.reset()
+
+    def record(stage: str, product: str) -> None:
+        with measure(stage, product):
+            pass
+
+    def run_job(product: str) -> list[dict]:
+        with job_metrics() as registry:
+            # As the pipelines of a job record from the threads of its executors
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(contextvars.copy_context().run, record, "write", product).result()
+            record("render", product)
+            return registry.snapshot()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        snapshots = list(executor.map(run_job, ["0171", "0193"]))
+    # Neither job sees, nor resets, the metrics of the other
+    assert [[(stage["stage"], stage["product"]) for stage in snapshot] for snapshot in snapshots] == [
+        [("render", "0171"), ("write", "0171")],
+        [("render", "0193"), ("write", "0193")],
+    ]
+    assert METRICS.snapshot() == []
+    assert get_metrics() is METRICS
+
+
+def test_measure_records_on_error() -> None:
+    METRICS.reset()
+    msg = "JSOC is down"
+    with pytest.raises(OSError, match=msg), measure("jsoc_query", "aia"):
+        raise OSError(msg)
+    assert METRICS.snapshot()[0]["stage"] == "jsoc_query"
+
+
+def test_export_metrics(tmp_path) -> None:
+    METRICS.reset()
+    with measure("write", "0171") as metrics:
+        metrics.add_bytes(10)
+    path = export_metrics(tmp_path, "prometheus")
+    assert path == tmp_path / "suntoday.prom"
+    content = path.read_text()
+    assert "# TYPE suntoday_stage_wall_seconds gauge" in content
+    assert 'suntoday_stage_bytes{stage="write",product="0171"} 10' in content
+    path = export_metrics(tmp_path, "json")
+    content = json.loads(path.read_text())
+    assert content["stages"][0]["bytes"] == 10
+    # Nothing is written when no directory is configured
+    assert export_metrics() is None
+    with pytest.raises(ValueError, match="Invalid metrics format"):
+        export_metrics(tmp_path, "csv")
@@ -0,0 +1,103 @@
+import io
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from suntoday.movies import append_movie_frame, archive_frame, write_movie
+from suntoday.publish import write_atomic
+
+
+def _jpeg(value: int) -> bytes:
+    encoded = io.BytesIO()
+    Image.fromarray(np.full((32, 48, 3), value, dtype=np.uint8)).save(encoded, format="JPEG")
+    return encoded.getvalue()
+
+
+def _read_frames(path) -> list[bytes]:
+    # Read the frames through the index, as a player would
+    content = path.read_bytes()
+    assert content[:4] == b"RIFF"
+    assert content[8:12] == b"AVI "
+    assert struct.unpack_from("<I", content, 4)[0] == len(content) - 8
+    movi = content.index(b"movi")
+    index = content.index(b"idx1", movi)
+    total_frames = struct.unpack_from("<I", content, 48)[0]
+    entries = list(struct.iter_unpack("<4sIII", content[index + 8 :]))
+    assert len(entries) == total_frames
+    frames = []
+    for chunk_id, _, offset, size in entries:
+        assert chunk_id == b"00dc"
+        assert content[movi + offset : movi + offset + 4] == b"00dc"
+        frames.append(content[movi + offset + 8 : movi + offset + 8 + size])
+    return frames
+
+
+def test_write_and_append_movie(tmp_path) -> None:
+    movie_path = tmp_path / "l0171.avi"
+    frames = [_jpeg(0), _jpeg(100)]
+    write_movie(movie_path, frames, fps=5)
+    assert _read_frames(movie_path) == frames
+    # The header has the size of the frames and the frame rate
+    content = movie_path.read_bytes()
+    assert struct.unpack_from("<I", content, 32)[0] == 200_000
+    assert struct.unpack_from("<2I", content, 64) == (48, 32)
+    inode = movie_path.stat().st_ino
+    for value in [200, 255]:
+        frames.append(_jpeg(value))
+        append_movie_frame(movie_path, frames[-1])
+    assert _read_frames(movie_path) == frames
+    # Appended in place
+    assert movie_path.stat().st_ino == inode
+    # A hard link, e.g., from a published release, keeps the movie it had
+    release_path = tmp_path / "release.avi"
+    release_path.hardlink_to(movie_path)
+    append_movie_frame(movie_path, _jpeg(50))
+    assert _read_frames(movie_path) == [*frames, _jpeg(50)]
+    assert _read_frames(release_path) == frames
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_append_movie_frame_not_a_movie(tmp_path) -> None:
+    movie_path = tmp_path / "l0171.avi"
+    movie_path.write_bytes(b"RIFF" + bytes(300))
+    with pytest.raises(ValueError, match="not a movie"):
+        append_movie_frame(movie_path, _jpeg(0))
+    assert movie_path.read_bytes() == b"RIFF" + bytes(300)
+
+
+def test_archive_frame(tmp_path) -> None:
+    preview_path = tmp_path / "l0171.jpg"
+    movie_path = tmp_path / "movies" / "l0171.avi"
+    for value, hour in [(0, 0), (100, 1)]:
+        archive_frame(preview_path, _jpeg(value), datetime(2025, 8, 4, hour, tzinfo=UTC))
+    assert sorted(path.name for path in (tmp_path / "frames" / "l0171").iterdir()) == [
+        "l0171_20250804_000000.jpg",
+        "l0171_20250804_010000.jpg",
+    ]
+    assert _read_frames(movie_path) == [_jpeg(0), _jpeg(100)]
+    # The frame archived is the one given, not whatever the preview is now
+    write_atomic(preview_path, _jpeg(255))
+    # A frame from earlier in the day is put in time order
+    frame_path = archive_frame(preview_path, _jpeg(200), datetime(2025, 8, 4, 0, 30, tzinfo=UTC))
+    assert frame_path.name == "l0171_20250804_003000.jpg"
+    assert _read_frames(movie_path) == [_jpeg(0), _jpeg(200), _jpeg(100)]
+    # The same time again replaces its frame
+    archive_frame(preview_path, _jpeg(255), datetime(2025, 8, 4, 1, tzinfo=UTC))
+    assert _read_frames(movie_path) == [_jpeg(0), _jpeg(200), _jpeg(255)]
+    # A movie left partly appended is written again from the frames
+    movie_path.write_bytes(movie_path.read_bytes()[:-20])
+    archive_frame(preview_path, _jpeg(50), datetime(2025, 8, 4, 2, tzinfo=UTC))
+    assert _read_frames(movie_path) == [_jpeg(0), _jpeg(200), _jpeg(255), _jpeg(50)]
+
+
+def test_archive_frame_concurrently(tmp_path) -> None:
+    preview_path = tmp_path / "l0171.jpg"
+    frames = [_jpeg(value) for value in range(0, 240, 10)]
+    times = [datetime(2025, 8, 4, hour, tzinfo=UTC) for hour in range(len(frames))]
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(archive_frame, [preview_path] * len(frames), frames, times))
+    assert _read_frames(tmp_path / "movies" / "l0171.avi") == frames
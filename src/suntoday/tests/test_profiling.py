@@ -0,0 +1,72 @@
+import threading
+import time
+
+from suntoday.profiling import ALL_PROFILES, StackSampler, profile_job, prune_profiles
+
+
+def _busy_wait(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_stack_sampler() -> None:
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_wait, args=(stop,), name="busy")
+    worker.start()
+    sampler = StackSampler(0.001)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+    folded = sampler.to_folded()
+    assert any(line.startswith("busy;") and "_busy_wait (test_profiling.py:7)" in line for line in folded.splitlines())
+    assert "suntoday-profiler" not in folded
+
+
+def test_profile_job_disabled(tmp_path) -> None:
+    with profile_job(tmp_path) as sampler:
+        pass
+    assert sampler is None
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_profile_job(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_PROFILING", "true")
+    with profile_job(tmp_path) as sampler:
+        _ = [bytearray(1024) for _ in range(100)]
+    assert sampler is not None
+    assert sorted(path.suffix for path in (tmp_path / "profiles").iterdir()) == [".folded", ".tracemalloc", ".txt"]
+
+
+def test_prune_profiles(tmp_path) -> None:
+    for hour in range(5):
+        for suffix in [".folded", ".tracemalloc", ".txt"]:
+            (tmp_path / f"main_job_20250804T{hour:02}0000{suffix}").touch()
+    prune_profiles(tmp_path, 2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "main_job_20250804T030000.folded",
+        "main_job_20250804T030000.tracemalloc",
+        "main_job_20250804T030000.txt",
+        "main_job_20250804T040000.folded",
+        "main_job_20250804T040000.tracemalloc",
+        "main_job_20250804T040000.txt",
+    ]
+
+
+def test_prune_profiles_across_days(tmp_path) -> None:
+    # A profile every hour, spread over a directory per day
+    for day, hour in [(3, 22), (3, 23), (4, 0), (4, 1)]:
+        profile_directory = tmp_path / "2025" / "08" / f"{day:02}" / "profiles"
+        profile_directory.mkdir(parents=True, exist_ok=True)
+        for suffix in [".folded", ".txt"]:
+            (profile_directory / f"main_job_202508{day:02}T{hour:02}0000{suffix}").touch()
+    prune_profiles(tmp_path, 3, ALL_PROFILES)
+    assert sorted(path.stem for path in tmp_path.glob(ALL_PROFILES)) == [
+        "main_job_20250803T230000",
+        "main_job_20250803T230000",
+        "main_job_20250804T000000",
+        "main_job_20250804T000000",
+        "main_job_20250804T010000",
+        "main_job_20250804T010000",
+    ]
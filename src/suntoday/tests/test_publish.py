@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from suntoday.publish import build_manifest, file_lock, publish_latest, write_atomic
+
+
+def _read_latest_manifest(root):
+    return json.loads((root / "latest" / "manifest.json").read_text(encoding="utf-8"))
+
+
+def test_write_atomic(tmp_path) -> None:
+    path = tmp_path / "f0171.jpg"
+    path.write_bytes(b"old")
+    link = tmp_path / "link.jpg"
+    link.hardlink_to(path)
+    assert write_atomic(path, b"new") == 3
+    assert path.read_bytes() == b"new"
+    # A hard link to the old file keeps the old content
+    assert link.read_bytes() == b"old"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["f0171.jpg", "link.jpg"]
+
+
+def test_write_atomic_concurrently(tmp_path) -> None:
+    path = tmp_path / "f0171.jpg"
+    contents = [bytes([i]) * 1000 for i in range(2)]
+    with ThreadPoolExecutor(2) as executor:
+        assert list(executor.map(write_atomic, [path] * 600, contents * 300)) == [1000] * 600
+    assert path.read_bytes() in contents
+    # The same permissions as a file written in place
+    (tmp_path / "l0171.jpg").write_bytes(b"")
+    assert path.stat().st_mode == (tmp_path / "l0171.jpg").stat().st_mode
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["f0171.jpg", "l0171.jpg"]
+
+
+def test_file_lock(tmp_path) -> None:
+    lock = threading.Lock()
+    holding = []
+    most_holding = []
+
+    def hold() -> None:
+        with file_lock(tmp_path / ".lock"):
+            with lock:
+                holding.append(1)
+                most_holding.append(len(holding))
+            time.sleep(0.01)
+            with lock:
+                holding.pop()
+
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: hold(), range(8)))
+    assert most_holding == [1] * 8
+
+
+def test_build_manifest(tmp_path, mocker) -> None:
+    (tmp_path / "f0171.jpg").write_bytes(b"171")
+    (tmp_path / "tiles").mkdir()
+    (tmp_path / "tiles" / "f0171.dzi").write_bytes(b"dzi")
+    (tmp_path / "profiles").mkdir()
+    (tmp_path / "profiles" / "main_job.folded").write_bytes(b"profile")
+    (tmp_path / ".l0171.jpg.tmp").write_bytes(b"partial")
+    manifest = build_manifest(tmp_path)
+    assert sorted(manifest["files"]) == ["f0171.jpg", "tiles/f0171.dzi"]
+    assert manifest["files"]["f0171.jpg"]["size"] == 3
+    assert manifest["changed"] == ["f0171.jpg", "tiles/f0171.dzi"]
+    assert manifest["removed"] == []
+    # Unchanged files are not read again
+    file_digest = mocker.patch("suntoday.publish.hashlib.file_digest")
+    (tmp_path / "tiles" / "f0171.dzi").unlink()
+    second_manifest = build_manifest(tmp_path, manifest)
+    file_digest.assert_not_called()
+    assert second_manifest["changed"] == []
+    assert second_manifest["removed"] == ["tiles/f0171.dzi"]
+
+
+def test_publish_latest(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_PUBLISH_KEEP_LAST", "2")
+    save_directory = tmp_path / "2025" / "08" / "04"
+    save_directory.mkdir(parents=True)
+    write_atomic(save_directory / "f0171.jpg", b"171")
+    write_atomic(save_directory / "f0193.jpg", b"193")
+    first_release = publish_latest(save_directory, tmp_path)
+    assert (tmp_path / "latest").is_symlink()
+    assert (tmp_path / "latest").resolve() == first_release
+    assert (tmp_path / "latest" / "f0171.jpg").read_bytes() == b"171"
+    # Hard linked, not copied
+    assert (tmp_path / "latest" / "f0171.jpg").samefile(save_directory / "f0171.jpg")
+    manifest = _read_latest_manifest(tmp_path)
+    assert manifest["source"] == "2025/08/04"
+    assert manifest["changed"] == ["f0171.jpg", "f0193.jpg"]
+
+    write_atomic(save_directory / "f0171.jpg", b"new 171")
+    publish_latest(save_directory, tmp_path)
+    # The previous release is untouched by the new output
+    assert (first_release / "f0171.jpg").read_bytes() == b"171"
+    assert (tmp_path / "latest" / "f0171.jpg").read_bytes() == b"new 171"
+    assert _read_latest_manifest(tmp_path)["changed"] == ["f0171.jpg"]
+
+    publish_latest(save_directory, tmp_path)
+    assert _read_latest_manifest(tmp_path)["changed"] == []
+    assert not first_release.exists()
+    assert len(list((tmp_path / ".releases").iterdir())) == 2
+
+
+def test_publish_latest_not_a_symlink(tmp_path) -> None:
+    (tmp_path / "latest").mkdir()
+    with pytest.raises(FileExistsError, match="is not a symlink"):
+        publish_latest(tmp_path / "2025", tmp_path)
@@ -0,0 +1,49 @@
+import astropy.units as u
+import numpy as np
+import pytest
+import sunpy.map as smap
+from astropy.coordinates import SkyCoord
+from sunpy.coordinates import frames, get_earth
+
+from suntoday.regions import find_active_regions
+
+DATE = "2025-08-04T00:00:00"
+
+
+@pytest.fixture
+def synthetic_magnetogram():
+    data = np.random.default_rng(0).normal(0, 20, (1024, 1024))
+    # A strong bipole, a weaker one and a single strong pixel, which is no region
+    data[600:640, 300:330] = 2000
+    data[600:640, 340:370] = -2000
+    data[200:230, 700:720] = 800
+    data[200:230, 730:750] = -800
+    data[900, 100] = 3000
+    data[:4] = np.nan
+    reference_coordinate = SkyCoord(
+        0 * u.arcsec, 0 * u.arcsec, obstime=DATE, observer=get_earth(DATE), frame=frames.Helioprojective
+    )
+    header = smap.make_fitswcs_header(
+        data,
+        reference_coordinate,
+        scale=[2, 2] * u.arcsec / u.pixel,
+        instrument="HMI",
+        telescope="SDO/HMI",
+    )
+    return smap.Map(data, header)
+
+
+def test_find_active_regions(synthetic_magnetogram) -> None:
+    regions = find_active_regions(synthetic_magnetogram, threshold=500)
+    assert len(regions) == 2
+    # The strongest first, each a square around its region
+    for (bottom_left, top_right), (row, column) in zip(regions, [(620, 335), (215, 725)], strict=True):
+        (left, right), (bottom, top) = synthetic_magnetogram.wcs.world_to_pixel(SkyCoord([bottom_left, top_right]))
+        assert left < column < right
+        assert bottom < row < top
+        assert right - left == pytest.approx(top - bottom)
+        # No smaller than 200 arcsec
+        assert right - left > 99.9
+    assert find_active_regions(synthetic_magnetogram, threshold=500, max_regions=1) == regions[:1]
+    assert len(find_active_regions(synthetic_magnetogram, threshold=1000)) == 1
+    assert find_active_regions(synthetic_magnetogram, threshold=5000) == []
@@ -0,0 +1,102 @@
+import threading
+from datetime import UTC, datetime, timedelta
+
+from suntoday.scheduler import FlareMonitor, JSOCTrigger
+
+
+def test_jsoc_trigger_runs_on_new_data(mocker) -> None:
+    latest_time = datetime(2025, 8, 4, tzinfo=UTC)
+    mocker.patch("suntoday.scheduler.get_latest_aia_time", return_value=latest_time)
+    job = mocker.Mock()
+    trigger = JSOCTrigger(job)
+    trigger.poll()
+    trigger.join(timeout=5)
+    job.assert_called_once_with(latest_time)
+    # Same data again does not trigger another run
+    trigger.poll()
+    trigger.join(timeout=5)
+    job.assert_called_once_with(latest_time)
+
+
+def test_jsoc_trigger_ignores_failed_poll(mocker) -> None:
+    mocker.patch("suntoday.scheduler.get_latest_aia_time", side_effect=OSError("JSOC is down"))
+    job = mocker.Mock()
+    trigger = JSOCTrigger(job)
+    trigger.poll()
+    trigger.join(timeout=5)
+    job.assert_not_called()
+
+
+def test_jsoc_trigger_coalesces_while_running() -> None:
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    concurrent = []
+    active = threading.Lock()
+
+    def job(requested_time):
+        if not active.acquire(blocking=False):
+            concurrent.append(requested_time)
+            return
+        try:
+            calls.append(requested_time)
+            started.set()
+            release.wait(timeout=5)
+        finally:
+            active.release()
+
+    trigger = JSOCTrigger(job)
+    start = datetime(2025, 8, 4, tzinfo=UTC)
+    trigger.trigger(start)
+    assert started.wait(timeout=5)
+    for minutes in range(1, 4):
+        trigger.trigger(start + timedelta(minutes=minutes))
+    release.set()
+    trigger.join(timeout=5)
+    # The three triggers during the first run become one run for the newest time
+    assert calls == [start, start + timedelta(minutes=3)]
+    assert concurrent == []
+
+
+def test_flare_monitor(mocker, goes_primary_timeseries) -> None:
+    mocker.patch(
+        "suntoday.scheduler.fetch_goes_timeseries", return_value=(goes_primary_timeseries, goes_primary_timeseries)
+    )
+    flux = mocker.patch("suntoday.scheduler.get_latest_goes_flux", return_value=2e-6)
+    latest_time = datetime(2025, 8, 4, 0, 1, tzinfo=UTC)
+    get_latest_aia_time = mocker.patch("suntoday.scheduler.get_latest_aia_time", return_value=latest_time)
+    job = mocker.Mock()
+    monitor = FlareMonitor(job, "M1", ["0131"])
+    monitor.run()
+    assert not monitor.flaring
+    job.assert_not_called()
+
+    flux.return_value = 1.5e-5
+    monitor.run()
+    assert monitor.flaring
+    # Run for the newest AIA data, not the JSOC delay before now
+    job.assert_called_once_with(latest_time, products=["0131"])
+    # Nor again until there is newer data
+    monitor.run()
+    assert job.call_count == 1
+    get_latest_aia_time.return_value = latest_time + timedelta(seconds=12)
+    monitor.run()
+    job.assert_called_with(latest_time + timedelta(seconds=12), products=["0131"])
+
+    # The full job waits until the flare is over
+    monitor.run_full()
+    assert job.call_count == 2
+
+    # A failed fetch keeps the current state
+    mocker.patch("suntoday.scheduler.fetch_goes_timeseries", side_effect=OSError("SWPC is down"))
+    assert monitor.update()
+
+    mocker.patch(
+        "suntoday.scheduler.fetch_goes_timeseries", return_value=(goes_primary_timeseries, goes_primary_timeseries)
+    )
+    flux.return_value = 9e-6
+    monitor.run()
+    assert not monitor.flaring
+    assert job.call_count == 2
+    monitor.run_full()
+    job.assert_called_with()
@@ -0,0 +1,92 @@
+import shutil
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from suntoday.constants import AIA_WAVELENGTHS
+from suntoday.data.test import TEST_DATA_ROOTDIR
+from suntoday.jpegs import download_sdo_files
+from suntoday.sources import JSOCSource, ReplaySource, get_source
+
+REQUESTED_TIME = datetime(2025, 8, 4, tzinfo=UTC)
+
+
+def test_get_source(monkeypatch, tmp_path) -> None:
+    assert isinstance(get_source(), JSOCSource)
+    monkeypatch.setenv("SUNTODAY_SOURCE", "replay")
+    source = get_source()
+    assert isinstance(source, ReplaySource)
+    assert source.directory == TEST_DATA_ROOTDIR.resolve()
+    monkeypatch.setenv("SUNTODAY_REPLAY_DIRECTORY", str(tmp_path))
+    assert get_source().directory == tmp_path.resolve()
+    # The files found in the directory are kept between jobs
+    assert get_source() is get_source()
+    monkeypatch.setenv("SUNTODAY_REPLAY_TOLERANCE", "5")
+    assert get_source().tolerance == timedelta(minutes=5)
+    monkeypatch.setenv("SUNTODAY_SOURCE", "ftp")
+    with pytest.raises(ValueError, match="Invalid source"):
+        get_source()
+
+
+def test_replay_bundled_test_data(tmp_path) -> None:
+    source = ReplaySource(TEST_DATA_ROOTDIR, timedelta(hours=3))
+    aia_files = source.fetch_aia_fits(REQUESTED_TIME, tmp_path)
+    assert [file.split("_")[-1].removesuffix(".fits") for file in aia_files] == AIA_WAVELENGTHS
+    hmi_files = source.fetch_hmi_fits(REQUESTED_TIME, tmp_path)
+    assert [file.split("_")[-1] for file in hmi_files] == ["magnetogram.fits", "continuum.fits"]
+    # The files are used in place
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_replay_nearest(tmp_path) -> None:
+    for name in ["20250803_230000_171", "20250804_001000_171", "20250804_004000_171", "20250804_000000_notes"]:
+        (tmp_path / f"{name}.fits").touch()
+    (tmp_path / "README.fits").touch()
+    source = ReplaySource(tmp_path, timedelta(minutes=30))
+    assert source.fetch_aia_fits(REQUESTED_TIME, tmp_path) == [str(tmp_path / "20250804_001000_171.fits")]
+    # Only in the tolerance
+    assert source.fetch_aia_fits(REQUESTED_TIME - timedelta(hours=2), tmp_path) == []
+    assert source.fetch_hmi_fits(REQUESTED_TIME, tmp_path) == []
+    # Files added or removed since the scan are seen
+    (tmp_path / "20250804_000500_171.fits").touch()
+    (tmp_path / "20250804_000000_magnetogram.fits").touch()
+    assert source.fetch_hmi_fits(REQUESTED_TIME, tmp_path) == [str(tmp_path / "20250804_000000_magnetogram.fits")]
+    (tmp_path / "20250804_001000_171.fits").unlink()
+    assert source.fetch_aia_fits(REQUESTED_TIME, tmp_path) == [str(tmp_path / "20250804_000500_171.fits")]
+
+
+def test_replay_download_sdo_files(monkeypatch, tmp_path) -> None:
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    for path in TEST_DATA_ROOTDIR.glob("*.fits"):
+        (archive / path.name).touch()
+    monkeypatch.setenv("SUNTODAY_SOURCE", "replay")
+    monkeypatch.setenv("SUNTODAY_REPLAY_DIRECTORY", str(archive))
+    aia_files, hmi_files = download_sdo_files(REQUESTED_TIME, tmp_path)
+    assert [file.split("_")[-1].removesuffix(".fits") for file in aia_files] == AIA_WAVELENGTHS
+    assert len(hmi_files) == 2
+    (archive / "20250804_000005_304.fits").unlink()
+    with pytest.raises(OSError, match=r"missing: \{'304'\}"):
+        download_sdo_files(REQUESTED_TIME, tmp_path)
+
+
+def test_replay_timeseries(tmp_path) -> None:
+    for path in TEST_DATA_ROOTDIR.glob("*.csv"):
+        shutil.copy(path, tmp_path)
+    source = ReplaySource(tmp_path, timedelta(hours=3))
+    end_time = datetime(2025, 7, 30, 12, tzinfo=UTC)
+    aia_timeseries = source.fetch_aia_timeseries(end_time)
+    assert not aia_timeseries.empty
+    assert aia_timeseries.index.min() > end_time - timedelta(days=1)
+    assert aia_timeseries.index.max() <= end_time
+    assert aia_timeseries["WAVELNTH"].dtype == object
+    assert "171" in set(aia_timeseries["WAVELNTH"])
+    goes_primary, goes_secondary = source.fetch_goes_timeseries(end_time)
+    assert goes_primary.index.max() <= end_time
+    assert list(goes_primary.columns) == ["satellite", "flux", "energy"]
+    assert len(goes_secondary) > 0
+    assert source.fetch_aia_timeseries(REQUESTED_TIME).empty
+    aia_timeseries = source.fetch_aia_timeseries(end_time, timedelta(hours=6))
+    assert aia_timeseries.index.min() > end_time - timedelta(hours=6)
+    goes_primary, _goes_secondary = source.fetch_goes_timeseries(end_time, timedelta(hours=6))
+    assert goes_primary.index.min() > end_time - timedelta(hours=6)
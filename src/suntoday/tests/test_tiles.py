@@ -0,0 +1,84 @@
+import json
+
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+from suntoday.jpegs import save_figures
+from suntoday.tiles import get_pyramid_levels, write_tile_pyramid
+
+
+def _random_image(width: int, height: int) -> Image.Image:
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def test_get_pyramid_levels() -> None:
+    levels = get_pyramid_levels(_random_image(600, 300))
+    # 600 pixels needs 10 levels above the single pixel
+    assert len(levels) == 11
+    assert levels[0].size == (1, 1)
+    assert levels[1].size == (2, 1)
+    assert levels[-2].size == (300, 150)
+    assert levels[-1].size == (600, 300)
+
+
+def test_write_tile_pyramid(tmp_path) -> None:
+    image = _random_image(600, 300)
+    bytes_written = write_tile_pyramid(image, "f0171", tmp_path, tile_size=256, overlap=1)
+    assert bytes_written > 0
+    descriptor = (tmp_path / "f0171.dzi").read_text(encoding="utf-8")
+    assert 'TileSize="256"' in descriptor
+    assert '<Size Width="600" Height="300"/>' in descriptor
+    top_level = tmp_path / "f0171_files" / "10"
+    assert sorted(path.name for path in top_level.iterdir()) == [
+        "0_0.jpg",
+        "0_1.jpg",
+        "1_0.jpg",
+        "1_1.jpg",
+        "2_0.jpg",
+        "2_1.jpg",
+        "manifest.json",
+    ]
+    manifest = json.loads((top_level / "manifest.json").read_text(encoding="utf-8"))
+    assert (manifest["columns"], manifest["rows"]) == (3, 2)
+    # Tiles overlap their neighbours by a pixel
+    with Image.open(top_level / "1_1.jpg") as tile:
+        assert tile.size == (258, 45)
+    with Image.open(tmp_path / "f0171_files" / "0" / "0_0.jpg") as tile:
+        assert tile.size == (1, 1)
+
+
+def test_write_tile_pyramid_only_changed_tiles(tmp_path) -> None:
+    image = _random_image(600, 300)
+    write_tile_pyramid(image, "f0171", tmp_path, tile_size=256, overlap=0)
+    top_level = tmp_path / "f0171_files" / "10"
+    modified_times = {path.name: path.stat().st_mtime_ns for path in top_level.iterdir()}
+    assert write_tile_pyramid(image, "f0171", tmp_path, tile_size=256, overlap=0) == 0
+    assert {path.name: path.stat().st_mtime_ns for path in top_level.iterdir()} == modified_times
+    # Only the tile in the bottom right, and its parents, change
+    changed_image = image.copy()
+    changed_image.putpixel((599, 299), (255, 0, 0))
+    assert write_tile_pyramid(changed_image, "f0171", tmp_path, tile_size=256, overlap=0) > 0
+    changed = {path.name for path in top_level.iterdir() if path.stat().st_mtime_ns != modified_times.get(path.name)}
+    assert changed == {"2_1.jpg", "manifest.json"}
+    # A missing tile is written again
+    (top_level / "0_0.jpg").unlink()
+    assert write_tile_pyramid(changed_image, "f0171", tmp_path, tile_size=256, overlap=0) > 0
+    assert (top_level / "0_0.jpg").exists()
+
+
+def test_save_figures_tiles(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("SUNTODAY_TILES", "true")
+    monkeypatch.setenv("SUNTODAY_FIG_DPI", "100")
+    fig = plt.figure(figsize=(5.12, 5.12))
+    save_figures([("0171", fig)], tmp_path)
+    plt.close(fig)
+    assert (tmp_path / "tiles" / "f0171.dzi").exists()
+    assert sorted(path.name for path in (tmp_path / "tiles" / "f0171_files" / "9").iterdir()) == [
+        "0_0.jpg",
+        "0_1.jpg",
+        "1_0.jpg",
+        "1_1.jpg",
+        "manifest.json",
+    ]
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from suntoday.timeseries import append_timeseries, read_timeseries
+
+END_TIME = datetime(2025, 7, 30, 21, tzinfo=UTC)
+
+
+def test_append_timeseries(tmp_path, aia_timeseries) -> None:
+    paths = append_timeseries("aia", aia_timeseries, tmp_path)
+    assert [path.name for path in paths] == ["aia_20250729.parquet", "aia_20250730.parquet"]
+    # Rows already in the archive are not added again, and unchanged files are not written
+    assert append_timeseries("aia", aia_timeseries.iloc[-100:], tmp_path) == []
+    pd.testing.assert_frame_equal(
+        read_timeseries("aia", END_TIME, directory=tmp_path),
+        aia_timeseries[aia_timeseries.index > END_TIME - timedelta(days=1)].sort_index(kind="stable"),
+    )
+    # A row fetched again replaces the archived one
+    changed = aia_timeseries.iloc[-1:].assign(DATAMEAN=-1.0)
+    assert [path.name for path in append_timeseries("aia", changed, tmp_path)] == ["aia_20250730.parquet"]
+    archived = read_timeseries("aia", END_TIME, directory=tmp_path)
+    assert len(archived) == (aia_timeseries.index > END_TIME - timedelta(days=1)).sum()
+    assert (archived["DATAMEAN"] == -1.0).sum() == 1
+
+
+def test_append_timeseries_concurrently(tmp_path, aia_timeseries) -> None:
+    day = aia_timeseries[aia_timeseries.index.normalize() == pd.Timestamp("2025-07-30", tz="UTC")]
+    chunks = [day.iloc[i::8] for i in range(8)]
+    # Every append reads and rewrites the same file, none of their rows are lost
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda chunk: append_timeseries("aia", chunk, tmp_path), chunks))
+    archived = read_timeseries("aia", END_TIME, directory=tmp_path)
+    assert len(archived) == (~pd.MultiIndex.from_arrays([day.index, day["WAVELNTH"]]).duplicated()).sum()
+
+
+def test_read_timeseries(tmp_path, goes_primary_timeseries) -> None:
+    append_timeseries("goes_primary", goes_primary_timeseries, tmp_path)
+    goes = read_timeseries("goes_primary", END_TIME, timedelta(hours=6), ["flux"], tmp_path)
+    assert list(goes.columns) == ["flux"]
+    assert goes.index.name == "time_tag"
+    assert str(goes.index.tz) == "UTC"
+    assert goes.index.min() > END_TIME - timedelta(hours=6)
+    assert goes.index.max() <= END_TIME
+    assert (
+        len(goes)
+        == (
+            (goes_primary_timeseries.index > END_TIME - timedelta(hours=6))
+            & (goes_primary_timeseries.index <= END_TIME)
+        ).sum()
+    )
+    # Times without a timezone are in UTC
+    pd.testing.assert_frame_equal(
+        read_timeseries("goes_primary", END_TIME.replace(tzinfo=None), timedelta(hours=6), ["flux"], tmp_path), goes
+    )
+    empty = read_timeseries("goes_primary", END_TIME - timedelta(days=30), directory=tmp_path)
+    assert empty.empty
+    assert empty.index.name == "time_tag"
+
+
+def test_timeseries_invalid_name(tmp_path) -> None:
+    with pytest.raises(ValueError, match="Invalid timeseries"):
+        read_timeseries("eve", END_TIME, directory=tmp_path)
@@ -0,0 +1,19 @@
+import subprocess  # NOQA: S404
+import sys
+
+import matplotlib.pyplot as plt
+
+from suntoday.warmup import warm_up
+
+
+def test_warm_up() -> None:
+    assert warm_up() > 0
+    # The warm up figure is never left open
+    assert plt.get_fignums() == []
+
+
+def test_main_imports_lazily() -> None:
+    # The plotting modules are only imported by the warm up or the first job
+    code = "import sys, suntoday.main; print(sorted({'matplotlib', 'sunpy.map', 'aiapy'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)  # NOQA: S603
+    assert result.stdout.strip() == "[]"
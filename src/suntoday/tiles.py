@@ -0,0 +1,199 @@
+"""
+Provides a Deep Zoom tile pyramid of each product for web zoom viewers.
+
+Each product gets a ``<name>.dzi`` descriptor and a ``<name>_files``
+directory with one directory per level, as read by OpenSeadragon and
+other Deep Zoom viewers. Level 0 is a single pixel and the last level is
+the full image, each level is half the size of the next.
+
+Every level directory has a manifest with the size of the level and a
+hash of the pixels of each tile. Only the tiles whose pixels changed
+since the manifest was written are encoded and written again, so the
+off-disk tiles of each product are only written once per save directory.
+"""
+
+import hashlib
+import io
+import json
+import math
+from pathlib import Path
+
+from PIL import Image
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.publish import write_atomic
+
+__all__ = ["get_pyramid_levels", "write_tile_pyramid"]
+
+TILES_DIRECTORY = "tiles"
+MANIFEST_FILENAME = "manifest.json"
+DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{format}" Overlap="{overlap}" '
+    'TileSize="{tile_size}">\n'
+    '  <Size Width="{width}" Height="{height}"/>\n'
+    "</Image>\n"
+)
+
+
+def get_pyramid_levels(image: Image.Image) -> list[Image.Image]:
+    """
+    Return every level of the pyramid of an image.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The full resolution image.
+
+    Returns
+    -------
+    list[PIL.Image.Image]
+        The levels, from a single pixel at level 0 to the full image.
+    """
+    max_level = math.ceil(math.log2(max(image.size)))
+    levels = [image]
+    for level in range(max_level - 1, -1, -1):
+        scale = 2 ** (max_level - level)
+        size = (math.ceil(image.width / scale), math.ceil(image.height / scale))
+        # Each level is made from the one above, which is far cheaper than from the full image
+        levels.append(levels[-1].resize(size, Image.Resampling.BOX))
+    return levels[::-1]
+
+
+def _read_manifest(path: Path) -> dict:
+    """
+    Read a level manifest, which is empty if it is missing or unreadable.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The manifest.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_level(
+    level_image: Image.Image, level_directory: Path, tile_size: int, overlap: int, tile_format: str
+) -> tuple[int, int]:
+    """
+    Write the tiles of one level whose pixels changed, and its manifest.
+
+    Parameters
+    ----------
+    level_image : PIL.Image.Image
+        The image of the level.
+    level_directory : pathlib.Path
+        The directory of the level.
+    tile_size : int
+        The width and height of the tiles, without the overlap.
+    overlap : int
+        The pixels each tile shares with its neighbours.
+    tile_format : str
+        The file extension of the tiles.
+
+    Returns
+    -------
+    int
+        The number of tiles written.
+    int
+        The number of bytes written.
+    """
+    level_directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = level_directory / MANIFEST_FILENAME
+    previous_manifest = _read_manifest(manifest_path)
+    previous_hashes = {}
+    if previous_manifest.get("tile_size") == tile_size and previous_manifest.get("overlap") == overlap:
+        previous_hashes = previous_manifest.get("tiles", {})
+    columns = math.ceil(level_image.width / tile_size)
+    rows = math.ceil(level_image.height / tile_size)
+    hashes = {}
+    tiles_written = bytes_written = 0
+    for column in range(columns):
+        for row in range(rows):
+            tile = level_image.crop((
+                max(column * tile_size - overlap, 0),
+                max(row * tile_size - overlap, 0),
+                min((column + 1) * tile_size + overlap, level_image.width),
+                min((row + 1) * tile_size + overlap, level_image.height),
+            ))
+            tile_name = f"{column}_{row}"
+            hashes[tile_name] = hashlib.blake2b(tile.tobytes(), digest_size=16).hexdigest()
+            tile_path = level_directory / f"{tile_name}.{tile_format}"
+            if previous_hashes.get(tile_name) == hashes[tile_name] and tile_path.exists():
+                continue
+            encoded_tile = io.BytesIO()
+            tile.save(encoded_tile, format=Image.registered_extensions()[tile_path.suffix.lower()])
+            write_atomic(tile_path, encoded_tile.getvalue())
+            tiles_written += 1
+            bytes_written += encoded_tile.getbuffer().nbytes
+    manifest = {
+        "width": level_image.width,
+        "height": level_image.height,
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "columns": columns,
+        "rows": rows,
+        "tiles": hashes,
+    }
+    if manifest != previous_manifest:
+        write_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return tiles_written, bytes_written
+
+
+def write_tile_pyramid(
+    image: Image.Image, name: str, directory: Path, tile_size: int | None = None, overlap: int | None = None
+) -> int:
+    """
+    Write the Deep Zoom tile pyramid of an image.
+
+    Tiles whose pixels are the same as in the level manifest are skipped.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The full resolution image.
+    name : str
+        The name of the pyramid, used for the descriptor and directory.
+    directory : pathlib.Path
+        The directory to write the pyramid to.
+    tile_size : int, optional
+        The width and height of the tiles, without the overlap.
+        Defaults to ``Settings.tile_size``.
+    overlap : int, optional
+        The pixels each tile shares with its neighbours.
+        Defaults to ``Settings.tile_overlap``.
+
+    Returns
+    -------
+    int
+        The number of bytes written.
+    """
+    settings = Settings()
+    tile_size = tile_size or settings.tile_size
+    overlap = settings.tile_overlap if overlap is None else overlap
+    directory = Path(directory)
+    image = image.convert("RGB")
+    tiles_written = bytes_written = 0
+    for level, level_image in enumerate(get_pyramid_levels(image)):
+        level_tiles, level_bytes = _write_level(
+            level_image, directory / f"{name}_files" / str(level), tile_size, overlap, settings.tile_format
+        )
+        tiles_written += level_tiles
+        bytes_written += level_bytes
+    descriptor = DZI_TEMPLATE.format(
+        format=settings.tile_format, overlap=overlap, tile_size=tile_size, width=image.width, height=image.height
+    ).encode()
+    descriptor_path = directory / f"{name}.dzi"
+    if not descriptor_path.exists() or descriptor_path.read_bytes() != descriptor:
+        write_atomic(descriptor_path, descriptor)
+    logger.debug(f"Tile pyramid {name}: {tiles_written} tiles written")
+    return bytes_written
@@ -0,0 +1,178 @@
+"""
+Provides a day partitioned Parquet archive of the AIA and GOES timeseries.
+
+Every lightcurve job appends the timeseries it fetched to the archive
+in ``Settings.timeseries_archive_directory``, which has a Parquet file
+of each timeseries for each day. A row already in the archive, the same
+time and wavelength or energy, is replaced by the newer one, so the
+overlapping fetches of consecutive jobs are only kept once. Renders
+also append the disk statistics of their AIA maps, see
+`suntoday.diskstats`.
+
+Appends hold a lock file of the timeseries, so jobs in other threads or
+processes appending to the same day do not lose each other's rows.
+
+`read_timeseries` returns any time range, reading only the files of the
+days in the range and the columns asked for, rather than the whole
+archive.
+"""
+
+import io
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from suntoday import logger
+from suntoday.config import Settings
+from suntoday.publish import file_lock, write_atomic
+
+__all__ = ["TIMESERIES", "append_timeseries", "read_timeseries"]
+
+# The time index and the column that, with the time, a row is unique by, of each timeseries
+TIMESERIES = {
+    "aia": ("DATE-OBS", "WAVELNTH"),
+    "aia_disk": ("DATE-OBS", "WAVELNTH"),
+    "goes_primary": ("time_tag", "energy"),
+    "goes_secondary": ("time_tag", "energy"),
+}
+PARTITION_FILENAME = "{name}_{day:%Y%m%d}.parquet"
+LOCK_FILENAME = ".lock"
+
+
+def _get_directory(name: str, directory: Path | None = None) -> Path:
+    """
+    Return the directory of a timeseries in the archive.
+
+    Parameters
+    ----------
+    name : str
+        The timeseries, one of `TIMESERIES`.
+    directory : pathlib.Path, optional
+        The archive, defaults to ``Settings.timeseries_archive_directory``.
+
+    Returns
+    -------
+    pathlib.Path
+        The directory.
+
+    Raises
+    ------
+    ValueError
+        If the timeseries is not one of `TIMESERIES`.
+    """
+    if name not in TIMESERIES:
+        msg = f"Invalid timeseries {name}, must be one of {list(TIMESERIES)}"
+        raise ValueError(msg)
+    settings = Settings()
+    directory = directory or settings.timeseries_archive_directory or Path(settings.save_directory) / "timeseries"
+    return Path(directory).expanduser() / name
+
+
+def _to_utc(time: datetime) -> pd.Timestamp:
+    """
+    Return a time in UTC.
+
+    Parameters
+    ----------
+    time : datetime.datetime
+        The time, in UTC if it has no timezone.
+
+    Returns
+    -------
+    pandas.Timestamp
+        The time in UTC.
+    """
+    time = pd.Timestamp(time)
+    return time.tz_convert("UTC") if time.tz else time.tz_localize("UTC")
+
+
+def append_timeseries(name: str, timeseries: pd.DataFrame, directory: Path | None = None) -> list[Path]:
+    """
+    Append a timeseries to the files of its days in the archive.
+
+    Rows with the same time and wavelength or energy as rows in the
+    archive replace them. Appends of the same timeseries are serialised.
+
+    Parameters
+    ----------
+    name : str
+        The timeseries, one of `TIMESERIES`.
+    timeseries : pandas.DataFrame
+        The timeseries, indexed by time, in UTC if it has no timezone.
+    directory : pathlib.Path, optional
+        The archive, defaults to ``Settings.timeseries_archive_directory``.
+
+    Returns
+    -------
+    list[pathlib.Path]
+        The files written, those with no new or changed rows are not.
+    """
+    directory = _get_directory(name, directory)
+    index_name, key = TIMESERIES[name]
+    index = pd.DatetimeIndex(timeseries.index)
+    index = index.tz_convert("UTC") if index.tz else index.tz_localize("UTC")
+    timeseries = timeseries.set_axis(index.rename(index_name))
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    # The files are read, merged and written again, which must not interleave with another append
+    with file_lock(directory / LOCK_FILENAME):
+        for day, day_timeseries in timeseries.groupby(timeseries.index.normalize()):
+            path = directory / PARTITION_FILENAME.format(name=name, day=day)
+            existing = pd.read_parquet(path) if path.exists() else None
+            merged = day_timeseries if existing is None else pd.concat([existing, day_timeseries])
+            merged = merged[~pd.MultiIndex.from_arrays([merged.index, merged[key]]).duplicated(keep="last")]
+            merged = merged.sort_index(kind="stable")
+            if existing is not None and merged.equals(existing):
+                continue
+            content = io.BytesIO()
+            merged.to_parquet(content, compression="zstd")
+            write_atomic(path, content.getvalue())
+            paths.append(path)
+    logger.debug(f"Appended {len(timeseries)} rows of {name} to {[path.name for path in paths]}")
+    return paths
+
+
+def read_timeseries(
+    name: str,
+    end_time: datetime,
+    duration: timedelta = timedelta(days=1),
+    columns: list[str] | None = None,
+    directory: Path | None = None,
+) -> pd.DataFrame:
+    """
+    Read a time range of a timeseries from the archive.
+
+    Only the files of the days in the range are read, and of those only
+    the columns asked for and the row groups in the range.
+
+    Parameters
+    ----------
+    name : str
+        The timeseries, one of `TIMESERIES`.
+    end_time : datetime.datetime
+        The end of the range, in UTC if it has no timezone.
+    duration : datetime.timedelta, optional
+        The length of the range, defaults to a day.
+    columns : list[str], optional
+        The columns to read, defaults to all of them.
+    directory : pathlib.Path, optional
+        The archive, defaults to ``Settings.timeseries_archive_directory``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The rows in (``end_time - duration``, ``end_time``], in time order,
+        indexed in UTC.
+    """
+    directory = _get_directory(name, directory)
+    index_name, _key = TIMESERIES[name]
+    end_time = _to_utc(end_time)
+    start_time = end_time - duration
+    days = pd.date_range(start_time.normalize(), end_time.normalize(), freq="D")
+    paths = [directory / PARTITION_FILENAME.format(name=name, day=day) for day in days]
+    filters = [(index_name, ">", start_time), (index_name, "<=", end_time)]
+    frames = [pd.read_parquet(path, columns=columns, filters=filters) for path in paths if path.exists()]
+    if not frames:
+        return pd.DataFrame(columns=columns or [], index=pd.DatetimeIndex([], tz="UTC", name=index_name))
+    return pd.concat(frames).sort_index(kind="stable")
@@ -2,9 +2,20 @@
 Utility functions for image processing and visualization.
 """
 
+import threading
+
 import numpy as np
 
-__all__ = ["apply_gamma_correction", "clip_image_percentiles", "normalize_image_percentiles"]
+__all__ = [
+    "MATPLOTLIB_LOCK",
+    "apply_gamma_correction",
+    "clip_image_percentiles",
+    "create_figure",
+    "normalize_image_percentiles",
+]
+
+# Drawing is not thread safe in matplotlib, e.g., the mathtext parser and font caches are shared by all figures
+MATPLOTLIB_LOCK = threading.RLock()
 
 
 def clip_image_percentiles(
@@ -90,3 +101,30 @@ def normalize_image_percentiles(
     image_clipped = np.clip(image, p_low, p_high)
     norm_image = 255 * (image_clipped - p_low) / (p_high - p_low)
     return norm_image.astype(np.uint8)
+
+
+def create_figure(**kwargs):
+    """
+    Create a figure that is not managed by pyplot.
+
+    Unlike ``pyplot.figure``, the figure is not added to the global
+    figures of pyplot, so figures can be created in several threads at
+    once and are freed when no longer used, without being closed. It is
+    drawn with Agg, hold `MATPLOTLIB_LOCK` while drawing it.
+
+    Parameters
+    ----------
+    **kwargs
+        Passed to `matplotlib.figure.Figure`.
+
+    Returns
+    -------
+    `matplotlib.figure.Figure`
+        The figure.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
@@ -0,0 +1,71 @@
+"""
+Primes the caches that the first job would otherwise pay for.
+
+The heavy plotting modules are imported lazily, so this is called once
+before the first scheduled run to import them, build the matplotlib
+font cache, register the sunpy colormaps and set up WCSAxes.
+"""
+
+import time
+
+from suntoday import logger
+
+__all__ = ["warm_up"]
+
+# Small enough that drawing it is cheap, but still a full disk
+WARM_UP_MAP_SIZE = 64
+
+
+def warm_up() -> float:
+    """
+    Import the plotting modules and draw a small map like the products.
+
+    The map is drawn with the same colormap, WCSAxes, text effects and
+    logo as the real figures, but is never saved.
+
+    Returns
+    -------
+    float
+        The time taken in seconds.
+    """
+    started = time.perf_counter()
+    import astropy.units as u
+    import matplotlib.patheffects as pe
+    import numpy as np
+    import sunpy.map as smap
+    from astropy.coordinates import SkyCoord
+    from matplotlib import font_manager
+    from sunpy.coordinates import frames, get_earth
+
+    # The lightcurve module is imported so the first timeseries job does not pay for it
+    import suntoday.lightcurve  # NOQA: F401
+    from suntoday.jpegs import _add_lmsal_logo
+    from suntoday.utils import MATPLOTLIB_LOCK, create_figure
+
+    # Building the font cache is the slowest part of the first figure
+    font_manager.findfont(font_manager.FontProperties())
+    date = "2025-08-04T00:00:00"
+    data = np.ones((WARM_UP_MAP_SIZE, WARM_UP_MAP_SIZE))
+    reference_coordinate = SkyCoord(
+        0 * u.arcsec, 0 * u.arcsec, obstime=date, observer=get_earth(date), frame=frames.Helioprojective
+    )
+    header = smap.make_fitswcs_header(
+        data,
+        reference_coordinate,
+        scale=[40, 40] * u.arcsec / u.pixel,
+        instrument="AIA_3",
+        detector="AIA",
+        telescope="SDO/AIA",
+        wavelength=171 * u.angstrom,
+    )
+    amap = smap.Map(data, header)
+    fig = create_figure(figsize=(1, 1), frameon=False)
+    ax = fig.add_subplot(projection=amap)
+    amap.plot(axes=ax)
+    ax.text(0.5, 0.5, "SDO/AIA", transform=ax.transAxes, path_effects=[pe.withStroke(linewidth=4, foreground="black")])
+    _add_lmsal_logo(ax)
+    with MATPLOTLIB_LOCK:
+        fig.canvas.draw()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Warm up completed in {elapsed:.1f} seconds")
+    return elapsed